@@ -180,4 +180,106 @@ class SixTankModel:
         # Add noise if specified
         noisy = self.random.normal(1, self.noise, 6) * \
                 [self.tank_1, self.tank_2, self.tank_LA, self.tank_RA, self.tank_3, self.tank_4]
-        return np.concatenate((noisy, action))
\ No newline at end of file
+        return np.concatenate((noisy, action))
+
+
+    def run_many(self, states, actions, stepsize=1, **kwargs):
+        """
+        Simulate tank states for a batch of states and actions. Gives the same
+        results as calling run() for each pair in order (including the noise
+        drawn from the random number generator), but in a single vectorized
+        pass.
+
+        Args:
+
+        * states: A 2D array/sequence of N state vectors (see run()).
+        * actions: A 2D array/sequence of N action vectors.
+        * stepsize: The timestep to simulate over. Either a single value or one
+        for each state.
+
+        Returns:
+
+        A numpy array of shape (N, 12) - the state vectors after simulation.
+        """
+        actions = np.reshape(actions, (-1, 6))
+        levels = self.step(states, actions, stepsize)
+        noisy = self.random.normal(1, self.noise, levels.shape) * levels
+        return np.concatenate((noisy, actions), axis=1)
+
+
+    def step(self, states, actions, stepsize=1):
+        """
+        Computes tank levels after simulation for a batch of states and
+        actions, without noise. Unlike run(), the model attributes are not
+        modified so the function is reentrant. The branches in run() are
+        replaced by masks over the batch. Operations are in the same order as
+        run() so results are identical.
+
+        Args:
+
+        * states: A 2D array/sequence of N state vectors (see run()).
+        * actions: A 2D array/sequence of N action vectors.
+        * stepsize: The timestep to simulate over. Either a single value or one
+        for each state.
+
+        Returns:
+
+        A numpy array of shape (N, 6) - the tank levels after simulation.
+        """
+        states = np.reshape(np.asarray(states, dtype=float), (-1, 12))
+        actions = np.reshape(actions, (-1, 6))
+        stepsize = np.broadcast_to(stepsize, (len(states),))
+        tank_1, tank_2, tank_LA, tank_RA, tank_3, tank_4 = states[:, :6].T
+        DL, EL, FL, FR, ER, DR = actions.T
+
+        # set outflow through pumps
+        demand = 10 * stepsize
+        total_left = tank_1 + tank_2 + tank_LA
+        total_right = tank_3 + tank_4 + tank_RA
+        left = total_left >= demand
+        right = total_right >= demand
+
+        # Nominal outflow if both sides have fuel more than pump demand.
+        # Otherwise the side with more than demand makes up for the deficit of
+        # the other side if it can. If neither side has enough, pump out
+        # however much is possible.
+        extra_left = demand + demand - total_right
+        extra_right = demand + demand - total_left
+        demand_left = np.where(left & right, demand,
+                      np.where(left & (total_left >= extra_left), extra_left, total_left))
+        demand_right = np.where(left & right, demand,
+                       np.where(right & (total_right >= extra_right), extra_right, total_right))
+
+        # Distribute demand on each side between individual tank pumps
+        first = tank_1 >= demand_left
+        second = tank_2 >= (demand_left - tank_1)
+        pump_1 = np.where(first, demand_left, tank_1)
+        pump_2 = np.where(first, 0, np.where(second, demand_left - tank_1, tank_2))
+        pump_LA = np.where(first | second, 0, demand_left - tank_1 - tank_2)
+        first = tank_4 >= demand_right
+        second = tank_3 >= (demand_right - tank_4)
+        pump_4 = np.where(first, demand_right, tank_4)
+        pump_3 = np.where(first, 0, np.where(second, demand_right - tank_4, tank_3))
+        pump_RA = np.where(first | second, 0, demand_right - tank_3 - tank_4)
+
+        # Pump out fuel to engines from each tank
+        tank_1 = tank_1 - pump_1
+        tank_2 = tank_2 - pump_2
+        tank_LA = tank_LA - pump_LA
+        tank_RA = tank_RA - pump_RA
+        tank_3 = tank_3 - pump_3
+        tank_4 = tank_4 - pump_4
+
+        # compute total "pressure" in the conduit between tank valves
+        valves = DL + EL + FL + FR + ER + DR
+        p = np.where(valves == 0, 0,
+                     (tank_1 * DL + tank_2 * EL + tank_LA * FL + tank_RA * FR
+                      + tank_3 * ER + tank_4 * DR) / np.where(valves == 0, 1, valves))
+
+        # Redistribute fuel between tanks where valves are open
+        levels = []
+        tanks = (tank_1, tank_2, tank_LA, tank_RA, tank_3, tank_4)
+        for i, (tank, valve) in enumerate(zip(tanks, (DL, EL, FL, FR, ER, DR))):
+            level = tank + valve * (((p / self.R) - (tank / self.R)) * (stepsize))
+            levels.append(level - ((tank / self.F) * (stepsize) if self.fault == i + 1 else 0))
+        return np.stack(levels, axis=1)
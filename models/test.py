@@ -0,0 +1,81 @@
+"""
+Tests for the models package.
+"""
+
+import numpy as np
+try:
+    from fuel_tanks import SixTankModel
+except ImportError:
+    from .fuel_tanks import SixTankModel
+
+NUM_TESTS = 0
+TESTS_PASSED = 0
+
+def test(func):
+    """
+    Decorator for test cases.
+
+    Args:
+        func (function): A test case function object.
+    """
+    global NUM_TESTS
+    NUM_TESTS += 1
+    def test_wrapper(*args, **kwargs):
+        """
+        Wrapper that calls test function.
+
+        Args:
+            desc (str): Description of test.
+        """
+        print(func.__doc__.strip(), end='\t')
+        try:
+            func(*args, **kwargs)
+            global TESTS_PASSED
+            TESTS_PASSED += 1
+            print('PASSED')
+        except Exception as ex:
+            print('FAILED: ' + str(ex))
+
+    return test_wrapper
+
+
+
+@test
+def test_six_tank_batches():
+    """
+    Testing batched six tank simulation against single runs.
+    """
+    # Set up
+    seed = 1000
+    random = np.random.RandomState(seed)
+    states = np.c_[random.uniform(0, 100, (50, 6)), random.randint(2, size=(50, 6))]
+    states[:10, :6] = random.uniform(0, 10, (10, 6))   # pumps short of demand
+    actions = random.randint(2, size=(50, 6))
+    stepsize = random.choice([0.5, 1, 2], 50)
+
+    # Test 1: batches match single runs for all faults, including noise
+    for fault in range(7):
+        single = SixTankModel(fault=fault, noise=0.1, seed=seed)
+        batch = SixTankModel(fault=fault, noise=0.1, seed=seed)
+        expected = [single.run(s, a, stepsize=t) for s, a, t in zip(states, actions, stepsize)]
+        assert np.array_equal(batch.run_many(states, actions, stepsize=stepsize), expected), \
+            'Batch differs from single runs for fault ' + str(fault) + '.'
+        assert np.array_equal(batch.run_many(states[:1], actions[:1]),
+                              single.run(states[0], actions[0])[None, :]), \
+            'Random number generators out of step for fault ' + str(fault) + '.'
+
+    # Test 2: empty batches
+    model = SixTankModel(noise=0.1, seed=seed)
+    assert model.run_many([], []).shape == (0, 12), 'Incorrect empty batch shape.'
+    assert model.run_many(states[:0], actions[:0]).shape == (0, 12), \
+        'Incorrect empty array batch shape.'
+
+
+
+if __name__ == '__main__':
+    print()
+    test_six_tank_batches()
+    print('\n==========\n')
+    print('Tests passed:\t' + str(TESTS_PASSED))
+    print('Total tests:\t' + str(NUM_TESTS))
+    print()
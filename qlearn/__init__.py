@@ -2,6 +2,7 @@ import numpy as np
 from .qlearner import QLearner
 from .flearner import FLearner
 from .slearner import SLearner
+from .mpc import ModelPredictiveController
 from .testbench import TestBench
 from .linsim import *
 
@@ -1 +1,4 @@
-from .variablenstep import variablenstep
\ No newline at end of file
+from .variablenstep import variablenstep
+from .dynamicprogramming import valueiteration, policyiteration
+from .batchnstep import batchnstep
+from .lstd import collect, lstd, lspi, onlinelstd, LSTDAccumulator
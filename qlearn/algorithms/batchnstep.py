@@ -0,0 +1,190 @@
+"""
+A batched implementation of the variable n-step tree backup algorithm. Instead
+of learning from one episode at a time, K episodes are advanced in lockstep.
+The states, actions, q-values, errors and action probabilities of all episodes
+are kept in ring buffers of shape [n+1 x K] so that each time step is a handful
+of vectorized gathers from the [r|t|q]matrix and a single scattered update of the
+qmatrix.
+
+The algorithm is only applicable to tabular learners (i.e. learners with a
+qmatrix and tmatrix). Transitions and rewards are read directly from the
+[r|t]matrix, so overridden next_state/reward methods are not used.
+
+Updates of all episodes at a time step are computed from the same qmatrix. If
+several episodes update the same state/action pair at the same time step, the
+pair is updated once towards the mean of their n-step returns instead of once
+for each episode.
+
+Like variablenstep, returns a tuple of lists:
+    [list of states traversed after the initial state, including final state],
+    [list of actions taken to traverse states, starting with the first action]
+for each episode.
+"""
+
+
+import numpy as np
+from .dynamicprogramming import _terminal
+
+
+def _next_actions(self, states):
+    """
+    Selects an action for each of the provided states under the action
+    selection policy of the learner.
+
+    Args:
+        self (QLearner): A reference to the calling QLearner object.
+        states (ndarray): An array of state indices.
+
+    Returns:
+        An array of action indices (columns) in [r|q]matrix.
+    """
+    num = len(states)
+    explore = self.random.randint(self.num_actions, size=num)
+    if self.policy == self.UNIFORM:
+        return explore
+    elif self.policy == self.GREEDY:
+        if self.mode == self.ONLINE:
+            best = np.argmax(self.qmatrix[states], axis=1)
+        else:
+            best = self._action_param['max_util_indices'][states]
+        exploit = self.random.uniform(size=num) < self._action_param['max_prob']
+        return np.where(exploit, best, explore)
+    elif self.policy == self.SOFTMAX:
+        if self.mode == self.ONLINE:
+            qvals = self.qmatrix[states]
+            cumulative_utils = np.cumsum(
+                qvals - np.min(qvals, axis=1, keepdims=True), axis=1)
+        else:
+            cumulative_utils = self._action_param['cumulative_utils'][states]
+        random_num = self.random.rand(num) * cumulative_utils[:, -1]
+        # Vectorized equivalent of searchsorted on each row.
+        ind = np.sum(cumulative_utils < random_num[:, None], axis=1)
+        return np.minimum(ind, self.num_actions - 1)
+
+
+def _action_probs(self, states):
+    """
+    Calculates probabilities of taking all actions from each of the provided
+    states under the action selection policy. Vectorized version of a_probs().
+
+    Args:
+        self (QLearner): A reference to the calling QLearner object.
+        states (ndarray): An array of K state indices.
+
+    Returns:
+        A [K x m actions] array of action probabilities.
+    """
+    num = len(states)
+    if self.policy == self.UNIFORM:
+        return np.ones((num, self.num_actions)) / self.num_actions
+    elif self.policy == self.GREEDY:
+        highest = np.argmax(self.qmatrix[states], axis=1)
+        probs = np.ones((num, self.num_actions)) \
+                * (1 - self._action_param['max_prob']) / (self.num_actions - 1)
+        probs[np.arange(num), highest] = self._action_param['max_prob']
+        return probs
+    elif self.policy == self.SOFTMAX:
+        qvals = self.qmatrix[states]
+        recentered = qvals - np.min(qvals, axis=1, keepdims=True)
+        return recentered / (np.sum(recentered, axis=1, keepdims=True) + self.lrate)
+
+
+def batchnstep(self, states, actions=None):
+    """
+    Runs learning episodes from all provided states in lockstep. Calculates
+    errors between last and current estimation of q-values and updates the
+    qmatrix in bulk.
+    Implements the n-step Tree Backup algorithm with variable step sizes. The
+    stepsize function of the learner is called with an array of states and
+    may return a single step size or one for each state.
+    See Reinforcement Learning - an Introduction by Sutton/Barto (Ch. 7)
+
+    Args:
+        self (QLearner): A reference to the calling QLearner object.
+        states (list/ndarray): K states to begin learning episodes from.
+        actions (list/ndarray): Actions to take from each state. If None, or
+            if an element is None, they are chosen from the policy.
+
+    Returns:
+        A tuple of:
+        - A list of K histories of states traversed after the provided states.
+        - A list of K histories of actions taken after the provided states.
+    """
+    states = np.asarray(states, dtype=int)
+    K = len(states)
+    n = self.steps
+    size = n + 1                    # ring buffer length
+    rows = np.arange(K)
+    terminal = _terminal(self)
+
+    T = np.full(K, np.iinfo(int).max)   # termination time of each episode
+    S = np.zeros((size, K), dtype=int)  # ring buffers of history of states,
+    A = np.zeros((size, K), dtype=int)  # actions,
+    Q = np.zeros((size, K))             # Q-values of taken actions,
+    pi = np.ones((size, K))             # action probabilities,
+    delta = np.zeros((size, K))         # and errors in value estimates
+
+    first = _next_actions(self, states)
+    if actions is not None:
+        given = np.array([a is not None for a in actions], dtype=bool)
+        first[given] = [a for a in actions if a is not None]
+    S[0], A[0] = states, first
+    Q[0] = self.qmatrix[states, first]
+
+    Shist = []                      # full histories for returning
+    Ahist = [first]
+
+    tau = 0
+    t = 0
+    while t < self.depth and np.any(tau <= T - 1):
+        # The look-ahead step is computed for all episodes. The results of
+        # episodes which have already terminated are never used.
+        cur, nxt = t % size, (t + 1) % size
+        state, action = S[cur], A[cur]
+        step = np.broadcast_to(np.asarray(self.stepsize(state), dtype=int), (K,))
+        nstate = state
+        reward = np.zeros(K)
+        for i in range(np.max(step)):
+            moving = i < step
+            reward = reward + np.where(moving, self.rmatrix[nstate, action], 0)
+            nstate = np.where(moving, self.tmatrix[nstate, action], nstate)
+        naction = _next_actions(self, nstate)
+        aprobs = _action_probs(self, nstate)
+        cqvalue = self.qmatrix[state, action]
+        goal = terminal[nstate]
+
+        S[nxt], A[nxt] = nstate, naction
+        Q[nxt] = self.qmatrix[nstate, naction]
+        pi[nxt] = aprobs[rows, naction]
+        delta[cur] = np.where(goal, reward - cqvalue, reward - cqvalue \
+                + self.discount * np.sum(aprobs * self.qmatrix[nstate], axis=1))
+        T = np.where((t < T) & goal, t + 1, T)
+        Shist.append(nstate)
+        Ahist.append(naction)
+
+        # States trailing the look-ahead by n-steps are updated with the
+        # n-step errors, for episodes which have not yet terminated at tau.
+        tau = t - n + 1
+        if tau >= 0:
+            E = np.ones(K)
+            G = np.copy(Q[tau % size])
+            for k in range(tau, tau + n):
+                valid = k < T
+                G += np.where(valid, E * delta[k % size], 0)
+                E = self.discount * E * pi[(k + 1) % size]
+            # Errors of episodes updating the same state/action pair are
+            # averaged so the effective learning rate does not grow with K.
+            update = tau < T
+            flat = S[tau % size][update] * self.num_actions + A[tau % size][update]
+            pairs, inverse = np.unique(flat, return_inverse=True)
+            sa = np.unravel_index(pairs, self.qmatrix.shape)
+            error = np.bincount(inverse, weights=G[update]) \
+                    / np.bincount(inverse) - self.qmatrix[sa]
+            self.qmatrix[sa] += self.lrate * error
+        t += 1
+
+    Shist = np.array(Shist).T
+    Ahist = np.array(Ahist).T
+    length = np.minimum(T, t)
+    return [list(Shist[k, :length[k]]) for k in range(K)],\
+           [list(Ahist[k, :length[k] + 1]) for k in range(K)]
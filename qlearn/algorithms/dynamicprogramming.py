@@ -0,0 +1,106 @@
+"""
+Implementations of model-based dynamic programming algorithms. Instead of
+sampling episodes, the value of every state/action pair is computed from the
+complete reward and transition matrices in synchronous sweeps over the whole
+state space:
+
+    Q(s, a) = R(s, a) + discount * V(T(s, a))
+
+Where V(s) is 0 for goal (terminal) states. Each sweep is a single vectorized
+operation over the [r|t]matrix. The algorithms assume unit step sizes and are
+only applicable to tabular learners (i.e. learners with a qmatrix).
+
+All dynamic programming algorithms accept the calling learner as the first
+argument, update its qmatrix in place, and return the number of sweeps made.
+"""
+
+import numpy as np
+
+
+def _terminal(self):
+    """
+    Returns a boolean array which is True for the goal states of the learner.
+    """
+    terminal = np.zeros(self.num_states, dtype=bool)
+    terminal[list(self._goals)] = True
+    return terminal
+
+
+def valueiteration(self, tolerance=1e-6, maxsweeps=None):
+    """
+    Computes optimal q-values using synchronous value iteration. The qmatrix
+    is used as the initial estimate.
+
+    Args:
+        self (QLearner): A reference to the calling QLearner object or a
+            subclass.
+        tolerance (float): Sweeps stop when the largest change in any q-value
+            is less than tolerance.
+        maxsweeps (int): Maximum number of sweeps. Defaults to number of states.
+
+    Returns:
+        The number of sweeps made.
+    """
+    maxsweeps = self.num_states if maxsweeps is None else maxsweeps
+    terminal = _terminal(self)
+    qmatrix = np.array(self.qmatrix, dtype=float)
+    sweep = 0
+    while sweep < maxsweeps:
+        sweep += 1
+        values = np.max(qmatrix, axis=1)
+        values[terminal] = 0
+        updated = self.rmatrix + self.discount * values[self.tmatrix]
+        change = np.max(np.abs(updated - qmatrix))
+        qmatrix = updated
+        if change < tolerance:
+            break
+    self.qmatrix[:] = qmatrix
+    return sweep
+
+
+def policyiteration(self, tolerance=1e-6, maxsweeps=None):
+    """
+    Computes optimal q-values using policy iteration. The greedy policy of the
+    qmatrix is used as the initial policy. Each policy is evaluated iteratively
+    until the values converge and is then improved greedily.
+
+    Args:
+        self (QLearner): A reference to the calling QLearner object or a
+            subclass.
+        tolerance (float): Policy evaluation stops when the largest change in
+            any state value is less than tolerance.
+        maxsweeps (int): Maximum number of policy improvements and evaluation
+            sweeps per policy. Defaults to number of states.
+
+    Returns:
+        The number of policy improvements made.
+    """
+    maxsweeps = self.num_states if maxsweeps is None else maxsweeps
+    terminal = _terminal(self)
+    states = np.arange(self.num_states)
+    qmatrix = np.array(self.qmatrix, dtype=float)
+    policy = np.argmax(qmatrix, axis=1)
+    values = np.zeros(self.num_states)
+    sweep = 0
+    while sweep < maxsweeps:
+        sweep += 1
+        # Policy evaluation: The values of the current policy are computed
+        # using the rewards and next states of the actions it prescribes.
+        rewards = self.rmatrix[states, policy]
+        nstates = self.tmatrix[states, policy]
+        for _ in range(maxsweeps):
+            values[terminal] = 0
+            updated = rewards + self.discount * values[nstates]
+            change = np.max(np.abs(updated - values))
+            values = updated
+            if change < tolerance:
+                break
+        # Policy improvement: The policy is made greedy w.r.t. the values.
+        values[terminal] = 0
+        qmatrix = self.rmatrix + self.discount * values[self.tmatrix]
+        improved = np.argmax(qmatrix, axis=1)
+        if np.array_equal(improved, policy):
+            break
+        policy = improved
+    self.qmatrix[:] = qmatrix
+    return sweep
@@ -0,0 +1,253 @@
+"""
+Implementations of least-squares temporal difference (LSTD) algorithms for
+learners with a function approximation that is linear in weights:
+
+    Q(s, a) = phi(s, a) . weights
+
+Where phi(s, a) are the features i.e. dfunc (see FLearner.features). Instead of
+gradient steps scaled by a learning rate, transitions (s, a, r, s') are
+collected once and the weights that solve the projected Bellman equation are
+computed in closed form:
+
+    A = sum phi(s, a) (phi(s, a) - discount * E[phi(s', a')])^T
+    b = sum phi(s, a) r
+    weights = A^-1 b
+
+Where the expectation is over the next action a' under a policy. LSPI repeats
+this on the same transitions with the policy greedy w.r.t. the last weights
+until the weights converge. LSTDAccumulator keeps A^-1 up to date with
+Sherman-Morrison rank-1 updates so weights can be recomputed after each
+transition in O(funcdim^2) instead of O(funcdim^3). onlinelstd uses it to
+update the learner's weights after every transition, so the policy followed
+while collecting improves as transitions arrive.
+See Least-Squares Policy Iteration by Lagoudakis/Parr (2003).
+
+All algorithms accept the calling learner as the first argument. They are
+compatible with integer and vector representation of states and actions.
+"""
+
+import numpy as np
+
+
+def _svec(self, state):
+    """
+    Returns the state vector of a state number or state vector.
+    """
+    if isinstance(state, (int, np.integer)):
+        return self.stateconverter.decode(state)
+    return np.asarray(state)
+
+
+def _avec(self, action):
+    """
+    Returns the action vector of an action number or action vector.
+    """
+    if isinstance(action, (int, np.integer)):
+        return self._amatrix[action]
+    return np.asarray(action)
+
+
+def collect(self, episodes, actions=()):
+    """
+    Collects transitions by following the action selection policy from each
+    starting state for at most self.depth steps or until a goal state.
+
+    Args:
+        self (FLearner): A reference to the calling FLearner object or a
+            subclass.
+        episodes (list/generator): States to begin collecting from.
+        actions (list/tuple): First actions to take from each starting state.
+            Optional.
+
+    Returns:
+        A dict of:
+        - 'features': [N x funcdim] features of N state/action pairs taken.
+        - 'rewards': [N] rewards received.
+        - 'nfeatures': [N x num_actions x funcdim] features of all actions
+            from the N next states.
+        - 'nstates': List of N next states.
+        - 'terminal': [N] bool array which is True if next state is a goal.
+    """
+    svecs, avecs, rewards, nstates, terminal = [], [], [], [], []
+    actions = list(actions)
+    for i, state in enumerate(episodes):
+        action = actions[i] if i < len(actions) else None
+        for _ in range(self.depth):
+            action = self.next_action(state) if action is None else action
+            step = self.stepsize(state)
+            nstate = self.next_state(state, action, stepsize=step)
+            svecs.append(_svec(self, state))
+            avecs.append(_avec(self, action))
+            rewards.append(self.reward(state, action, nstate, stepsize=step))
+            nstates.append(nstate)
+            terminal.append(bool(self.goal(nstate)))
+            if terminal[-1]:
+                break
+            state, action = nstate, None
+
+    num = len(self._avecs)
+    nsvecs = np.array([_svec(self, s) for s in nstates])
+    nfeatures = self.features(np.repeat(nsvecs, num, axis=0),
+                              np.tile(self._amatrix, (len(nstates), 1)))
+    return {'features': self.features(np.array(svecs), np.array(avecs)),
+            'rewards': np.array(rewards, dtype=float),
+            'nfeatures': np.asarray(nfeatures).reshape(len(nstates), num, -1),
+            'nstates': nstates,
+            'terminal': np.array(terminal, dtype=bool)}
+
+
+def lstd(self, samples, aprobs=None, regularization=1e-6):
+    """
+    Evaluates a policy over collected transitions and sets the learner's
+    weights to the least-squares fixed point.
+
+    Args:
+        self (FLearner): A reference to the calling FLearner object or a
+            subclass.
+        samples (dict): Transitions returned by collect().
+        aprobs (ndarray): [N x num_actions] probabilities of next actions from
+            each next state. Defaults to the learner's action selection policy
+            (see a_probs()).
+        regularization (float): Added to the diagonal of A so it is invertible
+            when some features are not visited.
+
+    Returns:
+        The weights (ndarray).
+    """
+    if aprobs is None:
+        aprobs = np.array([self.a_probs(s) for s in samples['nstates']])
+    features = samples['features']
+    nfeatures = np.einsum('na,nad->nd', aprobs, samples['nfeatures'])
+    nfeatures[samples['terminal']] = 0
+    A = features.T @ (features - self.discount * nfeatures)
+    b = features.T @ samples['rewards']
+    A[np.diag_indices_from(A)] += regularization
+    self.weights = np.linalg.lstsq(A, b, rcond=None)[0]
+    return self.weights
+
+
+def lspi(self, samples, tolerance=1e-6, maxiter=None, regularization=1e-6):
+    """
+    Computes weights of the optimal policy over collected transitions using
+    least-squares policy iteration. The current weights are used as the
+    initial policy.
+
+    Args:
+        self (FLearner): A reference to the calling FLearner object or a
+            subclass.
+        samples (dict): Transitions returned by collect().
+        tolerance (float): Convergence threshold for the largest change in
+            weights between iterations.
+        maxiter (int): Maximum number of iterations. Defaults to funcdim + 1.
+        regularization (float): See lstd().
+
+    Returns:
+        The number of iterations made.
+    """
+    maxiter = self.funcdim + 1 if maxiter is None else maxiter
+    num = samples['nfeatures'].shape[1]
+    rows = np.arange(len(samples['rewards']))
+    iterations = 0
+    while iterations < maxiter:
+        iterations += 1
+        weights = np.copy(self.weights)
+        greedy = np.zeros((len(rows), num))
+        greedy[rows, np.argmax(samples['nfeatures'] @ weights, axis=1)] = 1
+        lstd(self, samples, aprobs=greedy, regularization=regularization)
+        if np.max(np.abs(self.weights - weights)) < tolerance:
+            break
+    return iterations
+
+
+def onlinelstd(self, episodes, actions=(), regularization=1e-6):
+    """
+    Follows the action selection policy from each starting state like
+    collect(), but updates the learner's weights after every transition with
+    an LSTDAccumulator. The expected next features are taken under the policy
+    at the time of the transition.
+
+    Args:
+        self (FLearner): A reference to the calling FLearner object or a
+            subclass.
+        episodes (list/generator): States to begin learning from.
+        actions (list/tuple): First actions to take from each starting state.
+            Optional.
+        regularization (float): See lstd().
+
+    Returns:
+        The LSTDAccumulator with all transitions, which can be used to
+        continue learning.
+    """
+    acc = LSTDAccumulator(self.funcdim, self.discount, regularization)
+    num = len(self._avecs)
+    actions = list(actions)
+    for i, state in enumerate(episodes):
+        action = actions[i] if i < len(actions) else None
+        for _ in range(self.depth):
+            action = self.next_action(state) if action is None else action
+            step = self.stepsize(state)
+            nstate = self.next_state(state, action, stepsize=step)
+            features = self.features(_svec(self, state)[None, :],
+                                     _avec(self, action)[None, :])[0]
+            reward = self.reward(state, action, nstate, stepsize=step)
+            if self.goal(nstate):
+                acc.add(features, reward)
+                self.weights = acc.weights
+                break
+            nfeatures = self.features(np.repeat(_svec(self, nstate)[None, :], num, axis=0),
+                                      self._amatrix)
+            acc.add(features, reward, self.a_probs(nstate) @ nfeatures)
+            self.weights = acc.weights
+            state, action = nstate, None
+    return acc
+
+
+
+class LSTDAccumulator:
+    """
+    Accumulates transitions one at a time for online LSTD. The inverse of A is
+    updated with the Sherman-Morrison formula so weights are available after
+    each transition without solving a linear system:
+
+        A' = A + phi v^T, where v = phi - discount * phi'
+        A'^-1 = A^-1 - (A^-1 phi)(v^T A^-1) / (1 + v^T A^-1 phi)
+
+    Args:
+        funcdim (int): The dimension of the weights.
+        discount (float): Discount factor.
+        regularization (float): Initial diagonal of A i.e. A = regularization * I.
+
+    Instance Attributes:
+        funcdim/discount: Same as args.
+        ainv (ndarray): Inverse of A [funcdim x funcdim].
+        b (ndarray): Accumulated features weighted by rewards [funcdim].
+    """
+
+    def __init__(self, funcdim, discount=1, regularization=1e-6):
+        self.funcdim = funcdim
+        self.discount = discount
+        self.ainv = np.eye(funcdim) / regularization
+        self.b = np.zeros(funcdim)
+
+
+    @property
+    def weights(self):
+        """Returns weights solving the accumulated transitions."""
+        return self.ainv @ self.b
+
+
+    def add(self, features, reward, nfeatures=None):
+        """
+        Adds a transition.
+
+        Args:
+            features (ndarray): Features of the state/action pair taken.
+            reward (float): Reward received.
+            nfeatures (ndarray): Expected features of the next state/action
+                pair under the policy. None if the next state is terminal.
+        """
+        v = features if nfeatures is None else features - self.discount * nfeatures
+        left = self.ainv @ features
+        right = v @ self.ainv
+        self.ainv -= np.outer(left, right) / (1 + right @ features)
+        self.b += features * reward
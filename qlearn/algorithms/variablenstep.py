@@ -68,6 +68,9 @@ def variablenstep(self, state, action):
             Q.append(nqvalue)
 
             reward = self.reward(state, action, nstate, stepsize=step)
+            terminal = self.goal(nstate)
+            if self.replay is not None:     # stored for experience replay
+                self.replay.add(state, action, reward, nstate, terminal)
             aprobs = self.a_probs(nstate)
             # For QLearner subclasses with vector representation,
             # naction cannot be used as an index
@@ -76,7 +79,7 @@ def variablenstep(self, state, action):
             else:
                 pi.append(aprobs[self.actionconverter.encode(naction)])
 
-            if self.goal(nstate):   # Episode stops look-ahead by
+            if terminal:            # Episode stops look-ahead by
                 T = t + 1           # updating T from infinity to t+1
                 delta.append(reward - cqvalue)
             else:
@@ -0,0 +1,195 @@
+"""
+This module defines the TransitionCache class. It memoizes the next states
+returned by a deterministic simulator (e.g. a Simulator or SixTankModel without
+noise) so repeated (state, action, stepsize) transitions do not run the
+simulation again. Learning episodes, neighbours() and tree searches frequently
+revisit the same states.
+
+States are keyed either exactly, or by the nearest point on the grid of a
+FlagGenerator (quantized). Quantized keys trade accuracy for more hits when
+states are continuous: all states in the same grid cell share a transition.
+
+The cache is bounded to a maximum number of transitions. The least recently
+used transitions are evicted first. The cache is cleared automatically when any
+watched attribute of the simulator (e.g. 'fault') changes.
+
+Usage:
+    cache = TransitionCache(simulator, maxsize=2**16, stateconverter=None)
+    next_state = cache.run(state, action, stepsize=1)
+    next_states = cache.run_many(states, actions, stepsize=1)
+"""
+
+from collections import OrderedDict
+import numpy as np
+
+
+
+class TransitionCache:
+    """
+    A least recently used cache of simulator transitions. Has the same run()
+    and run_many() interface as a simulator.
+
+    Args:
+        simulator (Simulator): An object with a run(state, action, **kwargs)
+            function (and optionally run_many()) that returns the next state.
+        maxsize (int): Maximum number of transitions stored.
+        stateconverter (FlagGenerator): If provided, states are quantized to its
+            grid for keys. Else states are keyed exactly.
+        watch (tuple): Names of simulator attributes. If any of their values
+            change, the cache is cleared. Missing attributes are ignored.
+
+    Instance Attributes:
+        simulator/maxsize/stateconverter/watch: Same as args.
+        hits (int): Number of transitions found in the cache.
+        misses (int): Number of transitions simulated.
+        invalidations (int): Number of times the cache was cleared because a
+            watched attribute changed.
+    """
+
+    def __init__(self, simulator, maxsize=2**16, stateconverter=None,
+                 watch=('fault', 'noise')):
+        self.simulator = simulator
+        self.maxsize = maxsize
+        self.stateconverter = stateconverter
+        self.watch = watch
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._cache = OrderedDict()
+        self._token = self._environment()
+
+
+    def __len__(self):
+        return len(self._cache)
+
+
+    @property
+    def stats(self):
+        """Returns a dict of hits, misses, invalidations, size and hit rate."""
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses,
+                'invalidations': self.invalidations, 'size': len(self._cache),
+                'hit_rate': self.hits / total if total else 0.}
+
+
+    def clear(self):
+        """
+        Removes all stored transitions. Statistics are kept.
+        """
+        self._cache.clear()
+
+
+    def run(self, state, action, **kwargs):
+        """
+        Returns the next state from the cache, or from the simulator if it has
+        not been cached.
+
+        Args:
+            state (ndarray/list/tuple): The state vector.
+            action (ndarray/list/tuple): The action vector.
+            **kwargs: Keyword arguments (e.g. stepsize) passed to simulator.run().
+                They are part of the key.
+
+        Returns:
+            The next state vector (ndarray).
+        """
+        self._validate()
+        key = self._key(state, action, kwargs)
+        nstate = self._get(key)
+        if nstate is None:
+            self.misses += 1
+            nstate = np.array(self.simulator.run(state, action, **kwargs))
+            self._put(key, nstate)
+        return np.array(nstate)
+
+
+    def run_many(self, states, actions, **kwargs):
+        """
+        Returns next states of a batch of states and actions. Transitions not
+        in the cache are simulated together with simulator.run_many() if the
+        simulator has it. Transitions with the same key are only simulated
+        once; repeats count as hits, as with consecutive run() calls.
+
+        Args:
+            states (ndarray/list): N state vectors.
+            actions (ndarray/list): N action vectors.
+            **kwargs: Keyword arguments passed to the simulator.
+
+        Returns:
+            A [N x state dimension] array of next state vectors.
+        """
+        self._validate()
+        keys = [self._key(s, a, kwargs) for s, a in zip(states, actions)]
+        found = [self._get(key) for key in keys]
+        missing = OrderedDict()     # key: indices of transitions in batch
+        for i, nstate in enumerate(found):
+            if nstate is None:
+                missing.setdefault(keys[i], []).append(i)
+        firsts = [indices[0] for indices in missing.values()]
+        self.misses += len(firsts)
+        self.hits += sum([len(indices) - 1 for indices in missing.values()])
+        if len(firsts) > 0:
+            if hasattr(self.simulator, 'run_many'):
+                computed = self.simulator.run_many([states[i] for i in firsts],
+                                                   [actions[i] for i in firsts],
+                                                   **kwargs)
+            else:
+                computed = [self.simulator.run(states[i], actions[i], **kwargs)\
+                            for i in firsts]
+            for (key, indices), nstate in zip(missing.items(), computed):
+                nstate = np.array(nstate)
+                self._put(key, nstate)
+                for i in indices:
+                    found[i] = nstate
+        return np.array(found)
+
+
+    def _environment(self):
+        """
+        Returns the values of watched simulator attributes.
+        """
+        return tuple([getattr(self.simulator, name, None) for name in self.watch])
+
+
+    def _validate(self):
+        """
+        Clears the cache if watched simulator attributes have changed.
+        """
+        token = self._environment()
+        if token != self._token:
+            self._token = token
+            self.invalidations += 1
+            self.clear()
+
+
+    def _key(self, state, action, kwargs):
+        """
+        Returns a hashable key for a transition.
+        """
+        state = np.asarray(state, dtype=float)
+        if self.stateconverter is None:
+            skey = state.tobytes()
+        else:
+            skey = tuple(np.round((state - self.stateconverter.bottom)\
+                                  / self.stateconverter.scale).astype(np.int64))
+        return (skey, tuple(np.ravel(action).tolist()), tuple(sorted(kwargs.items())))
+
+
+    def _get(self, key):
+        """
+        Returns a cached next state and marks it most recently used, or None.
+        """
+        nstate = self._cache.get(key)
+        if nstate is not None:
+            self.hits += 1
+            self._cache.move_to_end(key)
+        return nstate
+
+
+    def _put(self, key, nstate):
+        """
+        Stores a next state, evicting the least recently used if full.
+        """
+        self._cache[key] = nstate
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
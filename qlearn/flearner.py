@@ -24,6 +24,10 @@ sensitive to the learning rate:
 
     weights[t+1] = -lrate * error * df/d weights[t]
 
+For approximations linear in weights, solve() instead computes the weights in
+closed form from collected transitions (least-squares TD), which does not
+depend on the learning rate.
+
 The learned weights are then used to generate a policy:
 
     Policy(action | state) = max over a(Value(state, a) | a => all possible actions)
@@ -58,11 +62,15 @@ All learners expose the following interface:
 
 import numpy as np
 try:
+    import qtables
     from qlearner import QLearner
     from linsim import FlagGenerator
+    from algorithms import collect, lstd, lspi, onlinelstd
 except ImportError:
+    from . import qtables
     from .qlearner import QLearner
     from .linsim import FlagGenerator
+    from .algorithms import collect, lstd, lspi, onlinelstd
 
 
 
@@ -93,6 +101,16 @@ class FLearner(QLearner):
             dimension of func.
         goal (list/tuple/set/array/function): Indices of goal states in rmatrix
             OR a function that accepts a state index and returns true if goal.
+        features (func): Optional batched features for a function approximation
+            that is linear in weights i.e. func = dot(dfunc, weights). Returns
+            a [N x funcdim] array of dfunc for N state/action vector pairs:
+                ndarray = features(state_vecs, action_vecs)
+            Where state_vecs and action_vecs are 2D arrays with N rows. If
+            provided, q-values of all actions are computed as a single matrix
+            product, and func/dfunc can be None.
+        precompute (bool/str): If True or one of FLearner.[DENSE | COMPACT |
+            MEMMAP], precomputes features of all state/action pairs. See
+            precompute_features(). Default False.
         tmatrix (ndarray/str): A transition matrix of [n states x m actions], OR
             filepath to space delimited tmatrix. Where tmatrix[state, action]
             contains index of next state. If None, then rmatrix must be square
@@ -119,12 +137,23 @@ class FLearner(QLearner):
         random (np.random.RandomState): A random number generator local to this
             instance.
         weights (ndarray): The coefficients of the function provided.
+        ftensor (ndarray): Features of all [n states x m actions x funcdim]
+            state/action pairs if precomputed. Else None.
     """
 
+    _checkpoint_values = ('weights',)
+
+    LSTD = 'lstd'
+    LSPI = 'lspi'
+
+    # Maximum bytes used by precomputed features.
+    FEATURE_BUDGET = 2**28
+
     def __init__(self, rmatrix, stateconverter, actionconverter, goal, func,
                  funcdim, dfunc, tmatrix=None, lrate=0.25, discount=1, 
                  policy='uniform', mode='offline', depth=None,
-                 steps=1, seed=None, stepsize=lambda x: 1, **kwargs):
+                 steps=1, seed=None, stepsize=lambda x: 1, features=None,
+                 precompute=False, **kwargs):
         super().__init__(rmatrix, goal, tmatrix, lrate, discount,
                          policy, mode, depth, steps, seed, **kwargs)
         self.stateconverter = stateconverter
@@ -134,6 +163,119 @@ class FLearner(QLearner):
         self.dfunc = dfunc
         self.weights = np.ones(self.funcdim)
         self._avecs = [avec for avec in self.actionconverter]
+        self.ftensor = None
+        self.set_features(features)
+        if precompute:
+            self.precompute_features(qtables.DENSE if precompute is True else precompute)
+
+
+    def set_features(self, features):
+        """
+        Sets the batched feature function (see features arg). If func/dfunc
+        are None, they are derived from features.
+
+        Args:
+            features (func): Batched features of a linear function approximation
+                or None to use func/dfunc.
+        """
+        self._features = features
+        self._amatrix = np.array(self._avecs)   # all action vectors as rows
+        self.ftensor = None                     # stale if features change
+        if features is not None:
+            if self.dfunc is None:
+                self.dfunc = lambda s, a, w: features(np.array([s]), np.array([a]))[0]
+            if self.func is None:
+                self.func = lambda s, a, w: np.dot(self.dfunc(s, a, w), w)
+
+
+    def precompute_features(self, storage='dense', budget=None, path=None,
+                            chunksize=1024):
+        """
+        Computes the features of all state/action pairs once, so q-values and
+        updates of state numbers are array lookups instead of decoding states
+        and calling func/dfunc. Only valid for approximations that are linear
+        in weights i.e. func = dot(dfunc, weights), where dfunc does not
+        depend on weights.
+
+        Args:
+            storage (str): One of FLearner.[DENSE | COMPACT | MEMMAP]. COMPACT
+                stores float32 features. MEMMAP stores features in a file.
+            budget (int): Maximum bytes of the feature tensor. If exceeded,
+                features are not precomputed and are computed on the fly.
+                Defaults to FLearner.FEATURE_BUDGET.
+            path (str): File backing MEMMAP storage. If None, a temporary file
+                is used.
+            chunksize (int): Number of states whose features are computed at
+                a time.
+
+        Returns:
+            True if features were precomputed, False if over budget.
+        """
+        if storage == qtables.SPARSE:
+            raise ValueError('Storage: ' + str(storage) + ' not supported for features.')
+        budget = self.FEATURE_BUDGET if budget is None else budget
+        shape = (self.num_states, self.num_actions, self.funcdim)
+        itemsize = 4 if storage == qtables.COMPACT else 8
+        if np.prod(shape, dtype=np.int64) * itemsize > budget:
+            self.ftensor = None
+            return False
+        ftensor = qtables.create(storage, shape, path)
+        for start in range(0, self.num_states, chunksize):
+            states = np.arange(start, min(start + chunksize, self.num_states))
+            svecs = self.stateconverter.decode_many(states)
+            ftensor[states] = self.features(np.repeat(svecs, self.num_actions, axis=0),
+                                            np.tile(self._amatrix, (len(states), 1)))\
+                              .reshape(len(states), self.num_actions, self.funcdim)
+        self.ftensor = ftensor
+        return True
+
+
+    def features(self, svecs, avecs):
+        """
+        Returns features (derivatives of func w.r.t. weights) of a batch of
+        state/action vector pairs. Uses dfunc for each pair if no batched
+        features function was provided.
+
+        Args:
+            svecs (ndarray/list): N state vectors.
+            avecs (ndarray/list): N action vectors.
+
+        Returns:
+            A [N x funcdim] array.
+        """
+        if self._features is not None:
+            return np.asarray(self._features(np.asarray(svecs), np.asarray(avecs)))
+        return np.array([self.dfunc(s, a, self.weights) for s, a in zip(svecs, avecs)])
+
+
+    def qvalues(self, svecs):
+        """
+        The q-values of all actions from each of a batch of states.
+
+        Args:
+            svecs (ndarray/list): N state vectors.
+
+        Returns:
+            A [N x num_actions] array of q-values.
+        """
+        svecs = np.asarray(svecs)
+        num = len(self._avecs)
+        if self._features is None:
+            return np.array([[self.func(s, a, self.weights) for a in self._avecs]\
+                             for s in svecs]).reshape(len(svecs), num)
+        features = self._features(np.repeat(svecs, num, axis=0),
+                                  np.tile(self._amatrix, (len(svecs), 1)))
+        return (features @ self.weights).reshape(len(svecs), num)
+
+
+    def _qvalues(self, svec):
+        """
+        Returns the q-values of all actions from a state vector.
+        """
+        if self._features is None:
+            return np.array([self.func(svec, a, self.weights) for a in self._avecs])
+        svecs = np.broadcast_to(np.asarray(svec), (len(self._avecs), len(svec)))
+        return self._features(svecs, self._amatrix) @ self.weights
 
 
     def value(self, state):
@@ -150,12 +292,11 @@ class FLearner(QLearner):
             next most rewarding action.
         """
         if isinstance(state, (list, tuple, np.ndarray)):
-            vals = [self.func(state, a, self.weights)\
-                    for a in self._avecs]
+            vals = self._qvalues(state)
+        elif self.ftensor is not None:
+            vals = self.ftensor[state] @ self.weights
         else:
-            state_ = self.stateconverter.decode(state)
-            vals = [self.func(state_, a, self.weights)\
-                    for a in self._avecs]
+            vals = self._qvalues(self.stateconverter.decode(state))
         action = np.argmax(vals)
         return (vals[action], action)
 
@@ -172,13 +313,70 @@ class FLearner(QLearner):
             The qvalue of state,action if action is specified. Else returns the
             qvalues of all actions from a state (array).
         """
+        if self.ftensor is not None:
+            if action is not None:
+                return self.ftensor[state, action] @ self.weights
+            return self.ftensor[state] @ self.weights
         svec = self.stateconverter.decode(state)
         if action is not None:
             avec = self.actionconverter.decode(action)
             return self.func(svec, avec, self.weights)
         else:
-            return np.array([self.func(svec, a, self.weights)\
-                    for a in self._avecs])
+            return self._qvalues(svec)
+
+
+    def solve(self, method='lspi', tolerance=1e-6, maxsweeps=None, episodes=None,
+              coverage=1., ep_mode=None, actions=(), samples=None,
+              regularization=1e-6, online=False):
+        """
+        Computes weights in closed form from transitions collected by following
+        the action selection policy, as opposed to gradient descent in learn().
+        Does not use the learning rate. Only valid for approximations that are
+        linear in weights i.e. func = dot(dfunc, weights).
+        See algorithms.lstd.
+
+        Args:
+            method (str): One of FLearner.[LSTD | LSPI]. LSTD evaluates the
+                action selection policy once. LSPI iterates to the greedy
+                policy. Default LSPI.
+            tolerance (float): Convergence threshold for the largest change in
+                weights between LSPI iterations.
+            maxsweeps (int): Maximum number of LSPI iterations. Defaults to
+                funcdim + 1.
+            episodes/coverage/ep_mode/actions: Starting states/actions of
+                transitions to collect. Same as learn().
+            samples (dict): Transitions previously returned by
+                algorithms.collect(). If provided, no transitions are
+                collected. Transitions can be reused between calls.
+            regularization (float): Added to the diagonal of the least squares
+                system.
+            online (bool): Only for LSTD. If True, weights are updated after
+                every transition as it is collected, so the action selection
+                policy uses the latest weights. See algorithms.onlinelstd.
+                Samples cannot be provided. Default False.
+
+        Returns:
+            The number of iterations made.
+        """
+        if online:
+            if method != FLearner.LSTD or samples is not None:
+                raise ValueError('Online solving is only for LSTD on new transitions.')
+            episodes = episodes if episodes is not None else\
+                    self.episodes(coverage=coverage, mode=ep_mode)
+            onlinelstd(self, episodes, actions, regularization=regularization)
+            return 1
+        if samples is None:
+            episodes = episodes if episodes is not None else\
+                    self.episodes(coverage=coverage, mode=ep_mode)
+            samples = collect(self, episodes, actions)
+        if method == FLearner.LSTD:
+            lstd(self, samples, regularization=regularization)
+            return 1
+        elif method == FLearner.LSPI:
+            return lspi(self, samples, tolerance=tolerance, maxiter=maxsweeps,
+                        regularization=regularization)
+        else:
+            raise ValueError('Method does not exist.')
 
 
     def update(self, state, action, error):
@@ -191,6 +389,9 @@ class FLearner(QLearner):
             action (int): Action number.
             error (float): Error term (current value - next estimate)
         """
+        if self.ftensor is not None:
+            self.weights -= self.lrate * error * self.ftensor[state, action]
+            return
         svec = self.stateconverter.decode(state)
         avec = self._avecs[action]
         self.weights -= self.lrate * error * self.dfunc(svec, avec, self.weights)
@@ -3,6 +3,7 @@ from .blocks import Block
 from .flags import FlagGenerator
 from .directives import Directive
 from .elements import *
+from .linear import LinearSimulator
 
 try:
     from .simulate import Simulator
@@ -72,6 +72,7 @@ class Block:
         self.elements = []
         self.blocks = {}
         self.graph = {}
+        self._changelogs = []
         definition = '\n'.join(definition).lower()
         if len(definition):
             self._parse(definition, **kwargs)
@@ -170,6 +171,47 @@ class Block:
         self.blocks = {}
 
 
+    def track(self):
+        """
+        Creates a change set for the block. The names of elements added,
+        removed or modified in the block are added to all change sets. Each
+        consumer of changes (e.g. a simulator) can track changes independently
+        and clear its set after applying them.
+
+        Returns:
+            An empty set to which names of changed elements will be added.
+        """
+        changes = set()
+        self._changelogs.append(changes)
+        return changes
+
+
+    def untrack(self, changes):
+        """
+        Stops recording changes in a change set created by track(). Consumers
+        should untrack their set when they no longer use the block, so sets
+        do not accumulate over its lifetime.
+
+        Args:
+            changes (set): A change set returned by track().
+        """
+        # Sets are compared by identity, since equal sets may belong to
+        # different consumers. The list is shared with elements so it is
+        # modified in place.
+        self._changelogs[:] = [c for c in self._changelogs if c is not changes]
+
+
+    def _record(self, elem):
+        """
+        Records an element name in all change sets of the block.
+
+        Args:
+            elem (Element): The added/removed/modified element.
+        """
+        for changes in self._changelogs:
+            changes.add(elem.name)
+
+
     def _parse(self, definition, sanitize=True):
         """
         Parses self.definition to populate adjacency lists for each node.
@@ -323,6 +365,8 @@ class Block:
                         raise ValueError('Block instance of ' + elem.block.name\
                                         + ' is not defined.')
                 self.elements.append(elem)      # add elem to elements list
+                elem._changelogs = self._changelogs
+                self._record(elem)
                 for node in set(elem.nodes):    # add elem to adjacency list
                     if self.graph.get(node):
                         self.graph[node].append(elem)
@@ -358,7 +402,9 @@ class Block:
         if isinstance(elem, str):   # convert string id to Element instance
             elem = self.element(elem)
         if elem in self.elements:
-            self.elements.remove(elem)    
+            self.elements.remove(elem)
+            elem._changelogs = ()
+            self._record(elem)
             for node in set(elem.nodes):
                 if self.graph.get(node):
                     self.graph[node].remove(elem)
@@ -402,6 +448,7 @@ class Block:
             for elem in elements:
                 # reassign nodes on elements in shorted node
                 elem.nodes[elem.nodes.index(node1)] = node2
+                self._record(elem)
                 # if all nodes are identical, mark element as redundant
                 if elem.nodes.count(node2) == len(elem.nodes):
                     redundant.append(elem)
@@ -415,6 +462,7 @@ class Block:
             for elem in redundant:
                 self.graph[node2].remove(elem)
                 self.elements.remove(elem)
+                elem._changelogs = ()
         else:
             raise ValueError('Node: ' + str(node1) + ' does not exist in block: '\
                              + self.name)
@@ -33,7 +33,8 @@ class Element:
         nodes (list): List of Node objects.
         passive_nodes (list): List of sensory nodes i.e. no current through.
         name (str): Element name.
-        value (str/int): Element value.
+        value (str/int): Element value. Changes are recorded by the blocks
+            the element belongs to (see Block.track()).
         kwargs (dict): All param=value element properties.
 
     Class Attributes:
@@ -47,6 +48,7 @@ class Element:
     num_nodes = 2
     prefix = ''
     name = 'Element'
+    _changelogs = ()    # change sets of the block containing the element
     value_regex = r'(?:^|\s+)((?<!=)[\w_\.-]+(?=(?:$|\s+)))'
     pair_regex = r'([\S]+=[^=]+?(?=(?:$|(?:\s+\S+=))))'
 
@@ -74,6 +76,28 @@ class Element:
             self._parse_args()
 
 
+    @property
+    def value(self):
+        return self._value
+
+
+    @value.setter
+    def value(self, value):
+        if value != getattr(self, '_value', None):
+            self._value = value
+            self.touch()
+
+
+    def touch(self):
+        """
+        Records the element as modified in the change sets of the block it
+        belongs to. Called automatically when value or params are set. Should
+        be called after modifying nodes in place.
+        """
+        for changes in self._changelogs:
+            changes.add(self.name)
+
+
     def __str__(self):
         """
         Returns a netlist description of the element.
@@ -128,12 +152,12 @@ class Element:
             return self.kwargs.get(param.lower())
         else:
             if value == '':
-                try:
+                if param.lower() in self.kwargs:
                     del self.kwargs[param.lower()]
-                except KeyError:
-                    pass
-            else:
+                    self.touch()
+            elif self.kwargs.get(param.lower()) != value:
                 self.kwargs[param.lower()] = value
+                self.touch()
 
 
     def _verify(self, args, def_elements=None):
@@ -26,6 +26,8 @@ class FlagGenerator:
     Instance Attributes:
         flags (list): Stores number of states for each flag.
         num_states (int): Total number of states possible with the given flags.
+        strides (ndarray): Place value of each flag in the state number. The
+            last flag is the least significant.
     """
 
     def __init__(self, *flags):
@@ -49,6 +51,13 @@ class FlagGenerator:
         for flag in self.flags:
             self.num_states *= flag
 
+        # Place values of each flag i.e. the product of the number of states of
+        # all less significant flags. Encoding/decoding is then a dot product
+        # or an integer division instead of repeated basis conversions.
+        self.strides = np.ones(len(self.flags), dtype=np.int64)
+        for i in range(len(self.flags) - 2, -1, -1):
+            self.strides[i] = self.strides[i+1] * self.flags[i+1]
+
 
     def __iter__(self):
         self._state = -1
@@ -77,15 +86,27 @@ class FlagGenerator:
         """
         if state >= self.num_states:
             raise ValueError('State number ' + str(state) + ' exceeds possible states.')
-        current = 10        # basis of current state number
-        state_f = int(state)# state in current basis, becomes list during loop
-        flags = []          # state number translated into flags
-        for flag_basis in reversed(self.flags):
-            state_f = self.convert_basis(current, flag_basis, state_f)
-            flags.insert(0, state_f[-1])
-            state_f = state_f[:-1]
-            current = flag_basis
-        return np.array([flags[i] * self.scale[i] + self.bottom[i] for i in range(len(flags))])
+        digits = (int(state) // self.strides) % self.flags
+        return digits * self.scale + self.bottom
+
+
+    def decode_many(self, states):
+        """
+        Decodes an array of state numbers into flags. Vectorized version of
+        decode().
+
+        Args:
+            states (list/ndarray): A 1D sequence of state numbers in basis 10.
+
+        Returns:
+            A 2D numpy float array where each row contains the flag values of
+            the corresponding state.
+        """
+        states = np.asarray(states, dtype=np.int64)
+        if states.size and (states.max() >= self.num_states or states.min() < 0):
+            raise ValueError('State numbers exceed possible states.')
+        digits = (states[:, None] // self.strides) % self.flags
+        return digits * self.scale + self.bottom
 
 
     def encode(self, *flags):
@@ -102,16 +123,29 @@ class FlagGenerator:
         """
         if len(flags) == 1 and isinstance(flags[0], (list, tuple, np.ndarray)):
             flags = flags[0]
-        flags = [np.round((flags[i] - self.bottom[i]) / self.scale[i]) for i in range(len(flags))]
-        state = []
-        for i in range(len(flags)-1):
-            state.append(flags[i])
-            state = list(self.convert_basis(self.flags[i], self.flags[i+1], state))
-        state.append(flags[-1])
-        state = self.convert_basis(self.flags[-1], 10, state)
-        # Since state is base 10 [0-9], list elements can be concatenated
-        state = ''.join([str(i) for i in state])
-        return int(state)
+        flags = np.ravel(np.asarray(flags, dtype=float))
+        num = len(flags)
+        # If fewer flags are provided, they are encoded as the leading flags
+        # of a shorter generator.
+        digits = np.round((flags - self.bottom[:num]) / self.scale[:num])
+        strides = self.strides[:num] // self.strides[num-1]
+        return int(np.dot(digits.astype(np.int64), strides))
+
+
+    def encode_many(self, flags):
+        """
+        Encodes rows of flags into state numbers. Vectorized version of
+        encode().
+
+        Args:
+            flags (list/ndarray): A 2D array where each row contains flag values
+                in the same order as they were provided at instantiation.
+
+        Returns:
+            A 1D int64 array of state numbers in base 10.
+        """
+        digits = np.round((np.asarray(flags, dtype=float) - self.bottom) / self.scale)
+        return np.dot(digits.astype(np.int64), self.strides)
 
 
     @staticmethod
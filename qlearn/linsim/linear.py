@@ -0,0 +1,514 @@
+"""
+This module defines the LinearSimulator class which conducts transient analysis
+of linear time-invariant circuits. Unlike Simulator, it does not depend on an
+external library. The circuit equations are built directly from the Netlist
+using Modified Nodal Analysis (MNA) and integrated with numpy.
+
+The MNA formulation describes a circuit by the system of equations:
+
+    C * dx/dt + G * x = b
+
+Where x is the vector of node potentials followed by currents through voltage
+sources and inductors. C holds capacitances/inductances, G holds conductances
+and source couplings, and b holds independent source values.
+
+Supported elements are resistors, capacitors, inductors, independent DC
+voltage/current sources, and linear dependent sources (E, G, F, H). Block
+instances are flattened before analysis.
+
+LinearSimulator exposes the same interface as Simulator:
+
+* Instantiation with the environment 'env' and class-specific parameters.
+* run(state, action, **kwargs): Which simulates the environment for a given
+    'state' after taking some 'action' and returns the new environment variables.
+"""
+
+import copy
+from collections import OrderedDict
+import numpy as np
+try:
+    from scipy.linalg import expm
+except ImportError:
+    expm = None
+try:
+    from elements import BlockInstance
+except ImportError:
+    from .elements import BlockInstance
+
+
+class LinearSimulator:
+    """
+    The LinearSimulator calculates behaviour of a linear circuit described by a
+    netlist over time. It remembers its state i.e. after every run() the latest
+    potentials/currents are stored as the next run()'s initial values.
+    LinearSimulator.run() accepts state/action vectors to modify the environment
+    and returns a result dict, or the next state vector.
+
+    Note: Nonlinear elements (switches, diodes, transistors) and time dependent
+    sources are not supported. A ValueError is raised if the netlist contains
+    them.
+
+    Args:
+        env (Netlist): a Netlist instance defining the environment.
+        timestep (float): Max interval between calculations during simulation.
+            Only used by the TRAP method.
+        stepsize (float): The default time to run the simulation. Used when
+            stepsize is not provided to run(). If not specified (i.e. None),
+            defaults to timestep.
+        state_mux (func): A function that gets a vector of state variables and
+            modifies the netlist accordingly. Returns the modified netlist.
+            Signature:
+                modified Netlist = state_mux(state_vector, action_vector, Netlist)
+        state_demux (func): A function that gets simulation results and converts
+            them into a state variable vector to be returned. Signature:
+                state_vector = state_demux(prev. state, prev. action, Netlist, result)
+            Where 'result' is a dict of the form 'ic' (see ic in Attributes),
+            'Netlist' is an instance of that class, and 'prev. state' is
+            a vector describing the starting state.
+        ic (dict): See 'ic' in Instance Attributes. Default None, in which case
+            initial conditions are parsed from the netlist/ guessed using
+            operating point calculations.
+        method (str): One of LinearSimulator.[TRAP | EXACT]. TRAP integrates
+            with the trapezoidal rule (the first step is backward Euler to
+            settle algebraic variables). EXACT steps the circuit equations
+            using the matrix exponential and requires scipy. Default TRAP.
+        cachesize (int): Number of circuit configurations whose equations and
+            propagators are remembered. A configuration is identified by the
+            names, nodes, values and parameters of elements in the netlist and
+            the stepsize. Least recently
+            used configurations are discarded first. 0 disables caching.
+            Default 32.
+
+    Instance Attributes:
+        netlist (Netlist): Same as netlist argument.
+        env (Netlist): A common property that returns the environment (in this
+            case the netlist instance).
+        method (str): Same as method argument.
+        cachesize (int): Same as cachesize argument.
+        ic (dict): A dictionary containing initial node potentials and branch
+            flows/currents. Keys/Values are of the form:
+                v(<NODE_NAME>):POTENTIAL
+                i(<ELEMENT_NAME>):CURRENT
+            Populated from .ic directives in the netlist.
+    """
+
+    TRAP = 'trap'
+    EXACT = 'exact'
+
+    def __init__(self, env, timestep, state_mux, state_demux=None, ic=None,
+                 stepsize=None, method='trap', cachesize=32, *args, **kwargs):
+        if method not in (LinearSimulator.TRAP, LinearSimulator.EXACT):
+            raise ValueError('Method does not exist.')
+        if method == LinearSimulator.EXACT and expm is None:
+            raise ImportError('scipy is required for the exact method.')
+        self.netlist = env
+        self.timestep = timestep
+        self.stepsize = timestep if stepsize is None else stepsize
+        self.method = method
+        self.cachesize = cachesize
+        self._cache = OrderedDict()     # (configuration, stepsize): (system, mat, vec)
+        self._state_mux = state_mux
+        self._state_demux = state_demux if state_demux is not None else\
+                            lambda w, x, y, z: z
+        self.ic = self._parse_ic() if ic is None else ic
+        self._ic = self._parse_ic()     # last parsed .ic directives
+        self._changes = env.track()     # netlist changes since last key
+        self._key = None                # configuration key of netlist
+
+    @property
+    def env(self):
+        return self.netlist
+
+
+    def __del__(self):
+        # Stop recording netlist changes once the simulator is discarded.
+        if hasattr(self, '_changes'):
+            self.netlist.untrack(self._changes)
+
+
+    def run(self, state=None, action=None, stepsize=None, **kwargs):
+        """
+        Runs a simulation for the specified time. Passes simulation results to
+        postprocess().
+
+        Args:
+            state (list/tuple/ndarray): A vector of state variables that are used
+                to change self.netlist.
+            action (list/tuple/ndarray): A vector of action variables that are used
+                to change self.netlist.
+            stepsize (float): Time over which to run simulation. Defaults to
+                self.stepsize if None.
+        Returns:
+            A vector of state variables describing the new state.
+        """
+        stepsize = self.stepsize if stepsize is None else stepsize
+        if state is not None or action is not None:
+            self.set_state(state, action)
+        system, mat, vec = self._configuration(stepsize)
+        x0 = self._initial(system)
+        return self.postprocess(state, action, self._result(system, mat @ x0 + vec))
+
+
+    def run_many(self, states, actions, stepsize=None, **kwargs):
+        """
+        Runs a simulation for each pair of state and action vectors, in order.
+        Equivalent to calling run() for each pair.
+
+        Args:
+            states (list/ndarray): A sequence/2D array of state vectors.
+            actions (list/ndarray): A sequence/2D array of action vectors of
+                the same length as states.
+            stepsize (float/list/ndarray): Time over which to run each
+                simulation. Either a single value or one for each pair.
+                Defaults to self.stepsize if None.
+
+        Returns:
+            A 2D array where each row is the state vector after simulation.
+        """
+        stepsize = [stepsize] * len(states) if np.ndim(stepsize) == 0 else stepsize
+        return np.array([self.run(state, action, step, **kwargs) for state, action, step\
+                         in zip(states, actions, stepsize)])
+
+
+    def postprocess(self, prev_state, prev_action, result):
+        """
+        Runs any post-processing operations on the result of last simulation.
+        Called by run(). Passes results to state_demux to be converted to a
+        state vector.
+        * Stores initial conditions from result for the next simulator run.
+
+        Args:
+            prev_state (list/tuple/ndaray): The state vector of the last state.
+            prev_action (list/tuple/ndaray): The action taken from prev_state.
+            result (dict): Node potentials and branch currents at the end of
+                the simulation.
+
+        Returns:
+            The state vector of the new state after simulation.
+        """
+        self.ic = result
+        return self._state_demux(prev_state, prev_action, self.netlist, result)
+
+
+    def set_state(self, state, action):
+        """
+        Modifies the environment (netlist) according to the state/action variables.
+        Changes can be additions/removals of circuit elements and modifications
+        in element parameters. The circuit equations are rebuilt from the
+        netlist on the next run, unless the configuration is cached. Initial
+        conditions are only re-parsed if .ic directives were changed.
+
+        Args:
+            state (list/tuple/ndarray): A list of state variables that are used
+                to change self.netlist.
+            action (list/tuple/ndarray): The action vector on the state.
+        """
+        netlist = self._state_mux(state, action, self.netlist)   # get modified netlist
+        if netlist is not self.netlist:
+            self.netlist.untrack(self._changes)
+            self.netlist = netlist
+            self._changes = netlist.track()
+            self._key = None
+            self._ic = self._parse_ic()
+        elif '.ic' in self._changes:
+            self._changes.discard('.ic')
+            self._ic = self._parse_ic()         # get new initial conditions
+        self.ic = dict(self._ic)
+
+
+    def clear_cache(self):
+        """
+        Discards all cached circuit configurations. Only needed if block
+        definitions are changed, since those changes are not detected.
+        """
+        self._cache.clear()
+
+
+    def _configuration(self, stepsize):
+        """
+        Returns the circuit equations and propagator for the current netlist
+        and stepsize. They are only computed if the configuration is not in
+        the cache. Only the initial conditions then need to be applied.
+
+        Args:
+            stepsize (float): Duration of simulation.
+
+        Returns:
+            A tuple of (system, mat, vec). See assemble() and _propagator().
+        """
+        directives = set([c for c in self._changes if c.startswith('.')])
+        if self._key is None or len(self._changes) > len(directives):
+            # The key is only recomputed when elements were changed.
+            self._key = tuple((e.name, e.value, *map(str, e.nodes),
+                               *map(str, e.passive_nodes), *e.kwargs.items())\
+                              for e in self.netlist.elements)
+            self._changes.intersection_update(directives)
+        key = (self._key, stepsize)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        system = self.assemble()
+        entry = (system, *self._propagator(system, stepsize))
+        if self.cachesize > 0:
+            self._cache[key] = entry
+            while len(self._cache) > self.cachesize:
+                self._cache.popitem(last=False)
+        return entry
+
+
+    def assemble(self):
+        """
+        Builds the MNA matrices from self.netlist.
+
+        Returns:
+            A dict with keys:
+                'G', 'C' (ndarray): Square conductance and capacitance matrices.
+                'b' (ndarray): Vector of independent source values.
+                'nodes' (dict): Node name: index in x.
+                'branches' (dict): Element name: index of branch current in x.
+        """
+        elems = self._elements()
+        nodes = {}
+        branches = {}
+        for elem in elems:
+            for node in list(elem.nodes) + list(elem.passive_nodes):
+                if str(node) != '0' and str(node) not in nodes:
+                    nodes[str(node)] = len(nodes)
+        for elem in elems:
+            if elem.name[0] in ('v', 'e', 'h', 'l'):
+                branches[elem.name] = len(nodes) + len(branches)
+        size = len(nodes) + len(branches)
+        # Ground potential is not a variable. Stamps on it are ignored by
+        # sending them to an extra row/column that is discarded.
+        G = np.zeros((size + 1, size + 1))
+        C = np.zeros((size + 1, size + 1))
+        b = np.zeros(size + 1)
+        ind = lambda node: nodes.get(str(node), size)
+
+        for elem in elems:
+            kind = elem.name[0]
+            n1, n2 = ind(elem.nodes[0]), ind(elem.nodes[1])
+            # resistors and capacitors
+            if kind in ('r', 'c'):
+                mat, val = (G, 1. / float(elem.value)) if kind == 'r' \
+                           else (C, float(elem.value))
+                mat[n1, n1] += val
+                mat[n2, n2] += val
+                mat[n1, n2] -= val
+                mat[n2, n1] -= val
+            # independent current sources. Current flows from the first node
+            # through the source to the second node.
+            elif kind == 'i':
+                val = self._source_value(elem)
+                b[n1] -= val
+                b[n2] += val
+            # voltage controlled current sources
+            elif kind == 'g':
+                sn1, sn2 = ind(elem.passive_nodes[0]), ind(elem.passive_nodes[1])
+                val = float(elem.value)
+                G[n1, sn1] += val
+                G[n1, sn2] -= val
+                G[n2, sn1] -= val
+                G[n2, sn2] += val
+            # current controlled current sources
+            elif kind == 'f':
+                ctrl = self._control(elem, branches)
+                G[n1, ctrl] += float(elem.value[1])
+                G[n2, ctrl] -= float(elem.value[1])
+            # elements with branch currents: V, E, H, L
+            else:
+                k = branches[elem.name]
+                G[n1, k] += 1
+                G[n2, k] -= 1
+                G[k, n1] += 1
+                G[k, n2] -= 1
+                if kind == 'v':
+                    b[k] = self._source_value(elem)
+                elif kind == 'e':
+                    sn1, sn2 = ind(elem.passive_nodes[0]), ind(elem.passive_nodes[1])
+                    G[k, sn1] -= float(elem.value)
+                    G[k, sn2] += float(elem.value)
+                elif kind == 'h':
+                    G[k, self._control(elem, branches)] -= float(elem.value[1])
+                elif kind == 'l':
+                    C[k, k] -= float(elem.value)
+
+        return {'G': G[:-1, :-1], 'C': C[:-1, :-1], 'b': b[:-1],
+                'nodes': nodes, 'branches': branches}
+
+
+    def _elements(self):
+        """
+        Returns the list of elements in self.netlist after checking they can be
+        simulated. Block instances are flattened in a copy of the netlist.
+        """
+        netlist = self.netlist
+        if any(isinstance(e, BlockInstance) for e in netlist.elements):
+            netlist = copy.deepcopy(netlist)
+            netlist.flatten()
+        for elem in netlist.elements:
+            if elem.name[0] not in ('r', 'c', 'l', 'v', 'i', 'e', 'g', 'f', 'h'):
+                raise ValueError('Element: ' + elem.name + ' is not a linear element.')
+        return netlist.elements
+
+
+    def _source_value(self, elem):
+        """
+        Returns the DC value of an independent voltage/current source.
+
+        Args:
+            elem (VoltageSource/CurrentSource): An independent source.
+
+        Returns:
+            A float. 0 if no value is specified.
+        """
+        dc = elem.name[0] + 'dc'
+        stype = elem.param('type')
+        if elem.function is not None or (stype is not None and stype != dc):
+            raise ValueError('Element: ' + elem.name + ' is not a DC source.')
+        value = elem.param(dc)
+        return 0. if value is None else float(value)
+
+
+    def _control(self, elem, branches):
+        """
+        Returns the index of the branch current controlling a current
+        controlled source.
+        """
+        try:
+            return branches[elem.value[0]]
+        except KeyError:
+            raise ValueError('Element: ' + elem.value[0] + ' controlling '\
+                             + elem.name + ' has no branch current.')
+
+
+    def _initial(self, system):
+        """
+        Constructs the initial vector of variables from self.ic. If there are
+        no initial conditions, the DC operating point is used.
+
+        Args:
+            system (dict): Returned by assemble().
+
+        Returns:
+            An ndarray of node potentials and branch currents.
+        """
+        if len(self.ic) == 0:
+            return np.linalg.lstsq(system['G'], system['b'], rcond=None)[0]
+        x0 = np.zeros(len(system['b']))
+        for key, value in self.ic.items():
+            name = key[2:-1]
+            if key[0] == 'v' and name in system['nodes']:
+                x0[system['nodes'][name]] = float(value)
+            elif key[0] == 'i' and name in system['branches']:
+                x0[system['branches'][name]] = float(value)
+        return x0
+
+
+    def _propagator(self, system, stepsize):
+        """
+        Computes the affine map that advances the circuit variables by stepsize:
+
+            x(t + stepsize) = mat @ x(t) + vec
+
+        Args:
+            system (dict): Returned by assemble().
+            stepsize (float): Duration of simulation.
+
+        Returns:
+            A tuple of (mat, vec) ndarrays.
+        """
+        G, C, b = system['G'], system['C'], system['b']
+        try:
+            if self.method == LinearSimulator.EXACT:
+                return self._exact(G, C, b, stepsize)
+            num = max(1, int(np.ceil(stepsize / self.timestep - 1e-9)))
+            h = stepsize / num
+            # Backward Euler first step: (C/h + G) x1 = C/h x0 + b
+            lhs = C / h + G
+            mat = np.linalg.solve(lhs, C / h)
+            vec = np.linalg.solve(lhs, b)
+            # Trapezoidal steps: (2C/h + G) x1 = (2C/h - G) x0 + 2b
+            if num > 1:
+                lhs = 2 * C / h + G
+                tmat = np.linalg.solve(lhs, 2 * C / h - G)
+                tvec = np.linalg.solve(lhs, 2 * b)
+                for _ in range(num - 1):
+                    mat = tmat @ mat
+                    vec = tmat @ vec + tvec
+            return mat, vec
+        except np.linalg.LinAlgError:
+            raise ValueError('Circuit equations are singular. Check for floating nodes.')
+
+
+    def _exact(self, G, C, b, stepsize):
+        """
+        Computes the exact affine propagator of the circuit equations. The
+        variables are split into dynamic variables y (in the row space of C) and
+        algebraic variables z (in the null space of C):
+
+            x = V1 y + V2 z
+
+        The algebraic equations give z as an affine function of y, reducing the
+        system to an ordinary differential equation in y which is solved using
+        the matrix exponential.
+
+        Args:
+            G, C (ndarray): MNA matrices.
+            b (ndarray): Source vector.
+            stepsize (float): Duration of simulation.
+
+        Returns:
+            A tuple of (mat, vec) ndarrays.
+        """
+        U, S, Vt = np.linalg.svd(C)
+        rank = int(np.sum(S > S.max(initial=0) * len(S) * np.finfo(float).eps))
+        U1, U2 = U[:, :rank], U[:, rank:]
+        V1, V2 = Vt[:rank].T, Vt[rank:].T
+        # z = zvec - zmat @ y
+        alg = np.linalg.inv(U2.T @ G @ V2)
+        zmat = alg @ U2.T @ G @ V1
+        zvec = alg @ U2.T @ b
+        # dy/dt = A y + f
+        A = -(U1.T @ G @ (V1 - V2 @ zmat)) / S[:rank, None]
+        f = (U1.T @ (b - G @ V2 @ zvec)) / S[:rank]
+        aug = np.zeros((rank + 1, rank + 1))
+        aug[:rank, :rank] = A
+        aug[:rank, rank] = f
+        step = expm(aug * stepsize)
+        proj = V1 - V2 @ zmat
+        mat = proj @ step[:rank, :rank] @ V1.T
+        vec = proj @ step[:rank, rank] + V2 @ zvec
+        return mat, vec
+
+
+    def _result(self, system, x):
+        """
+        Converts a vector of circuit variables into a result dict.
+
+        Args:
+            system (dict): Returned by assemble().
+            x (ndarray): Node potentials and branch currents.
+
+        Returns:
+            A dict of the form {v(NODE):VOLTAGE, i(ELEMENT):CURRENT...}
+        """
+        res = {'v(' + node + ')': x[i] for node, i in system['nodes'].items()}
+        res.update({'i(' + elem + ')': x[i] for elem, i in system['branches'].items()})
+        return res
+
+
+    def _parse_ic(self):
+        """
+        Parses initial conditions from the netlist instance.
+
+        Returns:
+            A dict of the form {v(NODE):VOLTAGE, i(ELEMENT):CURRENT...}
+        """
+        icdict = {}
+        if 'ic' in self.netlist.directives:
+            for ic in self.netlist.directives['ic']:
+                icdict.update(ic.kwargs)
+        if 'name' in icdict:
+            del icdict['name']
+        return icdict
@@ -51,9 +51,9 @@ class Netlist(Block):
         #     raise AttributeError('Specify either netlist or path.')
         if len(netlist) > 0:
             netlist = self._sanitize('\n'.join(netlist)).split('\n')
-            self._parse_directives(netlist)
         super().__init__(name=name, nodes=(), definition=netlist, sanitize=False,\
                             *args, **kwargs)
+        self._parse_directives(netlist)
 
     @property
     def definition(self):
@@ -118,6 +118,9 @@ class Netlist(Block):
         """
         if not isinstance(directive, Directive):
             directive = Directive(definition=directive)
+        # Changes to directive parameters are recorded like element changes
+        directive._changelogs = self._changelogs
+        self._record(directive)
         if directive.kind in self.directives:
             self.directives[directive.kind].append(directive)
         else:
@@ -13,13 +13,12 @@ import os
 os.environ['LANG'] = 'en_US.UTF-8'
 try:
     import ahkab
+    # Fixed time-step too small error. Make larger if errors persist.
+    ahkab.options.transient_max_nr_iter = 1000
 except ImportError:
     print("Ahkab could not be imported. Netlist-based simulation will not work.")
 import numpy as np
 
-# Fixed time-step too small error. Make larger if errors persist.
-ahkab.options.transient_max_nr_iter = 1000
-
 
 class Simulator:
     """
@@ -85,12 +84,20 @@ class Simulator:
         self._state_demux = state_demux if state_demux is not None else\
                             lambda w, x, y, z: z
         self.ic = self._parse_ic() if ic is None else ic
+        self._ic = self._parse_ic()             # last parsed .ic directives
+        self._changes = env.track()             # netlist changes since last sync
 
     @property
     def env(self):
         return self.netlist
 
 
+    def __del__(self):
+        # Stop recording netlist changes once the simulator is discarded.
+        if hasattr(self, '_changes'):
+            self.netlist.untrack(self._changes)
+
+
     def preprocess(self, netlist):
         """
         preprocess() is called right after Simulator is instantiated. It performs
@@ -99,15 +106,45 @@ class Simulator:
         * Converts a Netlist instance into an ahkab.Circuit instance.
         * Extracts initial conditions for the first simulator run.
 
+        The definition is handed to ahkab's parsers in memory (the same steps
+        as ahkab.netlist_parser.parse_circuit without reading a file), so no
+        files are written to the working directory.
+
         Args:
             netlist (Netlist): a Netlist instance. Must have a node named '0'.
                 Required by ahkab.Circuit.
+
+        Returns:
+            An ahkab.Circuit instance.
         """
-        temp_file = netlist.name + '.net.temp'
-        with open(temp_file, 'w') as net:
-            net.write(netlist.definition)
-        circuit, _, _ = ahkab.netlist_parser.parse_circuit(temp_file)
-        os.remove(temp_file)
+        parser = ahkab.netlist_parser
+        lines = netlist.definition.lower().split('\n')
+        circuit = ahkab.Circuit(title=lines[0].strip(), filename=None)
+        element_lines, model_lines, subckt_lines = [], [], []
+        current = element_lines         # lines go to either netlist or subckt
+        for num, line in enumerate(lines[1:], start=2):
+            line = line.strip()
+            if len(line) == 0 or line[0] == '*':
+                continue
+            keyword = line.split()[0]
+            if keyword == '.subckt':
+                current = [(line, num)]
+            elif keyword == '.ends':
+                subckt_lines.append(current)
+                current = element_lines
+            elif keyword == '.model':
+                model_lines.append((line, num))
+            elif keyword == '.end':
+                break
+            elif line[0] != '.':
+                current.append((line, num))
+        models = parser.parse_models(model_lines)
+        subckts = {}
+        for subckt in subckt_lines:
+            subckt = parser.parse_sub_declaration(subckt)
+            subckts[subckt.name] = subckt
+        circuit += parser.main_netlist_parser(circuit, element_lines, subckts, models)
+        circuit.models = models
         return circuit                 # apply any element changes
 
 
@@ -138,6 +175,27 @@ class Simulator:
         return self.postprocess(state, action, res)
 
 
+    def run_many(self, states, actions, stepsize=None, **kwargs):
+        """
+        Runs a simulation for each pair of state and action vectors, in order.
+        Equivalent to calling run() for each pair.
+
+        Args:
+            states (list/ndarray): A sequence/2D array of state vectors.
+            actions (list/ndarray): A sequence/2D array of action vectors of
+                the same length as states.
+            stepsize (float/list/ndarray): Time over which to run each
+                simulation. Either a single value or one for each pair.
+                Defaults to self.stepsize if None.
+
+        Returns:
+            A 2D array where each row is the state vector after simulation.
+        """
+        stepsize = [stepsize] * len(states) if np.ndim(stepsize) == 0 else stepsize
+        return np.array([self.run(state, action, step, **kwargs) for state, action, step\
+                         in zip(states, actions, stepsize)])
+
+
     def postprocess(self, prev_state, prev_action, result):
         """
         Runs any post-processing operations on the result of last simulation.
@@ -180,34 +238,59 @@ class Simulator:
         * NOT directives/models/block definitions. They should be included in the
           original netlist provided to Simulator.
 
+        Only elements recorded as changed by the netlist since the last call
+        are synchronized (see Block.track()). In-place changes to element
+        nodes should be followed by Element.touch(). If state_mux returns a
+        different Netlist instance, all elements are synchronized.
+
         Args:
             state (list/tuple/ndarray): A list of state variables that are used
                 to change self.netlist and self.circuit.
             action (list/tuple/ndarray): The action vector on the state.
         """
-        self.netlist = self._state_mux(state, action, self.netlist)   # get modified netlist
-        self.ic = self._parse_ic()              # get new initial conditions
-        self._construct_nodes()                 # reconstruct nodes
-        self._create_elements()                 # create new elements
-        self._update_elements()                 # synchronize element parameters
-        self._remove_elements()                 # remove redundant elements
-
-
-    def _update_elements(self):
+        netlist = self._state_mux(state, action, self.netlist)   # get modified netlist
+        if netlist is not self.netlist:
+            self.netlist.untrack(self._changes)
+            self.netlist = netlist
+            self._changes = netlist.track()
+            changes = set([e.name for e in netlist.elements] + ['.ic'])
+            changes.update([e.part_id for e in self.circuit])
+        else:
+            changes = set(self._changes)
+            self._changes.clear()
+        if '.ic' in changes:
+            self._ic = self._parse_ic()         # get new initial conditions
+        self.ic = dict(self._ic)
+        names = set([c for c in changes if not c.startswith('.')])
+        if len(names):
+            if self._construct_nodes():         # reconstruct nodes
+                names = None                    # node indices changed for all
+            self._create_elements(names)        # create new elements
+            self._update_elements(names)        # synchronize element parameters
+            self._remove_elements(names)        # remove redundant elements
+
+
+    def _update_elements(self, names=None):
         """
         Synchronizes any structural changes made to self.netlist with ahkab.Circuit
         used by the third-party ahkab simulator:
         * Modifications in element parameters (including reference model),
         * Does NOT handle new models/block definitions/instances. All models/blocks
           to be used should be included from the beginning.
+
+        Args:
+            names (set): Names of elements to synchronize. If None, all elements
+                are synchronized.
         """
         #TODO: Support block instances/definitions.
         node_dict = self.circuit.nodes_dict
+        elements = {e.name: e for e in self.netlist.elements}
         for element in self.circuit:
+            if names is not None and element.part_id not in names:
+                continue
             # change params for elems that still exist
             try:
-                ind = self.netlist.elements.index(element.part_id)
-                elem = self.netlist.elements[ind]
+                elem = elements[element.part_id]
                 # transistor elements (ekv or mosq)
                 if element.part_id[0] == 'm':
                     element.n1 = node_dict[str(elem.nodes[0])]
@@ -311,20 +394,25 @@ class Simulator:
                     element.n2 = node_dict[str(elem.nodes[1])]
                     element.value = float(elem.value)
             # if element does not exist anymore
-            except ValueError:
+            except KeyError:
                 # non-existent elements removed by self._remove_elements()
                 pass
 
 
-    def _create_elements(self):
+    def _create_elements(self, names=None):
         """
         Identifies new elements in self.netlist but not yet in self.circuit
         and creates them. Elements are created with basic properties. All
         attributes are checked/assigned in the _update_elements() function
         called after _create_elements().
+
+        Args:
+            names (set): Names of elements that may be new. If None, all
+                elements are checked.
         """
-        part_ids = [e.part_id for e in self.circuit]
-        new_elems = [e for e in self.netlist.elements if e.name not in part_ids]
+        part_ids = set([e.part_id for e in self.circuit])
+        new_elems = [e for e in self.netlist.elements if e.name not in part_ids\
+                     and (names is None or e.name in names)]
         for elem in new_elems:
             # transistor elements (ekv or mosq)
             if elem.name[0] == 'm':
@@ -390,14 +478,19 @@ class Simulator:
                                           elem.value)
 
 
-    def _remove_elements(self):
+    def _remove_elements(self, names=None):
         """
         Identifies elements that are still in self.circuit (ahkab.Circuit) but
         not in self.netlist (Netlist). Then removes them from self.circuit.
+
+        Args:
+            names (set): Names of elements that may be removed. If None, all
+                elements are checked.
         """
-        element_names = [e.name for e in self.netlist.elements]
+        element_names = set([e.name for e in self.netlist.elements])
         old_elems_ind = [i for i, e in enumerate(self.circuit)\
-                         if e.part_id not in element_names]
+                         if e.part_id not in element_names\
+                         and (names is None or e.part_id in names)]
         for index in old_elems_ind[::-1]:
             self.circuit.pop(index)
 
@@ -422,8 +515,13 @@ class Simulator:
     def _construct_nodes(self):
         """
         Constructs the node map in ahkab.Circuit.nodes_dict using netlist.graph.
+
+        Returns:
+            True if the node map changed.
         """
         nodes = {0:'0', '0':0}
         for i, node in enumerate([n for n in self.netlist.graph if n != '0']):
             nodes.update({i+1:str(node), str(node):i+1})
+        changed = nodes != self.circuit.nodes_dict
         self.circuit.nodes_dict = nodes
+        return changed
@@ -12,6 +12,7 @@ try:
     from blocks import Block
     from netlist import Netlist
     from simulate import Simulator
+    from linear import LinearSimulator
 except ImportError:
     from .flags import FlagGenerator
     from .elements import *
@@ -20,6 +21,7 @@ except ImportError:
     from .blocks import Block
     from .netlist import Netlist
     from .simulate import Simulator
+    from .linear import LinearSimulator
 
 NUM_TESTS = 0
 TESTS_PASSED = 0
@@ -86,6 +88,15 @@ def test_flag_generator():
     assert np.array_equal(gen3.decode(1), [-4.55]), 'Decoding failed.'
     assert gen3.encode(*gen3.decode(1)) == 1, 'Encoding decoding mismatch.'
 
+    # Test 4: Batch encoding and decoding
+    decoded = gen.decode_many(np.arange(states))
+    assert decoded.shape == (states, len(flags)), 'Batch decoding shape mismatch.'
+    assert np.array_equal(decoded[12], gen.decode(12)), 'Batch decoding failed.'
+    assert np.array_equal(gen.encode_many(decoded), np.arange(states)), \
+        'Batch encoding decoding mismatch.'
+    assert np.array_equal(gen3.encode_many(gen3.decode_many([1, 20])), [1, 20]), \
+        'Batch encoding decoding mismatch.'
+
 
 @test
 def test_node_class():
@@ -381,10 +392,92 @@ def test_netlist_class():
     assert str(ninstance1) == '\n'.join(net_list), 'Netlist to str failed.'
     assert str(ninstance2) == '\n'.join(net_list), 'Netlist to str failed.'
 
+    # Test 3: Tracking changes
+    changes = ninstance1.track()
+    ninstance1.element('r1').value = 1000.0
+    assert len(changes) == 0, 'Unchanged parameters recorded.'
+    ninstance1.element('r1').value = 10.0
+    ninstance1.directives['ic'][0].param('v(t1)', 5)
+    ninstance1.remove('c1')
+    assert changes == {'r1', 'c1', '.ic'}, 'Changes incorrectly recorded.'
+    changes.clear()
+    ninstance1.add(Resistor(definition='r2 t1 0 1'))
+    ninstance1.element('r2').value = 2.0
+    assert changes == {'r2'}, 'Added element changes not recorded.'
+    ninstance1.untrack(changes)
+    ninstance1.element('r2').value = 3.0
+    assert changes == {'r2'}, 'Untracked changes recorded.'
+
     # Finalizing
     os.remove('test.net')
 
 
+@test
+def test_linear_simulator_class():
+    """Test linear circuit simulator"""
+
+    # Set up
+    net = ('*Test Circuit',
+           'C1 n1 0 1e-3',
+           'R1 n1 0 2e3',
+           'R2 n1 0 2e3',
+           'I1 0 n2 type=idc idc=1e-3',
+           'C2 n2 0 1e-3',
+           '.ic V(n1)=10',
+           '.end')
+
+    def state_mux(state, action, netlist):
+        netlist.element('i1').param('idc', action)
+        return netlist
+
+    for method in (LinearSimulator.TRAP, LinearSimulator.EXACT):
+        # Test 1: Instantiation
+        ninstance = Netlist('Test', netlist=net)
+        sim = LinearSimulator(env=ninstance, timestep=1e-3, state_mux=state_mux,
+                              method=method)
+        assert sim.ic == {'v(n1)':'10'}, 'Initial conditions incorrectly parsed.'
+
+        # Test 2: RC discharge and current source charging
+        res1 = sim.run(stepsize=1)
+        assert abs(res1['v(n1)'] - 10 * np.exp(-1)) < 1e-3, 'Incorrect RC discharge.'
+        assert abs(res1['v(n2)'] - 1) < 1e-6, 'Incorrect current source charging.'
+
+        # Test 3: State persists between runs and changes with actions
+        res2 = sim.run(stepsize=1)
+        assert abs(res2['v(n1)'] - 10 * np.exp(-2)) < 1e-3, 'Simulator state does not persist.'
+        res3 = sim.run(None, 0, stepsize=1)
+        assert abs(res3['v(n2)']) < 1e-6, 'Netlist changes not applied.'
+
+        # Test 4: Configurations are cached and reused
+        assert len(sim._cache) == 2, 'Configurations not cached.'
+        sim.run(None, 1e-3, stepsize=1)
+        assert len(sim._cache) == 2, 'Cached configuration not reused.'
+        sim.cachesize = 1
+        sim.run(None, 1e-3, stepsize=2)
+        assert len(sim._cache) == 1, 'Cache size not bounded.'
+
+        # Test 5: Running batches of states and actions
+        res4 = sim.run_many([None, None], [0, 0], stepsize=[1, 1])
+        assert len(res4) == 2, 'Incorrect number of batch results.'
+        assert all([abs(r['v(n1)'] - 10 * np.exp(-1)) < 1e-3 for r in res4]), \
+            'Batch simulation failed.'
+
+    # Test 6: Nonlinear elements are rejected
+    ninstance.add(Diode(definition='d1 n1 0 dd'))
+    try:
+        sim.run(stepsize=1)
+        assert False, 'Nonlinear element not rejected.'
+    except ValueError:
+        pass
+
+    # Test 7: Discarded simulators and replaced netlists are untracked
+    logs = len(ninstance._changelogs)
+    LinearSimulator(env=ninstance, timestep=1e-3, state_mux=state_mux)
+    sim._state_mux = lambda state, action, netlist: Netlist('Test', netlist=net)
+    sim.run(None, 0, stepsize=1)
+    assert len(ninstance._changelogs) == logs - 1, 'Change sets not untracked.'
+
+
 #@test
 def test_simulator_class():
     """Test circuit simulator"""
@@ -413,6 +506,7 @@ def test_simulator_class():
         elif state == 2:
             cap = netlist.element('s1') # reversing state = 1 changes
             cap.nodes[1] = Node('n2')
+            cap.touch()                 # in-place node change
             netlist.add(Resistor(definition='R1 n2 n3 1e3'))
             netlist.add(Diode(definition='d1 n3 0 dd'))
         elif state == 3:                # adding an NMOS device
@@ -470,6 +564,7 @@ if __name__ == '__main__':
     test_directive_class()
     test_block_class()
     test_netlist_class()
+    test_linear_simulator_class()
     test_simulator_class()
     print('\n==========\n')
     print('Tests passed:\t' + str(TESTS_PASSED))
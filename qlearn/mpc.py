@@ -0,0 +1,433 @@
+"""
+This module defines the ModelPredictiveController class. It is a subclass of
+SLearner that does not learn a value function. Instead, at each step it does a
+receding horizon look-ahead over the states reachable with a model of the
+system (the simulator) and recommends the first action on the path to the
+state that minimizes a static cost ("distance" from the ideal state). See the
+receding horizon online supervision algorithm by Abdelwahed et al.
+
+The look-ahead tree is expanded one level at a time. The states in a level are
+stepped through the simulator in batches (if it has run_many()). The size of
+the tree is limited by:
+
+* Beam width: Only the lowest cost states of each level are expanded further.
+* Time budget: The search stops after the current batch once the budget is
+    spent and returns the best state found so far. The first level is always
+    complete, unless there is a plan from a warm start.
+* Duplicate pruning: States that round to the same point on a grid of some
+    resolution are only expanded once.
+
+Without limits, the search is exhaustive i.e. num_actions^horizon states.
+
+The subtrees under the first level can be searched in parallel by forked worker
+processes, each with its own copy of the simulator. The workers are forked
+once and kept until close() is called. Watched simulator attributes (e.g. the
+fault) and search limits are sent to workers with each search, so changes to
+them need no new workers. The actions sampled from
+a state only depend on a seed drawn once per recommend() and the path to the
+state, so workers sample the same actions as the serial search. Ties are
+broken in favour of the shallowest, then first generated state. Without beam
+or resolution limits or warm starts, the parallel search recommends the same
+actions as the serial search.
+
+Consecutive states usually differ by one step. With warm starts, the path to
+the best state found is kept as a plan. At the next step the plan is shifted
+by the action taken, and re-simulated from the new state to get the costs of
+its states. The best state on it is the incumbent, which the search returns
+unless it finds a lower cost. The plan's states are added to each level of
+the search if the beam or sampling dropped them, so the plan's subtree is
+always expanded. If the time budget is spent before the first level, the
+incumbent is returned without searching.
+
+Usage:
+    mpc = ModelPredictiveController(dmap, simulator, stateconverter,
+                                    actionconverter, depth=5, beam=64)
+    avec = mpc.recommend(svec)
+    mpc.close()     # if searching in parallel
+"""
+
+import time
+import zlib
+import multiprocessing
+import numpy as np
+try:
+    from slearner import SLearner
+except ImportError:
+    from .slearner import SLearner
+
+
+# The controller inherited by forked search workers.
+_WORKER_STATE = None
+
+
+def _search_worker(args):
+    """
+    Searches subtrees of the look-ahead tree in a worker process.
+
+    Args:
+        args (tuple): Frontier states and paths (see _search()), the deadline,
+            the seed for sampling actions, a seed for the random number
+            generator of the simulator, the plan to seed the search with, and
+            dicts of controller and simulator attributes to update.
+
+    Returns:
+        A tuple of the best (cost, path) found (or None) and the number of
+        states expanded.
+    """
+    states, paths, deadline, seed, simseed, plan, settings, simstate = args
+    controller = _WORKER_STATE
+    for name, value in settings.items():
+        setattr(controller, name, value)
+    for name, value in simstate.items():
+        setattr(controller.simulator, name, value)
+    if hasattr(controller.simulator, 'random'):
+        controller.simulator.random = np.random.RandomState(simseed)
+    best, _, _ = controller._search(states, paths, deadline, seed, plan=plan)
+    return best, controller.expanded
+
+
+
+class ModelPredictiveController(SLearner):
+    """
+    Uses Model Predictive Control to recommend actions. Has the interface of
+    an SLearner but learn() does nothing.
+
+    Args:
+        dmap (func): A function that takes the state vector and returns a number
+            representing the "distance" from ideal state.
+        simulator:  An object with a run() function that takes state and action
+            vectors and an optional stepsize argument. Returns the next state
+            vector. If it has a run_many() function that takes lists of state
+            and action vectors, it is used to step all states of a level at once.
+        state/actionconverter (FlagGenerator): Encodes/Decodes vectors into
+            integer representation (mostly for compatibility w/ SLearner)
+        depth (int): The look-ahead horizon is depth + 1 actions.
+        density (float): The fraction of actions sampled from each state.
+        seed (int): Random number generator seed. Otherwise random.
+        beam (int): Maximum number of states expanded in each level. Default
+            None i.e. all states.
+        budget (float): Time in seconds after which the search stops expanding
+            states. Default None i.e. no limit.
+        resolution (float/ndarray): Grid size (for each state variable) used to
+            detect duplicate states. Default None i.e. no pruning.
+        workers (int): Number of processes searching first level subtrees in
+            parallel. Requires the 'fork' start method (i.e. not Windows). The
+            beam and duplicate pruning then apply within each worker's
+            subtrees. Transitions simulated by workers are not added to this
+            instance's cache. In a daemonic process (e.g. a multiprocessing.Pool
+            worker), which cannot have children, the search is serial. 0 => all
+            cores. Default 1.
+        warmstart (bool): Whether to keep the best path as a plan to seed the
+            search at the next step. Default False.
+        chunksize (int): Number of states stepped in each batch, between checks
+            of the time budget. Default 256.
+        watch (tuple): Names of simulator attributes sent to workers with each
+            search. Other changes to the simulator after the workers are
+            forked do not reach them. Default ('fault', 'noise').
+
+    Instance Attributes:
+        dmap/simulator/depth/density/beam/budget/resolution/workers/warmstart/
+            chunksize/watch: Same as args.
+        random (np.random.RandomState): A random number generator local to this
+            instance.
+        expanded (int): Number of states simulated by the last recommend().
+        plan (ndarray): Action indices of the path to the best state found by
+            the last recommend() if warm starting. Else None.
+    """
+
+    def __init__(self, dmap, simulator, stateconverter, actionconverter, depth=1,
+                 density=1, seed=None, beam=None, budget=None, resolution=None,
+                 workers=1, warmstart=False, chunksize=256,
+                 watch=('fault', 'noise')):
+        self.random = np.random.RandomState() if seed is None else np.random.RandomState(seed)
+        self.dmap = dmap                   # cost measure to minimize
+        self.depth = depth
+        self.density = density
+        self.beam = beam
+        self.budget = budget
+        self.resolution = resolution
+        self.workers = workers
+        self.warmstart = warmstart
+        self.chunksize = chunksize
+        self.watch = watch
+        self.simulator = simulator
+        self.stateconverter = stateconverter
+        self.actionconverter = actionconverter
+        self.funcdim = 1                    # for compatibility
+        self._avecs = [avec for avec in self.actionconverter]
+        self._amatrix = np.array(self._avecs)
+        self.expanded = 0
+        self.plan = None
+        self._noderandom = np.random.RandomState()  # reseeded for each state
+        self._pool = None                   # forked search workers
+        self._poolsize = 0                  # number of forked workers
+
+        self.weights = np.ones((1, 13)) # just for compatibility
+        self.set_replay(0)
+        self.set_cache(0)
+
+
+    def learn(self, *args, **kwargs):
+        """
+        An MPC has no learning phase.
+        """
+        return [[]], [[]]
+
+
+    def reset(self):
+        """
+        Discards the plan kept for warm starts.
+        """
+        super().reset()
+        self.plan = None
+
+
+    def close(self):
+        """
+        Stops the search worker processes, if any. They are forked again by
+        the next parallel search.
+        """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+
+    def recommend(self, state, **kwargs):
+        """
+        Searches for the lowest cost state reachable within the horizon.
+
+        Args:
+            state (ndarray/list/tuple): The current state vector.
+
+        Returns:
+            The first action vector on the path to the lowest cost state. None
+            if no actions were sampled.
+        """
+        deadline = None if self.budget is None else time.perf_counter() + self.budget
+        seed = self.random.randint(2**31 - 1)
+        states = np.asarray(state, dtype=float)[None, :]
+        paths = np.zeros((1, 0), dtype=int)
+        incumbent, plan = self._verify(states[0]) if self.warmstart else (None, None)
+        if self.workers == 1 or multiprocessing.current_process().daemon:
+            best, _, _ = self._search(states, paths, deadline, seed, plan=plan)
+        else:
+            best = self._search_parallel(states, paths, deadline, seed, plan=plan)
+        if incumbent is not None and (best is None or incumbent[0] <= best[0]):
+            best = incumbent
+            self.plan = plan[0]
+        else:
+            self.plan = None if best is None or not self.warmstart else best[1]
+        if best is None:
+            return None
+        return np.array(self._avecs[best[1][0]])
+
+
+    def _verify(self, state):
+        """
+        Shifts the plan by one step and simulates it from the state.
+
+        Args:
+            state (ndarray): The current state vector.
+
+        Returns:
+            A tuple of the incumbent (cost, path) of the lowest cost state on
+            the plan (or None), and a tuple of the shifted plan's action
+            indices and its states (or None).
+        """
+        if self.plan is None or len(self.plan) < 2:
+            return None, None
+        path = self.plan[1:]
+        runner = self._runner()
+        states = []
+        for action in path:
+            state = np.asarray(runner.run(state, self._amatrix[action]), dtype=float)
+            states.append(state)
+        costs = [self.dmap(s) for s in states]
+        i = int(np.argmin(costs))   # first occurrence on ties
+        return (costs[i], path[:i + 1]), (path, np.array(states))
+
+
+    def _search(self, states, paths, deadline, seed, levels=None, plan=None):
+        """
+        Expands the look-ahead tree level by level from a frontier of states.
+
+        Args:
+            states (ndarray): [K x n] frontier states.
+            paths (ndarray): [K x d] action indices that lead to each frontier
+                state from the root.
+            deadline (float): time.perf_counter() value after which no more
+                states are expanded. None for no limit.
+            seed (int): Seed for sampling actions (see _expand()).
+            levels (int): Maximum number of levels to expand. Default None
+                i.e. up to the horizon.
+            plan (tuple): Action indices of a plan from the root and its
+                states. They are added to levels that do not have them.
+                Ignored if the frontier is not on the plan.
+
+        Returns:
+            A tuple of:
+            - (cost, path) of the lowest cost state found, where ties go to the
+                shallowest state generated first. None if no state was
+                generated.
+            - The states and paths of the last frontier.
+        """
+        stop = self.depth + 1
+        if levels is not None:
+            stop = min(stop, paths.shape[1] + levels)
+        best = None
+        if plan is not None and\
+           not np.any(np.all(paths == plan[0][:paths.shape[1]], axis=1)):
+            plan = None
+        seen = set()
+        if self.resolution is not None:
+            self._unique(states, seen)
+        self.expanded = 0
+        for _ in range(paths.shape[1], stop):
+            if len(states) == 0:
+                break
+            # Without an incumbent, the first level is complete so there is
+            # a state to return.
+            limit = deadline if best is not None or plan is not None else None
+            if limit is not None and time.perf_counter() >= limit:
+                break
+            states, paths, costs = self._expand(states, paths, seed, limit)
+            self.expanded += len(states)
+            if self.resolution is not None:
+                keep = self._unique(states, seen)
+                states, paths, costs = states[keep], paths[keep], costs[keep]
+            if len(costs) > 0:
+                i = np.argmin(costs)    # first occurrence on ties
+                if best is None or costs[i] < best[0]:
+                    best = (costs[i], paths[i])
+            if self.beam is not None and len(costs) > self.beam:
+                keep = np.sort(np.argsort(costs, kind='stable')[:self.beam])
+                states, paths = states[keep], paths[keep]
+            level = paths.shape[1]
+            if plan is not None and level <= len(plan[0]) and\
+               not np.any(np.all(paths == plan[0][:level], axis=1)):
+                states = np.r_[states, plan[1][level - 1:level]]
+                paths = np.r_[paths, plan[0][None, :level]]
+        return best, states, paths
+
+
+    def _search_parallel(self, states, paths, deadline, seed, plan=None):
+        """
+        Expands the first level of the look-ahead tree and divides the
+        subtrees under it between forked worker processes. Each task gets a
+        contiguous range of first level states so the results can be merged in
+        the order the serial search generates states. The workers are forked
+        on the first call, or if the number of workers changed.
+
+        Returns:
+            The lowest cost (cost, path) found. See _search().
+        """
+        best, states, paths = self._search(states, paths, deadline, seed, levels=1,
+                                           plan=plan)
+        expanded = self.expanded
+        if len(states) == 0 or paths.shape[1] > self.depth or\
+           (deadline is not None and time.perf_counter() >= deadline):
+            return best
+        workers = self.workers or multiprocessing.cpu_count()
+        simseeds = np.random.RandomState(seed).randint(2**31 - 1, size=workers)
+        settings = {name: getattr(self, name) for name in\
+                    ('depth', 'density', 'beam', 'resolution', 'chunksize')}
+        simstate = {name: getattr(self.simulator, name) for name in self.watch\
+                    if hasattr(self.simulator, name)}
+        chunks = [(s, p, deadline, seed, simseed, plan, settings, simstate)\
+                  for s, p, simseed in zip(np.array_split(states, workers),
+                                           np.array_split(paths, workers), simseeds)\
+                  if len(s) > 0]
+
+        if self._pool is not None and self._poolsize != workers:
+            self.close()
+        if self._pool is None:
+            global _WORKER_STATE
+            _WORKER_STATE = self
+            try:
+                self._pool = multiprocessing.get_context('fork').Pool(workers)
+                self._poolsize = workers
+            finally:
+                _WORKER_STATE = None
+        results = self._pool.map(_search_worker, chunks)
+
+        # Merge in generation order: a later state only wins with lower cost,
+        # or equal cost at a shallower level.
+        for result, count in results:
+            expanded += count
+            if result is not None and (best is None or\
+               (result[0], len(result[1])) < (best[0], len(best[1]))):
+                best = result
+        self.expanded = expanded
+        return best
+
+
+    def _expand(self, states, paths, seed, deadline=None):
+        """
+        Steps each frontier state with a sample of actions, in batches of about
+        chunksize next states, and computes their costs. The actions sampled
+        from a state are determined by the seed and the path to the state, so
+        they do not depend on which other states are in the frontier.
+
+        Args:
+            deadline (float): time.perf_counter() value after which no more
+                batches are stepped. At least one batch is. None for no limit.
+
+        Returns:
+            A tuple of the next states, their paths, and their costs, ordered
+            by frontier state and then by sampled action.
+        """
+        num = len(self._avecs)
+        sample = int(np.ceil(num * self.density))
+        if len(states) == 0 or sample == 0:
+            return np.empty((0, states.shape[1])), np.empty((0, paths.shape[1] + 1),\
+                   dtype=int), np.empty(0)
+        step = max(1, self.chunksize // sample)
+        runner = self._runner()
+        nstates, npaths, costs = [], [], []
+        for start in range(0, len(states), step):
+            chunk, cpaths = states[start:start + step], paths[start:start + step]
+            actions = np.empty((len(chunk), sample), dtype=int)
+            for i in range(len(chunk)):
+                self._noderandom.seed(zlib.crc32(cpaths[i].tobytes(), seed))
+                order = np.arange(num)
+                self._noderandom.shuffle(order)
+                actions[i] = order[:sample]
+            actions = actions.ravel()
+            parents = np.repeat(np.arange(len(chunk)), sample)
+            if hasattr(runner, 'run_many'):
+                cstates = runner.run_many(chunk[parents], self._amatrix[actions])
+            else:
+                cstates = [runner.run(chunk[p], self._amatrix[a])\
+                           for p, a in zip(parents, actions)]
+            cstates = np.asarray(cstates, dtype=float)
+            nstates.append(cstates)
+            npaths.append(np.c_[cpaths[parents], actions])
+            costs.append([self.dmap(s) for s in cstates])
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+        return np.concatenate(nstates), np.concatenate(npaths),\
+               np.concatenate(costs).astype(float)
+
+
+    def _runner(self):
+        """
+        Returns the cache of transitions if set, else the simulator.
+        """
+        return self.cache if self.cache is not None else self.simulator
+
+
+    def _unique(self, states, seen):
+        """
+        Returns indices of states that are not duplicates of each other or of
+        states seen before, after rounding to the resolution grid. Adds the
+        new states to seen.
+        """
+        keys = np.round(states / self.resolution).astype(np.int64)
+        keep = []
+        for i, key in enumerate(keys):
+            key = key.tobytes()
+            if key not in seen:
+                seen.add(key)
+                keep.append(i)
+        return np.array(keep, dtype=int)
@@ -40,14 +40,22 @@ All learners expose the following interface:
     keeping any learning parameters provided at instantiation.
 """
 
+import os
+import json
 import numpy as np
 from itertools import zip_longest
 try:
     import utils
+    import qtables
     from algorithms import variablenstep
+    from algorithms import valueiteration, policyiteration
+    from algorithms import batchnstep
 except ImportError:
     from . import utils
+    from . import qtables
     from .algorithms import variablenstep
+    from .algorithms import valueiteration, policyiteration
+    from .algorithms import batchnstep
 
 
 class QLearner:
@@ -57,13 +65,13 @@ class QLearner:
 
     Args:
         rmatrix (ndarray/str): The reward matrix of [n states x m actions]. OR
-            filepath to space delimited rmatrix file. Element [n, m] in the
-            matrix represents the reward for taking action m from state n.
+            filepath to rmatrix file (see utils.read_matrix). Element [n, m]
+            in the matrix represents the reward for taking action m from state n.
         goal (list/tuple/set/array/function): Indices of goal states in rmatrix
             OR a function that accepts a state index and returns true if goal.
         tmatrix (ndarray/str): A transition matrix of [n states x m actions], OR
-            filepath to space delimited tmatrix. Where tmatrix[state, action]
-            contains index of next state. If None, then rmatrix must be square
+            filepath to tmatrix file. Where tmatrix[state, action] contains
+            index of next state. If None, then rmatrix must be square
             of [n states x n states] i.e. no actions but direct state transitions.
         lrate (float): Learning rate for q-learning.
         discount (float): Discount factor for q-learning.
@@ -84,6 +92,8 @@ class QLearner:
             to convey other information to an overridden next_state function.
         seed (int): A seed for all random number generation in instance. Default
             is None.
+        storage (str): How the qmatrix is stored. One of QLearner.[DENSE |
+            COMPACT | SPARSE | MEMMAP] (see qtables module). Default DENSE.
 
     Instance Attributes:
         goal (func): Takes a state number (int) and returns bool whether it is
@@ -92,7 +102,9 @@ class QLearner:
         random (np.random.RandomState): A random number generator local to this
             instance.
         qmatrix (ndarray): A matrix of the same shape as rmatrix where the [i, j]
-            element is the value of taking action j from state i.
+            element is the value of taking action j from state i. Depending on
+            storage, an ndarray, np.memmap or qtables.SparseQTable.
+        storage (str): Same as arg.
     """
 
     UNIFORM = 'uniform'
@@ -102,9 +114,21 @@ class QLearner:
     OFFLINE = 'offline'
     ONLINE = 'online'
 
+    VALUE = 'value'
+    POLICY = 'policy'
+
+    DENSE = qtables.DENSE
+    COMPACT = qtables.COMPACT
+    SPARSE = qtables.SPARSE
+    MEMMAP = qtables.MEMMAP
+
+    # Learned values and hyperparameters stored in checkpoints.
+    _checkpoint_values = ('qmatrix',)
+    _checkpoint_params = ('lrate', 'discount', 'depth', 'steps', 'policy', 'mode')
+
     def __init__(self, rmatrix, goal, tmatrix=None, lrate=0.25, discount=1,
                  policy='uniform', mode='offline', depth=None,
-                 steps=1, seed=None, stepsize=lambda x:1, **kwargs):
+                 steps=1, seed=None, stepsize=lambda x:1, storage='dense', **kwargs):
         if seed is None:
             self.random = np.random.RandomState()
         else:
@@ -115,6 +139,8 @@ class QLearner:
         self.rmatrix = None
         self._goals = set()
         self._policy = None
+        self.storage = storage
+        self._storage_path = None   # file backing MEMMAP storage
 
         self.depth = depth  # set later in set_rq_matrix() if None
         self.steps = steps
@@ -124,6 +150,7 @@ class QLearner:
         self._action_param = {}     # helper parameter for GREEDY/SOFTMAX policies
 
         self._avecs = []            # for subclasses using action vectors
+        self.replay = None          # for subclasses with experience replay
 
         self.set_rq_matrix(rmatrix)
         self.set_transition_matrix(tmatrix)
@@ -149,6 +176,11 @@ class QLearner:
         """Returns number of possible actions"""
         return self.rmatrix.shape[1]
 
+    @property
+    def nbytes(self):
+        """Returns number of bytes used by the qmatrix"""
+        return self.qmatrix.nbytes
+
 
     def set_action_selection_policy(self, policy, mode='offline', **kwargs):
         """
@@ -160,25 +192,35 @@ class QLearner:
             mode (str): One of QLearner.[OFFLINE | ONLINE]. Default OFFLINE.
             max_prob (float): Probability of choosing action with highest utility [0, 1).
         """
-        self._action_param = {}
-        self.mode = mode
-        self.policy = policy
-        if policy == QLearner.UNIFORM:
-            self._policy = self._uniform_policy
-
-        elif policy == QLearner.GREEDY:
+        action_param = {}
+        if policy == QLearner.GREEDY:
             if 'max_prob' in kwargs:
-                self._action_param['max_prob'] = kwargs['max_prob'] \
+                action_param['max_prob'] = kwargs['max_prob'] \
                                      - (1 - kwargs['max_prob']) / self.num_actions
-                self._policy = self._greedy_policy
             else:
                 raise KeyError('"max_prob" keyword argument needed for GREEDY policy.')
+        self._set_policy(policy, mode, action_param)
 
-        elif policy == QLearner.SOFTMAX:
-            self._policy = self._softmax_policy
 
-        else:
+    def _set_policy(self, policy, mode, action_param):
+        """
+        Binds the action selection policy by name and sets its parameters as
+        they are, without deriving any (see set_action_selection_policy()).
+
+        Args:
+            policy (str): One of QLearner.[UNIFORM | GREEDY | SOFTMAX].
+            mode (str): One of QLearner.[OFFLINE | ONLINE].
+            action_param (dict): Parameters of the policy.
+        """
+        policies = {QLearner.UNIFORM: self._uniform_policy,
+                    QLearner.GREEDY: self._greedy_policy,
+                    QLearner.SOFTMAX: self._softmax_policy}
+        if policy not in policies:
             raise ValueError('Policy does not exist.')
+        self._policy = policies[policy]
+        self.policy = policy
+        self.mode = mode
+        self._action_param = action_param
 
 
     def set_rq_matrix(self, rmatrix):
@@ -191,19 +233,38 @@ class QLearner:
                 OR
                 square matrix of [n states x n states] where each element is
                 the reward for n->m transition.
-                If string, then it is path to space delimited matrix file.
+                If string, then it is path to space delimited matrix file or
+                a binary .npy/.npz file. .npy files are memory-mapped read-only.
         """
         if isinstance(rmatrix, np.ndarray):
             self.rmatrix = rmatrix
         elif isinstance(rmatrix, str):
-            self.rmatrix = utils.read_matrix(rmatrix)
+            self.rmatrix = utils.read_matrix(rmatrix, mmap_mode='r')
         else:
             raise TypeError('Either provide filename or ndarray for R matrix.')
-        self.qmatrix = np.zeros(self.rmatrix.shape)
+        self.qmatrix = qtables.create(self.storage, self.rmatrix.shape,
+                                      self._storage_path)
         if self.depth is None:
             self.depth = self.num_states
 
 
+    def set_storage(self, storage, path=None):
+        """
+        Changes how the qmatrix is stored. Existing q-values are copied to
+        the new storage.
+
+        Args:
+            storage (str): One of QLearner.[DENSE | COMPACT | SPARSE | MEMMAP].
+            path (str): File backing MEMMAP storage. If None, a temporary file
+                is used.
+        """
+        qmatrix = qtables.create(storage, self.rmatrix.shape, path)
+        qmatrix[:] = self.qmatrix
+        self.qmatrix = qmatrix
+        self.storage = storage
+        self._storage_path = path
+
+
     def set_goal(self, goal):
         """
         Sets a function that checks if a state is a goal state or not.
@@ -230,12 +291,13 @@ class QLearner:
 
         Args:
             tmatrix (ndarray/str): A transition matrix of [n states x m actions]
-                OR a filepath to the whitespace delimited tmatrix file.
+                OR a filepath to the whitespace delimited tmatrix file, or a
+                binary .npy/.npz file. .npy files are memory-mapped read-only.
             where tmatrix[state, action] contains index of next state.
         """
         if tmatrix is not None:
             if isinstance(tmatrix, str):    # if filepath, read file to matrix
-                tmatrix = utils.read_matrix(tmatrix)
+                tmatrix = utils.read_matrix(tmatrix, mmap_mode='r')
             elif not isinstance(tmatrix, np.ndarray): # if not filepath, must be array
                 raise TypeError('tmatrix should be ndarray or filepath string.')
             if tmatrix.shape != self.rmatrix.shape:
@@ -397,7 +459,8 @@ class QLearner:
             return self.qmatrix[state]
 
 
-    def learn(self, episodes=None, coverage=1., ep_mode=None, actions=(), **kwargs):
+    def learn(self, episodes=None, coverage=1., ep_mode=None, actions=(),
+              batch=1, checkpoint=None, checkpoint_every=0, **kwargs):
         """
         Begins learning procedure over all (state, action) pairs. Populates the
         Q matrix with utility for each (state, action).
@@ -415,11 +478,24 @@ class QLearner:
             OR
             actions (list/tuple): A list of actions to take for each starting state
                 provided in episodes. Optional.
-            
+            batch (int): Number of episodes to run in lockstep. If greater than
+                1, uses the batched n-step Tree Backup algorithm which is only
+                applicable to tabular learners. In OFFLINE mode, the policy is
+                updated every batch. Default=1.
+            checkpoint (str): Filepath to save checkpoints to (see
+                save_checkpoint()). A checkpoint is saved every checkpoint_every
+                episodes and at the end of learning. Interrupted learning is
+                resumed by:
+                    learner.learn(**learner.load_checkpoint(checkpoint), ...)
+            checkpoint_every (int): Number of episodes between checkpoints. In
+                batches, checkpoints are saved after the batch where the number
+                is reached. Default 0 i.e. only the final checkpoint.
+
             **kwargs: Any learning parameters (lrate, depth, stepsize, mode, steps,
                 discount, exploration) which are stored.
         Returns:
-            A list of lists of states traversed for each episode.
+            A tuple of a list of lists of states traversed and a list of lists
+            of actions taken for each episode.
         """
         for key, val in kwargs.items():
             if hasattr(self, key):
@@ -429,14 +505,183 @@ class QLearner:
                 self.episodes(coverage=coverage, mode=ep_mode)
 
         histories = []
-        actions = []
-        for i, pair in enumerate(zip_longest(episodes, actions)):
+        ahistories = []
+        pairs = zip_longest(episodes, actions)
+        if checkpoint is not None:
+            # Pending episodes are stored in checkpoints.
+            pairs = list(pairs)
+        if batch > 1:
+            pairs = list(pairs)
+            for i in range(0, len(pairs), batch):
+                if self.mode == self.__class__.OFFLINE:
+                    self._update_policy()
+                starts, firsts = zip(*pairs[i:i+batch])
+                states, acts = batchnstep(self, states=starts, actions=firsts)
+                histories.extend(states)
+                ahistories.extend(acts)
+                self._checkpoint(checkpoint, checkpoint_every, i, i + batch, pairs)
+            self._checkpoint(checkpoint, checkpoint_every, -1, len(pairs), pairs)
+            return histories, ahistories
+        for i, pair in enumerate(pairs):
             if self.mode == self.__class__.OFFLINE:
                 self._update_policy()
-            states, actions = variablenstep(self, state=pair[0], action=pair[1])
+            states, acts = variablenstep(self, state=pair[0], action=pair[1])
+            self._episode_done()
             histories.append(states)
-            actions.append(actions)
-        return histories, actions
+            ahistories.append(acts)
+            self._checkpoint(checkpoint, checkpoint_every, i, i + 1, pairs)
+        self._checkpoint(checkpoint, checkpoint_every, -1, len(histories), pairs)
+        return histories, ahistories
+
+
+    def _episode_done(self):
+        """
+        Called by learn() after each episode (not batches of episodes). Does
+        nothing by default. Subclasses can override it for e.g. experience
+        replay.
+        """
+        pass
+
+
+    def _checkpoint(self, path, every, before, after, pairs):
+        """
+        Saves a checkpoint during learn() if the number of finished episodes
+        went from before to after a multiple of every (if every > 0). Always
+        saves if before is -1 (i.e. at the end of learning).
+        """
+        if path is None:
+            return
+        if before == -1 or (every > 0 and after // every > before // every):
+            pending = pairs[after:]
+            self.save_checkpoint(path, episodes=[p[0] for p in pending],
+                                 actions=[p[1] for p in pending])
+
+
+    def save_checkpoint(self, path, episodes=(), actions=()):
+        """
+        Saves the state of learning to a .npz file so it can be resumed later
+        by load_checkpoint(). The checkpoint contains the learned values
+        (qmatrix/weights), learning hyperparameters, the action selection
+        policy parameters, the random number generator states of the learner
+        (and its simulator, if any), the experience replay buffer (if set),
+        and any episodes left to learn.
+        Functions (goal, stepsize, func etc.) and the environment are not
+        saved. The file is replaced atomically.
+
+        Args:
+            path (str): Filepath of checkpoint.
+            episodes (list): Starting states of pending learning episodes.
+            actions (list): Starting actions of pending episodes. None elements
+                mean the action is chosen by the policy.
+        """
+        arrays = {}
+        header = {'class': self.__class__.__name__}
+        for name in self._checkpoint_values:
+            arrays['value_' + name] = np.asarray(getattr(self, name))
+        for name in self._checkpoint_params:
+            header[name] = getattr(self, name)
+        for key, val in self._action_param.items():
+            if isinstance(val, np.ndarray):
+                arrays['action_param_' + key] = val
+            else:
+                header['action_param_' + key] = val
+        generators = {'random': self.random}
+        if hasattr(getattr(self, 'simulator', None), 'random'):
+            generators['simulator_random'] = self.simulator.random
+        for name, generator in generators.items():
+            kind, keys, pos, has_gauss, gauss = generator.get_state()
+            arrays[name] = keys
+            header[name] = [kind, int(pos), int(has_gauss), float(gauss)]
+        if self.replay is not None:
+            # Stored transitions are needed for replay to resume exactly.
+            replay, params = self.replay.get_state()
+            arrays.update({'replay_' + k: v for k, v in replay.items()})
+            header['replay'] = dict(params, batchsize=self.replay_batch,
+                                    updates=self.replay_updates)
+        actions = list(actions) + [None] * (len(episodes) - len(actions))
+        given = [a is not None for a in actions]
+        fill = next((a for a in actions if a is not None), 0)
+        arrays['pending_episodes'] = np.array(list(episodes))
+        arrays['pending_actions'] = np.array([a if g else fill for a, g in zip(actions, given)])
+        arrays['pending_given'] = np.array(given, dtype=bool)
+        temp = path + '.temp'
+        with open(temp, 'wb') as ckpt:
+            np.savez(ckpt, header=json.dumps(header, default=lambda x: x.item()), **arrays)
+        os.replace(temp, path)
+
+
+    def load_checkpoint(self, path):
+        """
+        Restores the state of learning saved by save_checkpoint(). The learner
+        should be instantiated with the same environment and functions as the
+        one that saved the checkpoint.
+
+        Args:
+            path (str): Filepath of checkpoint.
+
+        Returns:
+            A dict of 'episodes' and 'actions' lists of pending learning
+            episodes that can be passed on to learn().
+        """
+        with np.load(path) as ckpt:
+            header = json.loads(str(ckpt['header']))
+            if header['class'] != self.__class__.__name__:
+                raise TypeError('Checkpoint is of a ' + header['class'] + '.')
+            for name in self._checkpoint_values:
+                getattr(self, name)[:] = ckpt['value_' + name]
+            action_param = {k[len('action_param_'):]: ckpt[k] for k in ckpt.files\
+                            if k.startswith('action_param_')}
+            action_param.update({k[len('action_param_'):]: v for k, v in header.items()\
+                                 if k.startswith('action_param_')})
+            generators = {'random': self.random}
+            if hasattr(getattr(self, 'simulator', None), 'random'):
+                generators['simulator_random'] = self.simulator.random
+            for name, generator in generators.items():
+                if name in header:
+                    kind, pos, has_gauss, gauss = header[name]
+                    generator.set_state((kind, ckpt[name], pos, has_gauss, gauss))
+            if 'replay' in header:
+                params = header['replay']
+                self.set_replay(params['capacity'], params['batchsize'],
+                                params['updates'], params['prioritized'])
+                self.replay.set_state({k[len('replay_'):]: ckpt[k] for k in ckpt.files\
+                                       if k.startswith('replay_')}, params)
+            given = ckpt['pending_given']
+            episodes = list(ckpt['pending_episodes'])
+            actions = [a if g else None for a, g in zip(ckpt['pending_actions'], given)]
+        for name in self._checkpoint_params:
+            if name not in ('policy', 'mode'):
+                setattr(self, name, header[name])
+        self._set_policy(header['policy'], header['mode'], action_param)
+        return {'episodes': episodes, 'actions': actions}
+
+
+    def solve(self, method='value', tolerance=1e-6, maxsweeps=None):
+        """
+        Computes the q-values of all (state, action) pairs exactly from the
+        reward and transition matrices using dynamic programming, as opposed to
+        sampling episodes in learn(). Populates the Q matrix. The current
+        Q matrix is used as the initial estimate. Goal states are terminal and
+        unit step sizes are assumed.
+        See Reinforcement Learning - an Introduction by Sutton/Barto (Ch. 4)
+
+        Args:
+            method (str): One of QLearner.[VALUE | POLICY] for value iteration
+                or policy iteration respectively. Default VALUE.
+            tolerance (float): Convergence threshold for the largest change in
+                value between sweeps.
+            maxsweeps (int): Maximum number of sweeps over the state space.
+                Defaults to the number of states.
+
+        Returns:
+            The number of sweeps made.
+        """
+        if method == QLearner.VALUE:
+            return valueiteration(self, tolerance=tolerance, maxsweeps=maxsweeps)
+        elif method == QLearner.POLICY:
+            return policyiteration(self, tolerance=tolerance, maxsweeps=maxsweeps)
+        else:
+            raise ValueError('Method does not exist.')
 
 
     def update(self, state, action, error):
@@ -475,7 +720,8 @@ class QLearner:
         The qmatrix is not automatically reset for each learn() call to allow
         for the learning process to build upon a custom qmatrix provided.
         """
-        self.qmatrix = np.zeros_like(self.rmatrix)
+        self.qmatrix = qtables.create(self.storage, self.rmatrix.shape,
+                                      self._storage_path)
 
 
     def _uniform_policy(self, state):
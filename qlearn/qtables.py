@@ -0,0 +1,165 @@
+"""
+This module defines storage backends for the q-value table (qmatrix) of a
+QLearner. All tables are [n states x m actions] and support the numpy indexing
+used by the learner and the algorithms, so they can be used in place of a
+dense ndarray:
+
+* DENSE: A float64 ndarray. The default.
+* COMPACT: A float32 ndarray. Half the memory of DENSE.
+* SPARSE: A SparseQTable which only stores rows of states that have been
+    written to. Reading other states returns the default value.
+* MEMMAP: A float64 np.memmap backed by a file on disk. Only the pages in
+    use are kept in memory.
+
+Usage:
+    table = create(storage, shape, path=None)
+"""
+
+import tempfile
+import numpy as np
+
+
+DENSE = 'dense'
+COMPACT = 'compact'
+SPARSE = 'sparse'
+MEMMAP = 'memmap'
+
+
+def create(storage, shape, path=None):
+    """
+    Creates a q-value table filled with zeros.
+
+    Args:
+        storage (str): One of DENSE, COMPACT, SPARSE, MEMMAP.
+        shape (tuple): (number of states, number of actions).
+        path (str): File backing a MEMMAP table. The file is overwritten. If
+            None, an anonymous temporary file is used.
+
+    Returns:
+        An ndarray, np.memmap, or SparseQTable instance.
+    """
+    if storage == DENSE:
+        return np.zeros(shape)
+    elif storage == COMPACT:
+        return np.zeros(shape, dtype=np.float32)
+    elif storage == SPARSE:
+        return SparseQTable(shape)
+    elif storage == MEMMAP:
+        path = tempfile.TemporaryFile() if path is None else path
+        return np.memmap(path, dtype=float, mode='w+', shape=tuple(shape))
+    else:
+        raise ValueError('Storage: ' + str(storage) + ' does not exist.')
+
+
+
+class SparseQTable:
+    """
+    A q-value table that stores rows (states) in a dictionary. Rows are only
+    materialized when values in them are assigned. Supports integer, slice,
+    and integer array indexing of rows/columns like a 2D ndarray, and
+    conversion to a dense ndarray with np.array(table).
+
+    Args:
+        shape (tuple): (number of states, number of actions).
+        dtype (type): Data type of values. Default float.
+        default (float): Value of states that are not stored. Default 0.
+
+    Instance Attributes:
+        shape/dtype/default: Same as args.
+        rows (dict): Maps state index to an ndarray of action values.
+    """
+
+    ndim = 2
+
+    def __init__(self, shape, dtype=float, default=0.):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.default = default
+        self.rows = {}
+
+
+    def __len__(self):
+        return self.shape[0]
+
+
+    def __array__(self, dtype=None, copy=None):
+        dense = np.full(self.shape, self.default, dtype=self.dtype)
+        for state, row in self.rows.items():
+            dense[state] = row
+        return dense if dtype is None else dense.astype(dtype)
+
+
+    @property
+    def nbytes(self):
+        """Returns the approximate number of bytes used by stored rows."""
+        return sum([row.nbytes for row in self.rows.values()]) \
+               + len(self.rows) * np.dtype(int).itemsize
+
+
+    def __getitem__(self, key):
+        rows, cols = key if isinstance(key, tuple) else (key, slice(None))
+        if isinstance(rows, (int, np.integer)):
+            row = self.rows.get(int(rows))
+            if row is None:
+                row = np.full(self.shape[1], self.default, dtype=self.dtype)
+            return row[cols]
+        rows = self._rows(rows)
+        empty = np.full(self.shape[1], self.default, dtype=self.dtype)
+        block = np.array([self.rows.get(r, empty) for r in rows.ravel()],\
+                         dtype=self.dtype).reshape(rows.shape + (self.shape[1],))
+        if isinstance(cols, slice):
+            return block[..., cols]
+        rows, cols = np.broadcast_arrays(np.arange(rows.size).reshape(rows.shape),\
+                                         np.asarray(cols, dtype=int))
+        return block.reshape(-1, self.shape[1])[rows, cols]
+
+
+    def __setitem__(self, key, value):
+        rows, cols = key if isinstance(key, tuple) else (key, slice(None))
+        if isinstance(rows, (int, np.integer)):
+            # Rows are not materialized if they remain at default values.
+            if int(rows) % self.shape[0] in self.rows \
+                or np.any(np.asarray(value) != self.default):
+                self._row(int(rows))[cols] = value
+            return
+        rows = self._rows(rows)
+        if isinstance(cols, slice):
+            cols = np.arange(self.shape[1])[cols]
+            rows = rows[..., None]
+        rows, cols = np.broadcast_arrays(rows, np.asarray(cols, dtype=int))
+        value = np.broadcast_to(np.asarray(value, dtype=self.dtype), rows.shape)
+        rows, cols, value = rows.ravel(), cols.ravel(), value.ravel()
+        order = np.argsort(rows, kind='stable')
+        rows, cols, value = rows[order], cols[order], value[order]
+        bounds = np.flatnonzero(np.diff(rows)) + 1
+        for r, c, v in zip(np.split(rows, bounds), np.split(cols, bounds),\
+                           np.split(value, bounds)):
+            if len(r) == 0:
+                continue
+            # Rows are not materialized if they remain at default values.
+            if r[0] not in self.rows and np.all(v == self.default):
+                continue
+            self._row(int(r[0]))[c] = v
+
+
+    def _rows(self, rows):
+        """
+        Converts a row index (slice/list/array) into an array of row indices.
+        """
+        if isinstance(rows, slice):
+            return np.arange(self.shape[0])[rows]
+        rows = np.asarray(rows, dtype=int)
+        return np.where(rows < 0, rows + self.shape[0], rows)
+
+
+    def _row(self, state):
+        """
+        Returns the stored row for a state, creating it if needed.
+        """
+        if state < 0:
+            state += self.shape[0]
+        row = self.rows.get(state)
+        if row is None:
+            row = np.full(self.shape[1], self.default, dtype=self.dtype)
+            self.rows[state] = row
+        return row
@@ -0,0 +1,197 @@
+"""
+This module defines the ReplayBuffer class. It stores a fixed number of the
+most recent transitions (state, action, reward, next state, terminal) seen
+while learning so they can be sampled again for mini-batch updates instead of
+being discarded after a single update. This is useful when transitions are
+expensive to generate (for e.g. by running a circuit simulation).
+
+Transitions are stored in preallocated arrays used as ring buffers, i.e. once
+the buffer is full, the oldest transitions are overwritten.
+
+Sampling is either uniform, or prioritized by the size of the last error of
+each transition:
+
+    P(i) = priority(i)^alpha / sum(priority^alpha)
+
+Where new transitions get the largest priority seen so far. The bias of
+prioritized sampling is corrected by importance sampling weights:
+
+    w(i) = (N * P(i))^-beta / max(w)
+
+See Prioritized Experience Replay by Schaul et al. (2016).
+
+Usage:
+    buffer = ReplayBuffer(capacity, prioritized=False)
+    buffer.add(svec, avec, reward, next_svec, terminal)
+    batch = buffer.sample(size, random)
+    buffer.update(batch['indices'], errors)
+"""
+
+import numpy as np
+
+
+
+class ReplayBuffer:
+    """
+    A fixed capacity buffer of transitions. Arrays are allocated on the first
+    transition added, when the dimensions of state/action vectors are known.
+
+    Args:
+        capacity (int): Maximum number of transitions stored.
+        prioritized (bool): Whether to sample transitions by priority. Default
+            False i.e. uniform sampling.
+        alpha (float): How much priorities affect sampling [0, 1]. 0 is uniform.
+        beta (float): Amount of importance sampling correction [0, 1].
+        epsilon (float): Added to priorities so no transition has 0 chance.
+
+    Instance Attributes:
+        capacity/prioritized/alpha/beta/epsilon: Same as args.
+        svecs/avecs/nsvecs (ndarray): [capacity x dimension] state, action, and
+            next state vectors.
+        rewards (ndarray): [capacity] rewards.
+        terminal (ndarray): [capacity] bool array. True if next state is goal.
+        priorities (ndarray): [capacity] priorities of transitions.
+    """
+
+    def __init__(self, capacity, prioritized=False, alpha=0.6, beta=0.4,
+                 epsilon=1e-6):
+        self.capacity = capacity
+        self.prioritized = prioritized
+        self.alpha = alpha
+        self.beta = beta
+        self.epsilon = epsilon
+        self.svecs = None
+        self.avecs = None
+        self.nsvecs = None
+        self.rewards = np.zeros(capacity)
+        self.terminal = np.zeros(capacity, dtype=bool)
+        self.priorities = np.zeros(capacity)
+        self._next = 0          # index where next transition is written
+        self._size = 0          # number of transitions stored
+        self._max_priority = 1. # priority of new transitions
+
+
+    def __len__(self):
+        return self._size
+
+
+    def add(self, svec, avec, reward, nsvec, terminal):
+        """
+        Adds a transition, overwriting the oldest one if the buffer is full.
+
+        Args:
+            svec (ndarray/list/tuple): State vector.
+            avec (ndarray/list/tuple): Action vector taken from state.
+            reward (float): Reward received.
+            nsvec (ndarray/list/tuple): Next state vector.
+            terminal (bool): Whether the next state is a goal state.
+        """
+        if self.svecs is None:
+            self.svecs = np.zeros((self.capacity, len(svec)))
+            self.avecs = np.zeros((self.capacity, len(avec)))
+            self.nsvecs = np.zeros((self.capacity, len(nsvec)))
+        i = self._next
+        self.svecs[i] = svec
+        self.avecs[i] = avec
+        self.nsvecs[i] = nsvec
+        self.rewards[i] = reward
+        self.terminal[i] = terminal
+        self.priorities[i] = self._max_priority
+        self._next = (i + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+
+    def sample(self, size, random=np.random):
+        """
+        Samples transitions with replacement.
+
+        Args:
+            size (int): Number of transitions to sample.
+            random (np.random.RandomState): Random number generator to use.
+
+        Returns:
+            A dict of arrays of sampled 'svecs', 'avecs', 'rewards', 'nsvecs',
+            'terminal', their 'indices' in the buffer, and their importance
+            sampling 'weights' (all 1 for uniform sampling).
+        """
+        if self.prioritized:
+            probs = self.priorities[:self._size] ** self.alpha
+            probs /= np.sum(probs)
+            indices = random.choice(self._size, size, p=probs)
+            weights = (self._size * probs[indices]) ** -self.beta
+            weights /= np.max(weights)
+        else:
+            indices = random.randint(self._size, size=size)
+            weights = np.ones(size)
+        return {'svecs': self.svecs[indices], 'avecs': self.avecs[indices],
+                'rewards': self.rewards[indices], 'nsvecs': self.nsvecs[indices],
+                'terminal': self.terminal[indices], 'indices': indices,
+                'weights': weights}
+
+
+    def update(self, indices, errors):
+        """
+        Updates priorities of sampled transitions with their latest errors.
+        Does nothing for uniform sampling.
+
+        Args:
+            indices (ndarray): Indices of transitions returned by sample().
+            errors (ndarray): Errors in value estimates of transitions.
+        """
+        if self.prioritized:
+            self.priorities[indices] = np.abs(errors) + self.epsilon
+            self._max_priority = max(self._max_priority, np.max(self.priorities[indices]))
+
+
+    def get_state(self):
+        """
+        Returns the contents of the buffer, for e.g. to save in a checkpoint.
+
+        Returns:
+            A tuple of a dict of arrays of stored transitions and priorities,
+            and a dict of sampling parameters and ring buffer indices.
+        """
+        arrays = {'rewards': self.rewards, 'terminal': self.terminal,
+                  'priorities': self.priorities}
+        if self.svecs is not None:
+            arrays.update(svecs=self.svecs, avecs=self.avecs, nsvecs=self.nsvecs)
+        params = {'capacity': self.capacity, 'prioritized': self.prioritized,
+                  'alpha': self.alpha, 'beta': self.beta, 'epsilon': self.epsilon,
+                  'next': self._next, 'size': self._size,
+                  'max_priority': self._max_priority}
+        return arrays, params
+
+
+    def set_state(self, arrays, params):
+        """
+        Restores the contents of the buffer returned by get_state(). The
+        capacity and sampling parameters are replaced.
+
+        Args:
+            arrays (dict): Arrays of stored transitions and priorities.
+            params (dict): Sampling parameters and ring buffer indices.
+        """
+        self.capacity = params['capacity']
+        self.prioritized = params['prioritized']
+        self.alpha = params['alpha']
+        self.beta = params['beta']
+        self.epsilon = params['epsilon']
+        self._next = params['next']
+        self._size = params['size']
+        self._max_priority = params['max_priority']
+        self.rewards = np.array(arrays['rewards'], dtype=float)
+        self.terminal = np.array(arrays['terminal'], dtype=bool)
+        self.priorities = np.array(arrays['priorities'], dtype=float)
+        self.svecs = np.array(arrays['svecs']) if 'svecs' in arrays else None
+        self.avecs = np.array(arrays['avecs']) if 'avecs' in arrays else None
+        self.nsvecs = np.array(arrays['nsvecs']) if 'nsvecs' in arrays else None
+
+
+    def clear(self):
+        """
+        Removes all transitions.
+        """
+        self._next = 0
+        self._size = 0
+        self.priorities[:] = 0
+        self._max_priority = 1.
@@ -30,11 +30,44 @@ All learners expose the following interface:
     keeping any learning parameters provided at instantiation.
 """
 
+import multiprocessing
+from itertools import zip_longest
 import numpy as np
 try:
     from flearner import FLearner
+    from replay import ReplayBuffer
+    from cache import TransitionCache
 except ImportError:
     from .flearner import FLearner
+    from .replay import ReplayBuffer
+    from .cache import TransitionCache
+
+
+# The learner and shared weights inherited by forked learning workers.
+_WORKER_STATE = None
+
+
+def _learn_worker(args):
+    """
+    Runs learning episodes in a worker process. The learner's weights are
+    replaced by a view of the shared weights so updates are visible to all
+    workers.
+
+    Args:
+        args (tuple): Pairs of (starting state, action) to learn from, and a
+            seed for the random number generators of the learner/simulator.
+
+    Returns:
+        The histories of states and actions of episodes (see learn()).
+    """
+    pairs, seed = args
+    learner, weights = _WORKER_STATE
+    learner.weights = np.frombuffer(weights)
+    learner.random = np.random.RandomState(seed)
+    if hasattr(learner.simulator, 'random'):
+        learner.simulator.random = np.random.RandomState(seed + 1)
+    episodes, actions = zip(*pairs) if pairs else ((), ())
+    return FLearner.learn(learner, episodes=episodes, actions=actions)
 
 
 
@@ -67,6 +100,7 @@ class SLearner(FLearner):
             dimension of func.
         goal (list/tuple/set/array/function): Indices of goal states in rmatrix
             OR a function that accepts a state vector and returns true if goal.
+        features (func): Optional batched features. See FLearner.
         lrate (float): Learning rate for q-learning.
         discount (float): Discount factor for q-learning.
         policy (str): The action selection policy. Used durung learning/
@@ -90,12 +124,18 @@ class SLearner(FLearner):
         random (np.random.RandomState): A random number generator local to this
             instance.
         weights (ndarray): The coefficients of the function provided.
+        replay (ReplayBuffer): Transitions stored for experience replay. None
+            if disabled (default). See set_replay().
+        cache (TransitionCache): Memoized simulator transitions. None if
+            disabled (default). See set_cache().
     """
 
+    _checkpoint_values = ('weights',)
+
     def __init__(self, reward, simulator, stateconverter, actionconverter, goal,
                  func, funcdim, dfunc, lrate=0.25, discount=1,
                  policy='uniform', depth=None, steps=1, seed=None,
-                 stepsize=lambda x:None, **kwargs):
+                 stepsize=lambda x:None, features=None, **kwargs):
         if seed is None:
             self.random = np.random.RandomState()
         else:
@@ -117,10 +157,13 @@ class SLearner(FLearner):
         self.stateconverter = stateconverter
         self.actionconverter = actionconverter
         self._avecs = [avec for avec in self.actionconverter]
+        self.set_features(features)
 
         self._reward = reward
         self.set_goal(goal)
         self.set_action_selection_policy(policy, mode=SLearner.ONLINE, **kwargs)
+        self.set_replay(0)
+        self.set_cache(0)
 
     @property
     def num_states(self):
@@ -150,6 +193,154 @@ class SLearner(FLearner):
             raise TypeError('Provide goal as list/set/array/tuple/function.')
 
 
+    def set_replay(self, capacity, batchsize=32, updates=1, prioritized=False,
+                   **kwargs):
+        """
+        Sets up an experience replay buffer. Transitions simulated during
+        learn() are stored, and after each episode, weights are updated from
+        mini-batches of stored transitions (see learn_replay()). This gets more
+        learning out of each simulator call. Not supported with batches of
+        episodes in learn().
+
+        Args:
+            capacity (int): Number of most recent transitions stored. If 0,
+                experience replay is disabled.
+            batchsize (int): Number of transitions in each mini-batch.
+            updates (int): Number of mini-batch updates after each episode.
+            prioritized (bool): Whether to sample transitions with larger
+                errors more often. Default False i.e. uniform sampling.
+            **kwargs: alpha, beta, epsilon parameters of prioritized sampling.
+                See replay.ReplayBuffer.
+        """
+        self.replay = ReplayBuffer(capacity, prioritized, **kwargs) if capacity else None
+        self.replay_batch = batchsize
+        self.replay_updates = updates
+
+
+    def learn(self, episodes=None, coverage=1., ep_mode=None, actions=(),
+              workers=1, **kwargs):
+        """
+        Begins learning procedure over all (state, action) pairs. See
+        QLearner.learn() for arguments.
+
+        Args:
+            workers (int): Number of processes learning episodes in parallel.
+                If greater than 1, episodes are divided between forked worker
+                processes, each with its own copy of the simulator. Workers
+                update a weight vector in shared memory without locking
+                (Hogwild). Requires the 'fork' start method (i.e. not Windows).
+                Transitions seen by workers are not added to this instance's
+                replay buffer. Checkpoints and batches are not supported. In
+                a daemonic process (e.g. a multiprocessing.Pool worker), which
+                cannot have children, learning is serial. 0 => all cores.
+                Default 1.
+
+        Returns:
+            A tuple of a list of lists of states traversed and a list of lists
+            of actions taken for each episode, in the order of episodes.
+        """
+        if self.replay is not None and kwargs.get('batch', 1) != 1:
+            raise ValueError('Batches are not supported with experience replay.')
+        if workers == 1 or multiprocessing.current_process().daemon:
+            return super().learn(episodes=episodes, coverage=coverage,
+                                 ep_mode=ep_mode, actions=actions, **kwargs)
+        if kwargs.get('checkpoint') is not None or kwargs.get('batch', 1) != 1:
+            raise ValueError('Checkpoints and batches are not supported with workers.')
+        for key, val in kwargs.items():
+            if hasattr(self, key):
+                setattr(self, key, val)
+        workers = workers or multiprocessing.cpu_count()
+        episodes = episodes if episodes is not None else\
+                self.episodes(coverage=coverage, mode=ep_mode)
+        pairs = list(zip_longest(episodes, actions))
+        seeds = self.random.randint(2**31 - 1, size=workers)
+        chunks = [(pairs[i::workers], seed) for i, seed in enumerate(seeds)]
+
+        global _WORKER_STATE
+        weights = multiprocessing.RawArray('d', self.funcdim)
+        np.frombuffer(weights)[:] = self.weights
+        _WORKER_STATE = (self, weights)
+        try:
+            with multiprocessing.get_context('fork').Pool(workers) as pool:
+                results = pool.map(_learn_worker, chunks)
+        finally:
+            _WORKER_STATE = None
+        self.weights = np.array(np.frombuffer(weights))
+
+        # Interleave worker histories back into order of episodes
+        histories = [None] * len(pairs)
+        ahistories = [None] * len(pairs)
+        for i, (states, acts) in enumerate(results):
+            histories[i::workers] = states
+            ahistories[i::workers] = acts
+        return histories, ahistories
+
+
+    def set_cache(self, maxsize, quantize=False, watch=('fault', 'noise')):
+        """
+        Sets up a cache of simulator transitions used by next_state() and
+        neighbours(). Only valid for deterministic simulators. The cache must
+        be set again if the simulator instance is replaced.
+
+        Args:
+            maxsize (int): Maximum number of transitions cached. If 0, caching
+                is disabled.
+            quantize (bool): Whether states are keyed by the nearest state of
+                the stateconverter instead of exactly. Approximate for states
+                between grid points, but gets more hits.
+            watch (tuple): Simulator attributes whose change clears the cache.
+                See cache.TransitionCache.
+        """
+        if maxsize:
+            self.cache = TransitionCache(self.simulator, maxsize,
+                                         self.stateconverter if quantize else None,
+                                         watch)
+        else:
+            self.cache = None
+
+
+    def _episode_done(self):
+        """
+        Updates weights by experience replay after each learning episode, if
+        a replay buffer is set.
+        """
+        if self.replay is not None:
+            self.learn_replay()
+
+
+    def learn_replay(self, updates=None, batchsize=None):
+        """
+        Updates weights from mini-batches of transitions sampled from the
+        replay buffer. Each update is a gradient step on the mean one-step
+        q-learning error of the mini-batch:
+
+            error = Q(s, a) - (r + discount * max over a'(Q(s', a')))
+
+        Args:
+            updates (int): Number of mini-batch updates. Defaults to the number
+                set by set_replay().
+            batchsize (int): Transitions per mini-batch. Defaults to the number
+                set by set_replay().
+        """
+        updates = self.replay_updates if updates is None else updates
+        batchsize = self.replay_batch if batchsize is None else batchsize
+        if self.replay is None or len(self.replay) == 0:
+            return
+        for _ in range(updates):
+            batch = self.replay.sample(batchsize, self.random)
+            features = self.features(batch['svecs'], batch['avecs'])
+            if self._features is not None:
+                qvals = features @ self.weights
+            else:
+                qvals = np.array([self.func(s, a, self.weights)\
+                                  for s, a in zip(batch['svecs'], batch['avecs'])])
+            nvals = np.max(self.qvalues(batch['nsvecs']), axis=1)
+            nvals[batch['terminal']] = 0
+            error = qvals - (batch['rewards'] + self.discount * nvals)
+            self.replay.update(batch['indices'], error)
+            self.weights -= self.lrate * (batch['weights'] * error) @ features / batchsize
+
+
     def episodes(self, coverage=1., **kwargs):
         """
         Provides a sequence of states for learning episodes to start from.
@@ -174,8 +365,10 @@ class SLearner(FLearner):
         """
         Uses a linsim.Simulator instance (or a compatible class) to find the
         next state vector. Forwards keyword arguments to the simulator.run
-        function.
+        function. Transitions are looked up in the cache first, if set.
         """
+        if self.cache is not None:
+            return self.cache.run(svec, avec, **kwargs)
         return self.simulator.run(state=svec, action=avec, **kwargs)
 
 
@@ -193,6 +386,12 @@ class SLearner(FLearner):
         Returns:
             A list of adjacent state vectors.
         """
+        # Simulators that can run a batch of states at once are used to
+        # compute all neighbours in a single call.
+        if self.cache is not None:
+            return list(self.cache.run_many([svec] * len(self._avecs), self._avecs))
+        if hasattr(self.simulator, 'run_many'):
+            return list(self.simulator.run_many([svec] * len(self._avecs), self._avecs))
         return [self.next_state(svec, avec) for avec in self._avecs]
 
 
@@ -228,8 +427,7 @@ class SLearner(FLearner):
         if avec is not None:
             return self.func(svec, avec, self.weights)
         else:
-            return np.array([self.func(svec, a, self.weights)\
-                    for a in self._avecs])
+            return self._qvalues(svec)
 
 
     def update(self, svec, avec, error):
@@ -245,6 +443,15 @@ class SLearner(FLearner):
         self.weights -= self.lrate * error * self.dfunc(svec, avec, self.weights)
 
 
+    def reset(self):
+        """
+        Resets weights to initial values and clears the replay buffer.
+        """
+        super().reset()
+        if self.replay is not None:
+            self.replay.clear()
+
+
     def recommend(self, svec):
         """
         Returns the action with the highest q value.
@@ -95,17 +95,23 @@ def create_sim_env(size, random):
     return sim
 
 
-def fault_algorithm(iterations, size, random):
+def fault_algorithm(iterations, size, random, chunksize=None):
     """
     The Fault Algorithm generates a terrain by drawing a line of a random
     gradient through the grid, and be elevating points on one side, and
     lowering points on the other side for some number of iterations.
 
+    The sides of all faults in a chunk of iterations are computed at once on
+    a coordinate grid. Displacements are still added one fault at a time so
+    the result is identical to adding them point by point.
+
     Args:
         iterations (int): Number of times to generate faults.
         size (tuple): The size of the topology (rows, columns).
         random (np.random.RandomState): A random number generator for consistent
             terrain generation given the seed for TestBench.
+        chunksize (int): Number of faults computed at once. Defaults to as many
+            as fit in ~2**24 grid points.
 
     Returns:
         A 2D ndarray of dimensions=size where array[y, x] is altitude at
@@ -116,14 +122,115 @@ def fault_algorithm(iterations, size, random):
     a = np.sin(angle)
     b = np.cos(angle)
     disp = (random.rand() / iterations) * (np.arange(iterations)[::-1] + 1)
-    for i in range(iterations):
-        cx = random.rand() * size[1]
-        cy = random.rand() * size[0]
-        for x in range(size[1]):
-            for y in range(size[0]):
-                topology[y, x] += disp[i] \
-                                        if -a[i]*(x-cx) + b[i]*(y-cy) > 0 \
-                                        else -disp[i]
+    # Centers are drawn as (cx, cy) pairs in the same order as drawing them
+    # one fault at a time.
+    centers = random.rand(iterations, 2)
+    cx = centers[:, 0] * size[1]
+    cy = centers[:, 1] * size[0]
+    if chunksize is None:
+        chunksize = max(1, 2**24 // max(1, size[0] * size[1]))
+    y, x = np.meshgrid(np.arange(size[0]), np.arange(size[1]), indexing='ij')
+    for i in range(0, iterations, chunksize):
+        j = min(i + chunksize, iterations)
+        above = -a[i:j, None, None] * (x - cx[i:j, None, None]) \
+                + b[i:j, None, None] * (y - cy[i:j, None, None]) > 0
+        for k, side in enumerate(above):
+            topology += np.where(side, disp[i + k], -disp[i + k])
+    topology = topology - np.amin(topology)
+    return topology / np.amax(topology)
+
+
+def diamond_square(size, random, roughness=0.5):
+    """
+    The Diamond-Square Algorithm generates a terrain by repeatedly setting the
+    midpoints of squares (diamond step) and then of diamonds (square step) on
+    a grid to the average of their corners plus a random offset. The offsets
+    shrink by roughness at each level of detail. Each step is computed for
+    all midpoints at once.
+
+    Args:
+        size (tuple): The size of the topology (rows, columns).
+        random (np.random.RandomState): A random number generator for consistent
+            terrain generation given the seed for TestBench.
+        roughness (float): Factor (0-1) by which random offsets shrink at each
+            level. Higher values give more rugged terrain.
+
+    Returns:
+        A 2D ndarray of dimensions=size where array[y, x] is altitude at
+        that point in the topology.
+    """
+    # The grid must have 2^n + 1 points on each side. It is cropped to size.
+    side = 2**int(np.ceil(np.log2(max(max(size) - 1, 1)))) + 1
+    grid = np.zeros((side, side))
+    grid[::side-1, ::side-1] = random.rand(2, 2)
+    step = side - 1
+    scale = 1.
+    while step > 1:
+        half = step // 2
+        # Diamond step: centers of squares
+        corners = grid[:-1:step, :-1:step] + grid[:-1:step, step::step] \
+                  + grid[step::step, :-1:step] + grid[step::step, step::step]
+        grid[half::step, half::step] = corners / 4 \
+                                       + random.uniform(-scale, scale, corners.shape)
+        # Square step: midpoints of edges. Neighbours outside the grid are
+        # ignored in the average.
+        padded = np.pad(grid, half, mode='constant', constant_values=np.nan)
+        for rows, cols in ((np.arange(0, side, step), np.arange(half, side, step)),
+                           (np.arange(half, side, step), np.arange(0, side, step))):
+            r, c = np.ix_(rows + half, cols + half)
+            neighbours = np.array([padded[r - half, c], padded[r + half, c],
+                                   padded[r, c - half], padded[r, c + half]])
+            grid[np.ix_(rows, cols)] = np.nanmean(neighbours, axis=0) \
+                                       + random.uniform(-scale, scale, (len(rows), len(cols)))
+        scale *= roughness
+        step = half
+    topology = grid[:size[0], :size[1]]
+    topology = topology - np.amin(topology)
+    return topology / np.amax(topology)
+
+
+def perlin_noise(size, random, frequency=2, octaves=4, persistence=0.5):
+    """
+    Generates a terrain from Perlin (gradient) noise. Random unit gradients are
+    placed on a coarse lattice and each point is a smooth interpolation of
+    the dot products with its lattice corners. Several octaves of doubling
+    frequency and decreasing amplitude are summed.
+
+    Args:
+        size (tuple): The size of the topology (rows, columns).
+        random (np.random.RandomState): A random number generator for consistent
+            terrain generation given the seed for TestBench.
+        frequency (int): Number of lattice cells across the topology in the
+            first octave.
+        octaves (int): Number of noise layers to sum.
+        persistence (float): Factor by which amplitude shrinks each octave.
+
+    Returns:
+        A 2D ndarray of dimensions=size where array[y, x] is altitude at
+        that point in the topology.
+    """
+    fade = lambda t: t * t * t * (t * (t * 6 - 15) + 10)
+    topology = np.zeros(size)
+    amplitude = 1.
+    for _ in range(octaves):
+        angle = random.rand(frequency + 1, frequency + 1) * 2 * np.pi
+        grad_y, grad_x = np.sin(angle), np.cos(angle)
+        # Points are sampled at cell centers, since noise is 0 on the lattice.
+        y = (np.arange(size[0]) + 0.5) * frequency / size[0]
+        x = (np.arange(size[1]) + 0.5) * frequency / size[1]
+        yi, xi = np.meshgrid(y.astype(int), x.astype(int), indexing='ij')
+        fy, fx = np.meshgrid(y % 1, x % 1, indexing='ij')
+        dots = {}
+        for dy in (0, 1):
+            for dx in (0, 1):
+                dots[dy, dx] = grad_y[yi + dy, xi + dx] * (fy - dy) \
+                               + grad_x[yi + dy, xi + dx] * (fx - dx)
+        u, v = fade(fx), fade(fy)
+        top = dots[0, 0] + u * (dots[0, 1] - dots[0, 0])
+        bottom = dots[1, 0] + u * (dots[1, 1] - dots[1, 0])
+        topology += amplitude * (top + v * (bottom - top))
+        amplitude *= persistence
+        frequency *= 2
     topology = topology - np.amin(topology)
     return topology / np.amax(topology)
 
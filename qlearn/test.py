@@ -3,19 +3,37 @@ Tests for the qlearn package.
 """
 
 import os
+import time
+import multiprocessing
 import numpy as np
 try:
+    import utils
+    import qtables
+    import algorithms
+    import replay
+    import cache as cache_
     from qlearner import QLearner
     from flearner import FLearner
     from slearner import SLearner
+    from mpc import ModelPredictiveController
     from testbench import TestBench
     from linsim import FlagGenerator
+    from tb_utils import abs_cartesian
+    from tb_utils import fault_algorithm
 except ImportError:
+    from . import utils
+    from . import qtables
+    from . import algorithms
+    from . import replay
+    from . import cache as cache_
     from .qlearner import QLearner
     from .flearner import FLearner
     from .slearner import SLearner
+    from .mpc import ModelPredictiveController
     from .testbench import TestBench
     from .linsim import FlagGenerator
+    from .tb_utils import abs_cartesian
+    from .tb_utils import fault_algorithm
 
 NUM_TESTS = 0
 TESTS_PASSED = 0
@@ -86,6 +104,23 @@ def test_instantiation():
     assert np.array_equal(temp.rmatrix, rmatrix_sq), "R matrix not equal to arg."
     QLEARNER = temp
 
+    # Test 3b: Binary file I/O
+    utils.save_matrix(rmatrix_rec, 'test.npy')
+    utils.save_matrix(tmatrix, 'test_t.npy')
+    utils.save_matrix(rmatrix_rec, 'test.npz', lrate=0.5)
+    temp = QLearner('test.npy', goal_l, 'test_t.npy')
+    assert isinstance(temp.rmatrix, np.memmap), 'Binary matrix not memory-mapped.'
+    assert np.array_equal(temp.rmatrix, rmatrix_rec), "R matrix not equal to arg."
+    assert np.array_equal(temp.tmatrix, tmatrix), "T matrix not equal to arg."
+    assert np.array_equal(utils.read_matrix('test.npz'), rmatrix_rec), \
+        'Binary archive not read.'
+    header = utils.read_header('test.npz')
+    assert header['shape'] == rmatrix_rec.shape and header['lrate'] == 0.5, \
+        'Binary archive header incorrect.'
+    assert utils.read_header('test.npy')['shape'] == rmatrix_rec.shape, \
+        'Binary header incorrect.'
+    del temp
+
     # Test 4: rectangular r matrix, no tmatrix
     try:
         QLearner(rmatrix_rec, goal_l)
@@ -103,6 +138,8 @@ def test_instantiation():
 
     # Finalize
     os.remove('test.dat')
+    for fname in ('test.npy', 'test_t.npy', 'test.npz'):
+        os.remove(fname)
 
 
 @test
@@ -155,6 +192,609 @@ def test_online_learning():
     QLEARNER.learn()
 
 
+@test
+def test_batch_learning():
+    """
+    Testing batched learning of multiple episodes in lockstep.
+    """
+    # Set up
+    t = TestBench(size=10, seed=1000, steps=2)
+
+    # Test 1: histories of all episodes are returned
+    states, actions = t.learner.learn(coverage=2., batch=50)
+    assert len(states) == 2 * t.num_states, 'Incorrect number of histories.'
+    assert all([len(a) == len(s) + 1 for s, a in zip(states, actions)]),\
+        'Incorrect history lengths.'
+    for history in states:
+        if len(history) < t.learner.depth:
+            assert t.learner.goal(history[-1]), 'Episode stopped before goal.'
+
+    # Test 2: provided starting actions are taken
+    _, actions = t.learner.learn(episodes=[0, 1, 2], actions=[3, None, 1], batch=3)
+    assert actions[0][0] == 3 and actions[2][0] == 1, 'Starting actions not taken.'
+
+    # Test 3: batch learning approaches values of sequential learning
+    t.learner.reset()
+    t.learner.learn(coverage=10.)
+    qvalue = np.copy(t.learner.qmatrix)
+    t.learner.reset()
+    t.learner.learn(coverage=10., batch=100)
+    error = np.mean(np.abs(t.learner.qmatrix - qvalue))
+    assert error < 0.25 * np.mean(np.abs(qvalue)), 'Batch learning did not converge.'
+
+
+@test
+def test_dynamic_programming():
+    """
+    Testing value and policy iteration solvers.
+    """
+    # Set up
+    t = TestBench(size=10, seed=1000)
+
+    # Test 1: value iteration
+    sweeps = t.learner.solve(method=QLearner.VALUE)
+    assert sweeps < t.num_states, 'Value iteration did not converge.'
+    qvalue = np.copy(t.learner.qmatrix)
+
+    # Test 2: policy iteration converges to same values
+    t.learner.reset()
+    t.learner.solve(method=QLearner.POLICY)
+    assert np.allclose(qvalue, t.learner.qmatrix), 'Solvers do not agree.'
+
+    # Test 3: solved policy reaches goal
+    res = t.episode(start=(0, 0), interactive=False)
+    assert t.learner.goal(t.coord2state(res[-1])), 'Solved policy does not reach goal.'
+
+    # Test 4: no sweeps leave values unchanged
+    for method in (QLearner.VALUE, QLearner.POLICY):
+        assert t.learner.solve(method=method, maxsweeps=0) == 0, 'Sweeps made.'
+        assert np.allclose(qvalue, t.learner.qmatrix), 'Values changed without sweeps.'
+
+
+@test
+def test_storage_backends():
+    """
+    Testing dense, compact, sparse, and memory-mapped q-tables.
+    """
+    # Set up
+    size = 10
+    seed = 1000
+    qvalues = {}
+
+    # Test 1: storages learn the same values as dense storage
+    for storage in (QLearner.DENSE, QLearner.COMPACT, QLearner.SPARSE, QLearner.MEMMAP):
+        t = TestBench(size=size, seed=seed, storage=storage, steps=2)
+        t.learner.learn(coverage=0.5)
+        t.learner.learn(coverage=0.5, batch=10)
+        qvalues[storage] = np.array(t.learner.qmatrix, dtype=float)
+        assert t.learner.nbytes > 0, 'Memory footprint not reported.'
+        t.learner.reset()
+        assert np.all(np.array(t.learner.qmatrix) == 0), 'Q-table not reset.'
+    for storage, qvalue in qvalues.items():
+        assert np.allclose(qvalue, qvalues[QLearner.DENSE], atol=1e-5), \
+            'Storage ' + storage + ' values differ.'
+
+    # Test 2: sparse table indexing matches ndarray and stores visited rows
+    table = qtables.SparseQTable((5, 3))
+    dense = np.zeros((5, 3))
+    for t in (table, dense):
+        t[1] = [1, 2, 3]
+        t[[2, 2, 4], [0, 0, 1]] += 1
+        t[3, 1:] = 5
+        t[0, :] = 0
+    assert np.array_equal(np.array(table), dense), 'Sparse assignment failed.'
+    assert np.array_equal(table[[1, 4]], dense[[1, 4]]), 'Sparse row indexing failed.'
+    assert np.array_equal(table[[1, 3], [2, 1]], dense[[1, 3], [2, 1]]), \
+        'Sparse pair indexing failed.'
+    assert sorted(table.rows) == [1, 2, 3, 4], 'Unvisited rows stored.'
+
+
+@test
+def test_checkpoints():
+    """
+    Testing saving, loading, and resuming from checkpoints.
+    """
+    # Set up
+    size = 10
+    seed = 1000
+    kwargs = dict(size=size, seed=seed, steps=2, policy=QLearner.GREEDY, max_prob=0.8)
+    episodes = list(range(0, size * size, 3))
+
+    # Test 1: uninterrupted learning with checkpoints
+    t = TestBench(**kwargs)
+    t.learner.learn(episodes=episodes, checkpoint='test.ckpt', checkpoint_every=5)
+    qvalue = np.copy(t.learner.qmatrix)
+    assert len(t.learner.load_checkpoint('test.ckpt')['episodes']) == 0, \
+        'Final checkpoint has pending episodes.'
+    os.remove('test.ckpt')
+    t = TestBench(**kwargs)
+    t.learner.learn(episodes=episodes, checkpoint='test.ckpt')
+    assert os.path.exists('test.ckpt'), 'Final checkpoint not saved without interval.'
+
+    # Test 2: learning interrupted after first checkpoint and resumed by a
+    # learner in a different state
+    t = TestBench(**kwargs)
+    save = t.learner.save_checkpoint
+    def interrupt(*args, **kwargs):
+        save(*args, **kwargs)
+        raise KeyboardInterrupt
+    t.learner.save_checkpoint = interrupt
+    try:
+        t.learner.learn(episodes=episodes, checkpoint='test.ckpt', checkpoint_every=5)
+    except KeyboardInterrupt:
+        pass
+    t = TestBench(**kwargs)
+    t.learner.random.seed(seed + 1)
+    t.learner.set_action_selection_policy(QLearner.SOFTMAX)
+    pending = t.learner.load_checkpoint('test.ckpt')
+    assert len(pending['episodes']) == len(episodes) - 5, 'Incorrect pending episodes.'
+    t.learner.learn(**pending)
+    assert np.array_equal(qvalue, t.learner.qmatrix), 'Resumed learning differs.'
+
+    # Test 3: function approximation weights
+    t = TestBench(size=size, seed=seed, learner=FLearner, lrate=1e-2,
+                  func=lambda s, a, w: np.dot(w, np.r_[s, a, 1]),
+                  dfunc=lambda s, a, w: np.r_[s, a, 1], funcdim=5)
+    t.learner.learn(coverage=0.1)
+    t.learner.save_checkpoint('test.ckpt', episodes=[1, 2], actions=[0])
+    weights = np.copy(t.learner.weights)
+    t.learner.reset()
+    pending = t.learner.load_checkpoint('test.ckpt')
+    assert np.array_equal(weights, t.learner.weights), 'Weights not restored.'
+    assert pending['actions'] == [0, None], 'Pending actions not restored.'
+
+    # Test 4: resumed learning with experience replay
+    class Walk:
+        """Moves a point on a grid."""
+        def run(self, state, action, stepsize=1):
+            return np.clip(np.asarray(state) + 2 * np.asarray(action) - 1, 0, 4)
+    def replay_learner(prioritized):
+        learner = SLearner(reward=lambda s, a, n: -abs(n[0] - n[1]), simulator=Walk(),
+                           stateconverter=FlagGenerator(5, 5),
+                           actionconverter=FlagGenerator(2, 2), goal=lambda s: s[0] == 4,
+                           func=lambda s, a, w: np.dot(w, np.r_[s, a, 1]),
+                           dfunc=lambda s, a, w: np.r_[s, a, 1], funcdim=5,
+                           lrate=1e-3, depth=5, seed=seed)
+        learner.set_replay(20, batchsize=4, prioritized=prioritized)
+        return learner
+    episodes = [FlagGenerator(5, 5).decode(s) for s in range(0, 25, 2)]
+    for prioritized in (False, True):
+        learner = replay_learner(prioritized)
+        learner.learn(episodes=episodes, checkpoint='test.ckpt', checkpoint_every=5)
+        weights = np.copy(learner.weights)
+        learner = replay_learner(prioritized)
+        save = learner.save_checkpoint
+        learner.save_checkpoint = interrupt
+        try:
+            learner.learn(episodes=episodes, checkpoint='test.ckpt', checkpoint_every=5)
+        except KeyboardInterrupt:
+            pass
+        learner = replay_learner(not prioritized)
+        learner.set_replay(0)
+        learner.learn(**learner.load_checkpoint('test.ckpt'))
+        assert learner.replay.prioritized == prioritized, 'Replay settings not restored.'
+        assert np.array_equal(weights, learner.weights), 'Resumed replay learning differs.'
+
+    # Finalize
+    os.remove('test.ckpt')
+
+
+@test
+def test_batched_features():
+    """
+    Testing batched and precomputed features of function approximation learners.
+    """
+    # Set up
+    size = 10
+    seed = 1000
+    funcdim = 5
+    def dfunc(s, a, w):
+        return np.array([s[0]*a[0]/20, s[1]*a[1]/20, s[0]**2/100, s[1]**2/100, 1])
+    def func(s, a, w):
+        return np.dot(w, dfunc(s, a, w))
+    def features(S, A):
+        return np.c_[S[:, 0]*A[:, 0]/20, S[:, 1]*A[:, 1]/20, S[:, 0]**2/100,
+                     S[:, 1]**2/100, np.ones(len(S))]
+    kwargs = dict(size=size, seed=seed, learner=FLearner, funcdim=funcdim, lrate=1e-2)
+    t = TestBench(func=func, dfunc=dfunc, **kwargs)
+    tf = TestBench(func=None, dfunc=None, features=features, **kwargs)
+    weights = t.learner.random.rand(funcdim)
+    t.learner.weights = tf.learner.weights = weights
+    svecs = [t.learner.stateconverter.decode(s) for s in range(t.num_states)]
+
+    # Test 1: values agree with func/dfunc
+    for state, svec in enumerate(svecs):
+        assert np.allclose(t.learner.qvalue(state), tf.learner.qvalue(state)), \
+            'Batched q-values differ.'
+        assert t.learner.value(state)[1] == tf.learner.value(state)[1], \
+            'Batched values differ.'
+    assert np.allclose(t.learner.qvalues(svecs), tf.learner.qvalues(svecs)), \
+        'Batch of states q-values differ.'
+    pairs = (svecs[:3], t.learner._avecs[:3])
+    assert np.allclose(t.learner.features(*pairs), tf.learner.features(*pairs)), \
+        'Features differ.'
+
+    # Test 2: learning with derived dfunc is unchanged
+    t.learner.learn(episodes=range(0, t.num_states, 7))
+    tf.learner.learn(episodes=range(0, t.num_states, 7))
+    assert np.allclose(t.learner.weights, tf.learner.weights), 'Learned weights differ.'
+
+    # Test 3: precomputed features agree with features computed on the fly
+    for storage in (FLearner.DENSE, FLearner.COMPACT, FLearner.MEMMAP):
+        assert tf.learner.precompute_features(storage), 'Features not precomputed.'
+        assert tf.learner.ftensor.shape == (t.num_states, len(t.actions), funcdim), \
+            'Incorrect feature tensor shape.'
+        for state in range(t.num_states):
+            assert np.allclose(t.learner.qvalue(state), tf.learner.qvalue(state)), \
+                'Precomputed q-values differ.'
+            assert np.isclose(t.learner.qvalue(state, 1), tf.learner.qvalue(state, 1)), \
+                'Precomputed q-value differs.'
+    t.learner.learn(episodes=range(1, t.num_states, 7))
+    tf.learner.learn(episodes=range(1, t.num_states, 7))
+    assert np.allclose(t.learner.weights, tf.learner.weights, atol=1e-5), \
+        'Learned weights with precomputed features differ.'
+
+    # Test 4: features over memory budget are computed on the fly
+    assert not tf.learner.precompute_features(budget=100), 'Feature budget exceeded.'
+    assert tf.learner.ftensor is None, 'Feature tensor stored over budget.'
+
+
+@test
+def test_least_squares():
+    """
+    Testing least-squares TD/policy iteration solvers.
+    """
+    # Set up
+    size = 10
+    seed = 1000
+    funcdim = 7
+    start = (3, 4)
+    def features(S, A):
+        return np.c_[S[:, 0]*A[:, 0]/20, S[:, 1]*A[:, 1]/20, S[:, 0]**2/100,
+                     S[:, 1]**2/100, A[:, 0]**2/4, A[:, 1]**2/4, np.ones(len(S))]
+    kwargs = dict(size=size, seed=seed, func=None, dfunc=None, features=features,
+                  funcdim=funcdim, discount=0.5)
+
+    # Test 1: LSPI converges to a policy that reaches goal
+    t = TestBench(learner=FLearner, **kwargs)
+    iterations = t.learner.solve(method=FLearner.LSPI, episodes=range(t.num_states))
+    assert iterations < funcdim + 1, 'LSPI did not converge.'
+    res = t.episode(start=start, interactive=False)
+    assert t.learner.goal(t.coord2state(res[-1])), 'Solved policy does not reach goal.'
+
+    # Test 2: incremental updates agree with batch solution
+    samples = algorithms.collect(t.learner, range(0, t.num_states, 3))
+    t.learner.set_action_selection_policy(FLearner.UNIFORM)
+    weights = algorithms.lstd(t.learner, samples)
+    acc = algorithms.LSTDAccumulator(funcdim, discount=0.5)
+    aprobs = np.ones(len(t.actions)) / len(t.actions)
+    for f, r, nf, term in zip(samples['features'], samples['rewards'],
+                              samples['nfeatures'], samples['terminal']):
+        acc.add(f, r, None if term else aprobs @ nf)
+    assert np.allclose(acc.weights, weights), 'Incremental weights differ.'
+
+    # Test 3: online solving updates weights as transitions are collected
+    t.learner.random.seed(seed)
+    samples = algorithms.collect(t.learner, range(0, t.num_states, 3))
+    weights = algorithms.lstd(t.learner, samples)
+    t.learner.random.seed(seed)
+    t.learner.solve(method=FLearner.LSTD, episodes=range(0, t.num_states, 3), online=True)
+    assert np.allclose(t.learner.weights, weights), 'Online weights differ.'
+    try:
+        t.learner.solve(method=FLearner.LSPI, online=True)
+        raise AssertionError('Online LSPI accepted.')
+    except ValueError:
+        pass
+
+    # Test 4: state vector learners
+    t = TestBench(learner=SLearner, **kwargs)
+    t.learner.solve(method=SLearner.LSTD, coverage=0.5)
+    assert np.all(np.isfinite(t.learner.weights)), 'Weights not solved.'
+    t.learner.solve(method=SLearner.LSTD, coverage=0.1, online=True)
+    assert np.all(np.isfinite(t.learner.weights)), 'Weights not solved online.'
+
+
+@test
+def test_experience_replay():
+    """
+    Testing experience replay buffers.
+    """
+    # Set up
+    capacity = 4
+    random = np.random.RandomState(1000)
+
+    # Test 1: oldest transitions are overwritten
+    buffer = replay.ReplayBuffer(capacity)
+    for i in range(capacity + 2):
+        buffer.add([i, i], [i], i, [i + 1, i + 1], i == 5)
+    assert len(buffer) == capacity, 'Buffer exceeds capacity.'
+    assert sorted(buffer.rewards) == [2, 3, 4, 5], 'Oldest transitions not overwritten.'
+    batch = buffer.sample(10, random)
+    assert np.array_equal(batch['svecs'][:, 0], batch['rewards']), 'Sampled transitions mismatched.'
+    assert np.array_equal(batch['terminal'], batch['rewards'] == 5), 'Terminal flags mismatched.'
+
+    # Test 2: prioritized sampling prefers larger errors
+    buffer = replay.ReplayBuffer(capacity, prioritized=True, alpha=1)
+    for i in range(capacity):
+        buffer.add([i], [i], i, [i], False)
+    buffer.update(np.arange(capacity), [0, 0, 0, 1])
+    batch = buffer.sample(100, random)
+    assert np.mean(batch['indices'] == 3) > 0.9, 'Prioritized sampling not biased.'
+    assert np.all(batch['weights'] <= 1), 'Importance weights not normalized.'
+
+    # Test 3: simulated transitions are stored and replayed while learning
+    t = TestBench(size=5, seed=1000, learner=SLearner, lrate=1e-1, discount=1e-2,
+                  func=lambda s, a, w: np.dot(w, np.r_[s, a, 1]),
+                  dfunc=lambda s, a, w: np.r_[s, a, 1], funcdim=5)
+    t.learner.set_replay(100, batchsize=8, updates=2)
+    states, _ = t.learner.learn(coverage=0.2, stepsize=lambda x: 1e-2)
+    assert len(t.learner.replay) == min(100, sum([len(s) for s in states])), \
+        'Transitions not stored.'
+    weights = np.copy(t.learner.weights)
+    t.learner.learn_replay(updates=1)
+    assert not np.array_equal(weights, t.learner.weights), 'Weights not updated by replay.'
+
+    # Test 4: batches of episodes are not supported
+    try:
+        t.learner.learn(coverage=0.2, batch=2)
+        raise AssertionError('Batches accepted with replay.')
+    except ValueError:
+        pass
+
+
+@test
+def test_parallel_learning():
+    """
+    Testing parallel learning episodes with shared weights.
+    """
+    # Set up
+    size = 5
+    workers = 3
+    t = TestBench(size=size, seed=1000, learner=SLearner, lrate=1e-3, discount=1e-2,
+                  func=lambda s, a, w: np.dot(w, np.r_[s, a, 1] / size),
+                  dfunc=lambda s, a, w: np.r_[s, a, 1] / size, funcdim=5)
+    episodes = [t.learner.stateconverter.decode(s) for s in range(t.num_states)]
+
+    # Test 1: histories are returned in order of episodes
+    states, actions = t.learner.learn(episodes=episodes, workers=workers)
+    assert len(states) == len(episodes), 'Incorrect number of histories.'
+    for start, history, ahistory in zip(episodes, states, actions):
+        assert np.array_equal(history[0], t.learner.next_state(start, ahistory[0])), \
+            'Histories out of order.'
+
+    # Test 2: updates from all workers are applied to weights
+    assert not np.array_equal(t.learner.weights, np.ones(5)), 'Weights not learned.'
+    assert t.learner.weights.flags.owndata, 'Weights still in shared memory.'
+
+    # Test 3: unsupported arguments
+    for kwargs in ({'checkpoint': 'test.ckpt'}, {'batch': 2}):
+        try:
+            t.learner.learn(episodes=episodes, workers=workers, **kwargs)
+            raise AssertionError('Unsupported argument accepted.')
+        except ValueError:
+            pass
+
+    # Test 4: learning is serial in daemonic processes
+    def learn(learned):
+        t.learner.learn(episodes=episodes[:2], workers=workers)
+        learned.value = 1
+    learned = multiprocessing.Value('i', 0)
+    process = multiprocessing.get_context('fork').Process(target=learn, args=(learned,),
+                                                          daemon=True)
+    process.start()
+    process.join()
+    assert learned.value == 1, 'Daemonic process did not learn.'
+
+
+@test
+def test_transition_cache():
+    """
+    Testing memoization of simulator transitions.
+    """
+    # Set up
+    class Counter:
+        """A deterministic simulator that counts runs."""
+        def __init__(self):
+            self.runs = 0
+            self.fault = 0
+        def run(self, state, action, stepsize=1):
+            self.runs += 1
+            return np.asarray(state) + np.asarray(action) * stepsize + self.fault
+    sim = Counter()
+    flags = FlagGenerator((0, 11, 1), 2)
+
+    # Test 1: repeated transitions are not simulated
+    cache = cache_.TransitionCache(sim, maxsize=2)
+    assert np.array_equal(cache.run([0.1, 0], [1, 1]), [1.1, 1]), 'Incorrect transition.'
+    cache.run([0.1, 0], [1, 1])
+    cache.run([0.1, 0], [1, 1], stepsize=2)
+    assert sim.runs == 2 and cache.hits == 1, 'Transitions not memoized.'
+    nstates = cache.run_many([[0.1, 0], [0.2, 0]], [[1, 1], [1, 1]])
+    assert np.array_equal(nstates, [[1.1, 1], [1.2, 1]]) and sim.runs == 3, \
+        'Batch transitions not memoized.'
+
+    # Test 2: least recently used transitions are evicted
+    assert len(cache) == 2, 'Cache exceeds maximum size.'
+    cache.run([0.1, 0], [1, 1], stepsize=2)
+    assert sim.runs == 4, 'Least recently used transition not evicted.'
+
+    # Test 3: environment changes clear cache
+    sim.fault = 1
+    assert np.array_equal(cache.run([0.1, 0], [1, 1]), [2.1, 2]), 'Stale transition.'
+    assert cache.stats['invalidations'] == 1, 'Cache not invalidated.'
+
+    # Test 4: quantized states share transitions
+    cache = cache_.TransitionCache(sim, stateconverter=flags)
+    cache.run([0.11, 1], [0, 0])
+    cache.run([0.09, 1], [0, 0])
+    assert cache.stats['hits'] == 1, 'Quantized states not memoized.'
+    runs = sim.runs
+    nstates = cache.run_many([[0.51, 1], [0.49, 1], [0.5, 0]], [[0, 0]] * 3)
+    assert sim.runs == runs + 2 and cache.stats['hits'] == 2, \
+        'Repeated batch transitions simulated.'
+    assert np.array_equal(nstates[0], nstates[1]), 'Repeated batch transitions differ.'
+
+
+@test
+def test_model_predictive_control():
+    """
+    Testing model predictive controller look-ahead limits.
+    """
+    # Set up
+    class Line:
+        """Moves a point along a line, with a drift in case of a fault."""
+        fault = 0
+        def run(self, state, action, stepsize=1):
+            return np.asarray(state) + np.asarray(action) + self.fault
+    dmap = lambda s: abs(s[0] - 4)
+    kwargs = dict(dmap=dmap, simulator=Line(), stateconverter=FlagGenerator((-10, 10)),
+                  actionconverter=FlagGenerator((-1, 1)), depth=3, seed=1000)
+
+    # Test 1: exhaustive search finds first action towards goal
+    mpc = ModelPredictiveController(**kwargs)
+    assert np.array_equal(mpc.recommend([0]), [1]), 'Incorrect action.'
+    assert mpc.expanded == 3 + 9 + 27 + 81, 'Search not exhaustive.'
+    assert np.array_equal(mpc.recommend([6]), [-1]), 'Incorrect action.'
+
+    # Test 2: beam width limits expanded states
+    mpc = ModelPredictiveController(beam=2, **kwargs)
+    assert np.array_equal(mpc.recommend([0]), [1]), 'Incorrect beam search action.'
+    assert mpc.expanded == 3 + 6 + 6 + 6, 'Beam width exceeded.'
+
+    # Test 3: duplicate states are expanded once
+    mpc = ModelPredictiveController(resolution=1, **kwargs)
+    assert np.array_equal(mpc.recommend([0]), [1]), 'Incorrect pruned search action.'
+    assert mpc.expanded == 3 + 6 + 6 + 6, 'Duplicate states expanded.'
+
+    # Test 4: time budget stops search after first level
+    mpc = ModelPredictiveController(budget=0, **kwargs)
+    assert np.array_equal(mpc.recommend([0]), [1]), 'Incorrect anytime action.'
+    assert mpc.expanded == 3, 'Time budget exceeded.'
+
+    # Test 5: parallel subtree search matches serial search
+    kwargs.update(density=0.4, dmap=lambda s: abs(s[0] - 4) // 2)
+    serial = ModelPredictiveController(**kwargs)
+    parallel = ModelPredictiveController(workers=2, **kwargs)
+    for state in range(-3, 8):
+        assert np.array_equal(serial.recommend([state]), parallel.recommend([state])),\
+            'Parallel search action differs from serial.'
+        assert serial.expanded == parallel.expanded, 'Parallel search incomplete.'
+    pool = parallel._pool
+    kwargs['simulator'].fault = 1
+    for state in range(-3, 8):
+        assert np.array_equal(serial.recommend([state]), parallel.recommend([state])),\
+            'Simulator changes not sent to workers.'
+    kwargs['simulator'].fault = 0
+    assert parallel._pool is pool, 'Workers forked again.'
+    parallel.close()
+    assert parallel._pool is None, 'Workers not stopped.'
+
+    # Test 6: search is serial in daemonic processes
+    def recommend(searched):
+        parallel.recommend([0])
+        searched.value = 1
+    searched = multiprocessing.Value('i', 0)
+    process = multiprocessing.get_context('fork').Process(target=recommend,
+                                                          args=(searched,), daemon=True)
+    process.start()
+    process.join()
+    assert searched.value == 1, 'Daemonic process did not search.'
+
+    # Test 7: warm start returns re-verified plan when budget is spent
+    kwargs.update(density=1, dmap=dmap)
+    mpc = ModelPredictiveController(warmstart=True, **kwargs)
+    mpc.recommend([0])
+    assert np.array_equal(mpc.plan, [2, 2, 2, 2]), 'Plan not kept.'
+    mpc.budget = 0
+    assert np.array_equal(mpc.recommend([1]), [1]), 'Incorrect warm start action.'
+    assert mpc.expanded == 0 and len(mpc.plan) == 3, 'Plan not shifted.'
+    mpc.budget = None
+    assert np.array_equal(mpc.recommend([10]), [-1]), 'Stale plan not re-verified.'
+    mpc.reset()
+    assert mpc.plan is None, 'Plan not reset.'
+
+    # Test 8: plan is expanded even if the beam drops it
+    mpc = ModelPredictiveController(warmstart=True, beam=1, **kwargs)
+    mpc.plan = np.array([1, 0, 2, 2])
+    assert np.array_equal(mpc.recommend([0]), [1]), 'Incorrect seeded beam action.'
+    assert mpc.expanded == 3 + 6 + 6 + 6, 'Plan not added to beam.'
+
+    # Test 9: time budget stops search within a level
+    class SlowLine(Line):
+        """Moves a point along a line slowly."""
+        def run(self, state, action, stepsize=1):
+            time.sleep(1e-2)
+            return super().run(state, action, stepsize)
+    kwargs.update(simulator=SlowLine())
+    mpc = ModelPredictiveController(budget=0.05, chunksize=1, **kwargs)
+    assert np.array_equal(mpc.recommend([0]), [1]), 'Incorrect anytime action.'
+    assert mpc.expanded == 3 + 3, 'Time budget exceeded within level.'
+
+
+@test
+def test_topology_generation():
+    """
+    Testing fault, diamond-square, and perlin noise topologies and matrices.
+    """
+    # Set up
+    size = 13
+    seed = 1000
+
+    # Test 1: all methods generate normalized, reproducible height maps
+    for method in (TestBench.FAULT, TestBench.DIAMOND_SQUARE, TestBench.PERLIN):
+        t = TestBench(size=size, seed=seed, method=method)
+        t2 = TestBench(size=size, seed=seed, method=method)
+        assert t.topology.shape == (size, size), 'Incorrect topology shape.'
+        assert np.amin(t.topology) == 0 and np.amax(t.topology) == 1, \
+            'Topology not normalized.'
+        assert np.array_equal(t.topology, t2.topology), \
+            'Identically seeded topologies not equal.'
+
+    # Test 2: chunking faults does not change topology
+    fault = fault_algorithm(50, (size, size), np.random.RandomState(seed))
+    chunked = fault_algorithm(50, (size, size), np.random.RandomState(seed), chunksize=7)
+    assert np.array_equal(fault, chunked), 'Chunked faults not equal.'
+
+    # Test 3: unknown methods
+    try:
+        TestBench(size=size, method='unknown')
+        raise AssertionError('Unknown method accepted.')
+    except ValueError:
+        pass
+
+    # Test 4: transition and reward matrices match an explicit loop
+    for wrap in (False, True):
+        t = TestBench(size=7, seed=seed, wrap=wrap, goals=[(0, 0), (3, 4), (6, 6)])
+        tmatrix = np.zeros((t.num_states, len(t.actions)), dtype=int)
+        rmatrix = np.zeros((t.num_states, len(t.actions)))
+        trg_rmatrix = np.zeros((t.num_states, len(t.actions)))
+        reward_lim = np.amax(t.topology) - np.amin(t.topology)
+        for i in range(t.num_states):
+            coords = t.state2coord(i)
+            for j, action in enumerate(t.actions):
+                next_coord = coords + action
+                if wrap:
+                    next_coord[next_coord < 0] += t.size
+                    next_coord[next_coord >= t.size] -= t.size
+                else:
+                    next_coord[next_coord < 0] = 0
+                    next_coord[next_coord >= t.size] = t.size - 1
+                tmatrix[i, j] = t.coord2state(next_coord)
+                drop = (t.topology[coords[0], coords[1]] \
+                        - t.topology[next_coord[0], next_coord[1]]) / reward_lim
+                if tmatrix[i, j] in t.goals:
+                    rmatrix[i, j] = 1
+                    trg_rmatrix[i, j] = t.size * reward_lim
+                else:
+                    rmatrix[i, j] = drop - 1 / t.size
+                    trg_rmatrix[i, j] = drop - 1
+        assert np.array_equal(t.tmatrix, tmatrix), 'Transition matrices differ.'
+        assert np.array_equal(t.rmatrix, rmatrix), 'Reward matrices differ.'
+        trg = t.generate_trg(wrap=wrap)
+        assert np.array_equal(trg[0], tmatrix) and np.array_equal(trg[1], trg_rmatrix), \
+            'Generated matrices differ.'
+
+
 # @test
 def qlearner_testbench():
     """
@@ -242,6 +882,12 @@ def flearner_testbench():
     assert len(res) > 0, 'Episode path not computed.'
     res = t.shortest_path(point=start)
     assert len(res) > 0 and res[0] == start, 'Shortest path not computed.'
+    assert t.coord2state(res[-1]) in t.goals, 'Shortest path does not reach goal.'
+    distances, _ = t.shortest_paths()
+    for state in set(range(t.num_states)) - set(t.goals):
+        best = min([abs_cartesian(t.topology, t.state2coord(state), t.state2coord(n))\
+                    + distances[n] for n in t.tmatrix[state] if n != state])
+        assert np.isclose(distances[state], best), 'Shortest distances not optimal.'
 
     # Test 3: Visualization
     t.show_topology(showfield=True, QPath=t.path, Dijkstra=res)
@@ -290,6 +936,17 @@ if __name__ == '__main__':
     test_instantiation()
     test_offline_learning()
     test_online_learning()
+    test_batch_learning()
+    test_dynamic_programming()
+    test_storage_backends()
+    test_checkpoints()
+    test_batched_features()
+    test_least_squares()
+    test_experience_replay()
+    test_parallel_learning()
+    test_transition_cache()
+    test_model_predictive_control()
+    test_topology_generation()
     qlearner_testbench()
     flearner_testbench()
     slearner_testbench()
@@ -7,6 +7,7 @@ Note: TestBench uses (row, column) (y, x) cordinate convention for consistency
 with array indexing.
 """
 
+import heapq
 import numpy as np
 from mpl_toolkits.mplot3d import Axes3D
 import matplotlib.pyplot as plt
@@ -17,6 +18,8 @@ try:
     from linsim import FlagGenerator
     from tb_utils import abs_cartesian
     from tb_utils import fault_algorithm
+    from tb_utils import diamond_square
+    from tb_utils import perlin_noise
     from tb_utils import create_sim_env
 except ImportError:
     from . import QLearner
@@ -25,6 +28,8 @@ except ImportError:
     from .linsim import FlagGenerator
     from .tb_utils import abs_cartesian
     from .tb_utils import fault_algorithm
+    from .tb_utils import diamond_square
+    from .tb_utils import perlin_noise
     from .tb_utils import create_sim_env
 
 
@@ -42,7 +47,8 @@ class TestBench:
     Args:
         size (int): The size of each side of the topology (size * size points).
         seed (int): The seed for the random number generator.
-        method (str): Method for generating topology. Default='fault'.
+        method (str): Method for generating topology. One of TestBench.FAULT,
+            TestBench.DIAMOND_SQUARE, TestBench.PERLIN. Default='fault'.
         goals (int/list): Number of goal states. Default = size. If list, then
             (y, x) coordinates of goal states in topology.
         wrap (bool): Whether or not the topology wraps at edges. Default=False.
@@ -82,6 +88,10 @@ class TestBench:
 
     plot_num = -1
 
+    FAULT = 'fault'
+    DIAMOND_SQUARE = 'diamondsquare'
+    PERLIN = 'perlin'
+
     def __init__(self, size=10, seed=0, method='fault', goals=None, wrap=False,
                  learner=QLearner, **kwargs):
         self.random = np.random.RandomState(seed)
@@ -107,6 +117,7 @@ class TestBench:
             self.num_goals = self.size
 
         self.learner = None
+        self._path_tables = {}      # metric: (distances, successors)
 
         # plotting variables
         self.__class__.plot_num += 1
@@ -204,7 +215,8 @@ class TestBench:
         """
         Returns the shortest path between the point and any of the goal states
         where the distance between two adjacent states/points is determined by
-        the metric. Uses Dijkstra's algorithm.
+        the metric. The path is traced through the successor table computed
+        by shortest_paths().
 
         Args:
             point (tuple/list/ndarray): (y, x) coordinates of point.
@@ -220,47 +232,69 @@ class TestBench:
             goal states. The list contains points on the topology (y, x)
             traversed.
         """
-        # Set up initial distances, visited status, and target states.
-        # All states intially loop back to themselves.
-        distances = np.array([(i, np.inf) for i in range(self.num_states)])
-        distances[self.coord2state(point)][1] = 0
-        predecessors = np.arange(self.num_states)
-        unvisited = np.ones(self.num_states, dtype=bool)
-        goals_left = set(self.goals)
-
-        # Explore closest state from source as long as there are targets/states left
-        while len(goals_left):
-            closest = int(distances[unvisited][np.argmin(distances[unvisited], axis=0)[1]][0])
-            unvisited[closest] = False
-            if closest in goals_left:
-                goals_left.remove(closest)
-
-            neighbours = [n for n in self.tmatrix[closest, :] if unvisited[n]]
-            for n in neighbours:
-                distance = metric(self.topology, self.state2coord(closest),\
-                                self.state2coord(n))
-                if distance < distances[n, 1]:
-                    distances[n, 1] = distances[closest, 1] + distance
-                    predecessors[n] = closest
-
-        # Find closest goal state and trace path back to source
-        goal_distances = distances[self.goals, 1]
-        closest_goal = self.goals[np.argmin(goal_distances)]
-        path = [self.state2coord(closest_goal)]
-        state = closest_goal
-        prev = predecessors[state]
-        while prev != state:
-            path.insert(0, self.state2coord(prev))
-            state = prev
-            prev = predecessors[state]
-        # Check if last element in path is goal state
-        if path[-1] != self.state2coord(closest_goal):
+        distances, successors = self.shortest_paths(metric)
+        state = self.coord2state(point)
+        if np.isinf(distances[state]):
             raise ValueError('Shortest path could not be found.')
-        elif path[0] != tuple(point):
-            raise ValueError('Could not trace goal to starting point.')
+        path = [self.state2coord(state)]
+        while successors[state] != state:
+            state = successors[state]
+            path.append(self.state2coord(state))
         return path
 
 
+    def shortest_paths(self, metric=abs_cartesian):
+        """
+        Computes the distance to the closest goal state and the next state on
+        the shortest path to it for all states. Uses Dijkstra's algorithm with
+        a heap on reversed transitions, starting from all goal states at once.
+        The tables are cached for each metric.
+
+        Args:
+            metric (func): A function that calculates the measure of distance
+                between two points on the topology. See shortest_path().
+
+        Returns:
+            A tuple of:
+            - An array of shortest distances to any goal for each state. The
+              distance is inf if no goal can be reached.
+            - An array of the next state on the shortest path from each state.
+              Goal states and states that cannot reach a goal point to
+              themselves.
+        """
+        if metric in self._path_tables:
+            return self._path_tables[metric]
+        # Reversed edges: For each state, the states with a transition to it.
+        sources = np.repeat(np.arange(self.num_states), self.tmatrix.shape[1])
+        targets = np.ravel(self.tmatrix)
+        order = np.argsort(targets, kind='stable')
+        sources, targets = sources[order], targets[order]
+        bounds = np.searchsorted(targets, np.arange(self.num_states + 1))
+
+        distances = np.full(self.num_states, np.inf)
+        successors = np.arange(self.num_states)
+        visited = np.zeros(self.num_states, dtype=bool)
+        distances[list(self.goals)] = 0
+        heap = [(0., int(g)) for g in self.goals]
+        heapq.heapify(heap)
+        while len(heap):
+            distance, closest = heapq.heappop(heap)
+            if visited[closest]:
+                continue
+            visited[closest] = True
+            target = self.state2coord(closest)
+            for n in sources[bounds[closest]:bounds[closest + 1]]:
+                if visited[n]:
+                    continue
+                candidate = distance + metric(self.topology, self.state2coord(n), target)
+                if candidate < distances[n]:
+                    distances[n] = candidate
+                    successors[n] = closest
+                    heapq.heappush(heap, (candidate, int(n)))
+        self._path_tables[metric] = (distances, successors)
+        return distances, successors
+
+
     def show_topology(self, showfield=False, showlegend=False, **paths):
         """
         Draws a surface plot of the topology, marks goal states, and any episode
@@ -341,22 +375,30 @@ class TestBench:
         self.topology[y, x] = height at coordinate (x, y).
 
         Args:
-            method (str/func): The algorithm to use. Default='fault'. OR it can
-                also be a function object. The function must return a ndarray
-                consistent with the topology size given to TestBench at
-                instantiation. Signature like:
+            method (str/func): The algorithm to use. One of TestBench.FAULT,
+                TestBench.DIAMOND_SQUARE, TestBench.PERLIN (see tb_utils).
+                Default='fault'. OR it can also be a function object. The
+                function must return a ndarray consistent with the topology
+                size given to TestBench at instantiation. Signature like:
                     function(self, *args, **kwargs)
             *args: Positional arguments passed on to method if it is a function.
-            **kwargs: Keyword arguments passed on to method if it is a function.
+            **kwargs: Keyword arguments passed on to method (e.g. roughness
+                for diamond-square or octaves for perlin noise).
         
         Returns:
             A size x size array representing a height map.
         """
         if callable(method):
             return method(*args, **kwargs)
-        elif method == 'fault':
+        elif method == self.FAULT:
             return fault_algorithm(int(self.random.rand() * 200),\
-                            (self.size, self.size), self.random)
+                            (self.size, self.size), self.random, **kwargs)
+        elif method == self.DIAMOND_SQUARE:
+            return diamond_square((self.size, self.size), self.random, **kwargs)
+        elif method == self.PERLIN:
+            return perlin_noise((self.size, self.size), self.random, **kwargs)
+        else:
+            raise ValueError('Topology method: ' + str(method) + ' does not exist.')
 
 
     def create_tmatrix(self, wrap=False):
@@ -370,20 +412,14 @@ class TestBench:
             A states x actions ndarray. Where [i, j] is the next state index
             for taking action j from state i.
         """
-        tmatrix = np.zeros((self.num_states, len(self.actions)), dtype=int)
-        for i in range(self.num_states):
-            coords = self.state2coord(i)
-            # updating r and t matrices
-            for j, action in enumerate(self.actions):
-                next_coord = coords + action
-                if wrap:
-                    next_coord[next_coord < 0] += self.size
-                    next_coord[next_coord >= self.size] -= self.size
-                else:
-                    next_coord[next_coord < 0] = 0
-                    next_coord[next_coord >= self.size] = self.size - 1
-
-                tmatrix[i, j] = self.coord2state(next_coord)
+        states = np.arange(self.num_states)
+        coords = np.stack((states // self.size, states % self.size), axis=1)
+        next_coords = coords[:, None, :] + self.actions[None, :, :]
+        if wrap:
+            next_coords = np.mod(next_coords, self.size)
+        else:
+            next_coords = np.clip(next_coords, 0, self.size - 1)
+        tmatrix = next_coords[:, :, 0] * self.size + next_coords[:, :, 1]
         return tmatrix
     
 
@@ -414,18 +450,33 @@ class TestBench:
             action j from state i.
         """
         reward_lim = np.amax(topology) - np.amin(topology)
-        rmatrix = np.zeros((self.num_states, len(self.actions)))
-        for i in range(self.num_states):
-            coords = self.state2coord(i)
-            for j, action in enumerate(self.actions):
-                next_coord = self.state2coord(tmatrix[i, j])
-                if tmatrix[i, j] in goals:
-                    rmatrix[i, j] = 1
-                else:
-                    rmatrix[i, j] = (topology[coords[0], coords[1]] \
-                                     - topology[next_coord[0], next_coord[1]]) \
-                                    / reward_lim \
-                                    - (1/self.size)
+        return self._topology_rewards(goals, topology, tmatrix, 1, 1/self.size,
+                                      reward_lim)
+
+
+    def _topology_rewards(self, goals, topology, tmatrix, goal_reward, penalty,
+                          reward_lim):
+        """
+        Calculates rewards for all states and actions at once. Transitions into
+        goal states get goal_reward. Other rewards are the drop in height
+        normalized by reward_lim, minus a penalty per step.
+
+        Args:
+            goals (list): State indices of goal states.
+            topology (ndarray): A size x size height map.
+            tmatrix (ndarray): A states x actions transition matrix.
+            goal_reward (float): Reward for transitioning into a goal state.
+            penalty (float): Cost subtracted from every other reward.
+            reward_lim (float): Height difference normalizing rewards.
+
+        Returns:
+            A states x actions reward matrix.
+        """
+        heights = np.ravel(topology)
+        is_goal = np.zeros(self.num_states, dtype=bool)
+        is_goal[np.asarray(goals, dtype=int)] = True
+        rmatrix = (heights[:, None] - heights[tmatrix]) / reward_lim - penalty
+        rmatrix[is_goal[tmatrix]] = goal_reward
         return rmatrix
 
 
@@ -447,35 +498,13 @@ class TestBench:
             A tuple of (transition matrix, reward matrix, and list of goal states)
         """
         reward_lim = np.amax(self.topology) - np.amin(self.topology)
-        tmatrix = np.zeros((self.num_states, len(self.actions)), dtype=int)
-        rmatrix = np.zeros((self.num_states, len(self.actions)))
         # updating goal states
         goals = np.argsort(np.ravel(self.topology))[:self.num_goals] \
                 if len(self.goals) == 0 else self.goals
-
-        for i in range(self.num_states):
-            coords = self.state2coord(i)
-            # updating r and t matrices
-            for j, action in enumerate(self.actions):
-                next_coord = coords + action
-                if wrap:
-                    next_coord[next_coord < 0] += self.size
-                    next_coord[next_coord >= self.size] -= self.size
-                else:
-                    next_coord[next_coord < 0] = 0
-                    next_coord[next_coord >= self.size] = self.size - 1
-
-                tmatrix[i, j] = self.coord2state(next_coord)
-                # Punish actions looping back i.e at edges when no wrap
-                # if np.array_equal(next_coord, coords):
-                #     rmatrix[i, j] = -reward_lim
-                # Reward actions leading to final goal
-                if tmatrix[i, j] in goals:
-                    rmatrix[i, j] = self.size*reward_lim
-                else:
-                    rmatrix[i, j] = (self.topology[coords[0], coords[1]] \
-                                    - self.topology[next_coord[0], next_coord[1]]) \
-                                    / reward_lim - 1
+        tmatrix = self.create_tmatrix(wrap=wrap)
+        # Reward actions leading to final goal
+        rmatrix = self._topology_rewards(goals, self.topology, tmatrix,
+                                         self.size*reward_lim, 1, reward_lim)
         return (tmatrix, rmatrix, goals)
 
 
@@ -1,28 +1,79 @@
 """
 Contains common utility functions.
+
+Matrices can be stored as:
+* Text files of whitespace separated numbers (any extension except below),
+* Binary .npy files, which can be memory-mapped instead of read into memory,
+* Binary .npz files, which also store a header of parameters (for e.g. the
+    learner parameters the matrix was learned with).
 """
 
+import json
 import numpy as np
 
-def read_matrix(fname):
+def read_matrix(fname, mmap_mode=None):
     """
-    Reads a file of whitespace separated floats into an array.
+    Reads a matrix from a file. The format is determined by the extension.
 
     Args:
         fname (str): Filepath of matrix.
+        mmap_mode (str): For .npy files, one of None, 'r', 'r+', 'c' (see
+            np.load). If not None, the file is memory-mapped so it is read
+            lazily and the page cache is shared between processes. Ignored
+            for other formats.
 
     Returns:
-        A np.ndarray containing a matrix.
+        A np.ndarray (or np.memmap) containing a matrix.
     """
+    if fname.endswith('.npy'):
+        return np.load(fname, mmap_mode=mmap_mode)
+    elif fname.endswith('.npz'):
+        with np.load(fname) as archive:
+            return archive['matrix']
     return np.loadtxt(fname)
 
 
-def save_matrix(mat, fname):
+def save_matrix(mat, fname, **params):
     """
-    Saves a ndarray into a text file of whitespace separated numbers.
+    Saves a ndarray into a file. The format is determined by the extension.
 
     Args:
         mat (ndarray): Array to save to file.
         fname (str): Filepath where to save.
+        **params: Parameters stored in the header of .npz files along with
+            the shape and dtype of mat. Must be JSON serializable. Ignored for
+            other formats.
+    """
+    if fname.endswith('.npy'):
+        np.save(fname, mat)
+    elif fname.endswith('.npz'):
+        header = dict(params, shape=np.shape(mat), dtype=str(np.asarray(mat).dtype))
+        np.savez(fname, matrix=mat, header=json.dumps(header))
+    else:
+        np.savetxt(fname, mat)
+
+
+def read_header(fname):
+    """
+    Reads the header of a binary matrix file without reading the matrix.
+
+    Args:
+        fname (str): Filepath of .npy or .npz matrix.
+
+    Returns:
+        A dict with 'shape' (tuple) and 'dtype' (str) keys, and any parameters
+        stored by save_matrix() for .npz files.
     """
-    np.savetxt(fname, mat)
+    if fname.endswith('.npy'):
+        with open(fname, 'rb') as npy:
+            if np.lib.format.read_magic(npy) == (1, 0):
+                shape, _, dtype = np.lib.format.read_array_header_1_0(npy)
+            else:
+                shape, _, dtype = np.lib.format.read_array_header_2_0(npy)
+        return {'shape': shape, 'dtype': str(dtype)}
+    elif fname.endswith('.npz'):
+        with np.load(fname) as archive:
+            header = json.loads(str(archive['header']))
+        header['shape'] = tuple(header['shape'])
+        return header
+    raise ValueError('Only .npy and .npz files have headers.')
@@ -32,6 +32,10 @@ Usage:
 > python tanks.py -x -f 3   # simulate tanks with fault in third tank (LAux)
 > python .\tankscustomdemo.py -c 2e-4 -f 6 -r 0.2 -s 5 -m 10 -e 0.75
 > python .\tankscustomdemo.py --usempc -m 1
+> python tankscustom.py --usempc -m 8 --beam 64 --budget 0.1
+> python tankscustom.py --usempc -m 8 --beam 64 --budget 0.05 --warmstart
+> python tankscustom.py --usempc -m 3 --learners 4  # MPC subtrees on 4 cores
+> python tankscustom.py --numtrials 20 --workers 0 --seed 1  # trials on all cores
 
 Default model and learning parameters can be changed below. Some of them
 can be tuned from the command-line.
@@ -44,12 +48,14 @@ Requires:
 
 import math
 import random
+import multiprocessing
 import flask
 import numpy as np
 from scipy.integrate import trapz
 from argparse import ArgumentParser, RawTextHelpFormatter
 from qlearn import SLearner
 from qlearn import FlagGenerator
+from qlearn import ModelPredictiveController
 from models import SixTankModel
 
 
@@ -67,6 +73,9 @@ SEED = None         # Random number seed
 FAULT = list(range(7))         # Default set of faults
 DELTA_T = 1         # step size of simulation
 FUNCDIM = 7         # dimensions in value function
+REPLAY = 0          # Number of transitions stored for experience replay
+CACHE = 0           # Number of simulated transitions cached
+BEAM = None         # Number of states expanded in each level of MPC look-ahead
 
 # Set up command-line configuration
 args = ArgumentParser(description=__doc__, formatter_class=RawTextHelpFormatter)
@@ -95,93 +104,41 @@ args.add_argument('-x', '--disable', action='store_true',
                   help="Learning disabled if included", default=False)
 args.add_argument('--usempc', action='store_true',
                   help="Use model predictive controller.", default=False)
+args.add_argument('--beam', type=int, metavar='B',
+                  help="MPC states expanded in each look-ahead level. Default all.",
+                  default=BEAM)
+args.add_argument('--budget', type=float, metavar='T',
+                  help="MPC look-ahead time limit in seconds. Default none.", default=None)
+args.add_argument('--warmstart', action='store_true',
+                  help="MPC search seeded with the plan from the last step.", default=False)
+args.add_argument('--resolution', type=float, metavar='R',
+                  help="MPC prunes states equal up to resolution. Default none.", default=None)
 args.add_argument('--hierarchical', action='store_true',
                       help="Hierarchical state space traversal.", default=False)
 args.add_argument('--density', type=float,
                       help="State sampling density (0, 1]. 1 => all neighbours sampled.", default=DENSITY)
+args.add_argument('--replay', type=int, metavar='N',
+                  help="Transitions stored for experience replay. 0 => disabled.", default=REPLAY)
+args.add_argument('--cache', type=int, metavar='N',
+                  help="Simulated transitions cached when noise is 0. 0 => disabled.",
+                  default=CACHE)
+args.add_argument('--quantize', action='store_true',
+                  help="Cache transitions by nearest discrete state.", default=False)
 args.add_argument('--numtrials', type=int, metavar='N',
                   help="Run trials instead of interactive server.", default=None)
+args.add_argument('--workers', type=int, metavar='W',
+                  help="Number of processes running trials. 0 => all cores.", default=1)
+args.add_argument('--learners', type=int, metavar='L',
+                  help="Number of processes learning episodes (or searching MPC subtrees).\n"
+                  "0 => all cores. Ignored if trials run in parallel.", default=1)
 args.add_argument('--noise', type=float, metavar='N',
                   help="Amount of noise in model behaviour.", default=0.0)
 args.add_argument('--verbose', action='store_true',
-                  help="Print parameters used.", default=False)
+                  help="Print parameters used and results of each trial.", default=False)
 ARGS = args.parse_args()
 
 
 
-
-class ModelPredictiveController(SLearner):
-    """
-    Creates a subclass of SLearner that uses Model Predictive
-    Control to recommend actions. MPC does not learn a value function but
-    instead does a receding horizon look-ahead at each timestep while
-    choosing the action optimizing some static utility function.
-
-    Args:
-        dmap (func): A function that takes the state vector and returns a number
-            representing the "distance" from ideal state.
-        simulator:  An object with a run() function that takes state and action
-            vectors and an optional stepsize argument. Returns the next state
-            vector.
-        state/actionconverter (FlagGenerator): Encodes/Decodes vectors into
-            integer representation (mostly for compatibility w/ SLearner)
-        depth (int): Maximum horizon to look ahead.
-        density (float): The fraction of neighbouring states to sample.
-        seed (int): Random number generator seed. Otherwise random.
-    """
-
-    def __init__(self, dmap, simulator, stateconverter, actionconverter, depth=1,
-                 density=1, seed=None):
-        self.random = np.random.RandomState() if seed is None else np.random.RandomState(seed)
-        self.dmap = dmap                   # cost measure to minimize
-        self.depth = depth
-        self.density = density
-        self.simulator = simulator
-        self.stateconverter = stateconverter
-        self.actionconverter = actionconverter
-        self.funcdim = 1                    # for compatibility
-        self._avecs = [avec for avec in self.actionconverter]
-
-        self.weights = np.ones((1, 13)) # just for compatibility
-
-    def learn(self, *args, **kwargs):
-        """
-        An MPC has no learning phase.
-        """
-        return [[]], [[]]
-  
-    def recommend(self, state, **kwargs):
-        """
-        Implements the receding horizon online supervision algorithm by
-        Abdelwahed et al.
-        """
-        min_dist = np.inf
-        optimal = None
-        tree = [(None, state, 0, None)] # (parent ref, state, depth, action)
-        while len(tree):
-            cnode = tree.pop()
-            if cnode[2] == self.depth+1:
-                break
-            # add eligible states to be explored to tree
-            neighbours = self.neighbours(cnode[1])
-            self.random.shuffle(neighbours)
-            for action, nstate in enumerate(neighbours[:int(np.ceil(len(neighbours) * self.density))]):
-                node = (cnode, nstate, cnode[2]+1, action)
-                tree.insert(0, node)
-                # check state eligibility
-                if self.dmap(nstate) < min_dist:
-                    min_dist = self.dmap(nstate)
-                    optimal = node
-        # Trace back to first action
-        if optimal is None: # i.e. starting state is closest state, maintain action
-            return state[6:]
-        while optimal[0] is not None:
-            action = optimal[3]
-            optimal = optimal[0]
-        return self.actionconverter.decode(action)
-
-
-
 def moment(s):
         return abs(3 * (s[0] - s[5]) + \
         2 * (s[1] - s[4]) + \
@@ -215,6 +172,12 @@ def func(state, action, weights):
     return np.dot(dfunc(state, action, weights), weights)
 
 
+
+def features(states, actions):
+    # Batched dfunc: one row of features for each state/action pair.
+    return np.hstack((states[:, :6] * (actions + 1) / 200, np.ones((len(states), 1))))
+
+
 # The sampling grid over the state space. A total of 1,000,000 states.
 STATES = FlagGenerator((20, 5, 100), (20, 5, 100), (20, 5, 100), (20, 5, 100),
                        (20, 5, 100), (20, 5, 100), 2, 2, 2, 2, 2, 2)
@@ -229,106 +192,135 @@ if not ARGS.usempc:
 # Create the SLearner instance
     LEARNER = SLearner(reward=reward, simulator=SIM, stateconverter=STATES,
                     actionconverter=ACTIONS, goal=goal, func=func, funcdim=FUNCDIM,
-                    dfunc=dfunc, lrate=ARGS.rate, discount=ARGS.discount,
-                    policy=ARGS.policy, depth=ARGS.maxdepth,
+                    dfunc=dfunc, features=features, lrate=ARGS.rate,
+                    discount=ARGS.discount, policy=ARGS.policy, depth=ARGS.maxdepth,
                     steps=ARGS.steps, seed=ARGS.seed,
                     stepsize=hierarchy if ARGS.hierarchical else lambda x:DELTA_T)
+    LEARNER.set_replay(ARGS.replay)
 else:
     LEARNER = ModelPredictiveController(dmap=moment, simulator=SIM,
                                         stateconverter=STATES, actionconverter=ACTIONS,
                                         depth=ARGS.maxdepth, seed=ARGS.seed,
-                                        density=ARGS.density)
-
-
-# Print paramters if verbose
-if ARGS.verbose:
-    for key, value in vars(ARGS).items():
-        try:
-            print('%12s: %-12s' % (key, value))
-        except:
-            pass
-
-
-# Either run interactive server, or multiple trials
-if ARGS.numtrials is None:
-    # Set up a server
-    APP = flask.Flask('Tanks', static_url_path='', static_folder='', template_folder='')
-    svec = np.zeros(12, dtype=float)
-    avec = np.zeros(6, dtype=int)
-
-    # Initial learning for RL controller
-    if not ARGS.disable and not ARGS.usempc:
-        LEARNER.learn(coverage=ARGS.coverage)
-
-    @APP.route('/')
-    def demo():
-        svec[:] = np.array(ARGS.initial)
-        avec[:] = ARGS.initial[6:]
-        return flask.render_template('demo.html', N=100, T=6,
-                                    L=['1', '2', 'LA', 'RA', '3', '4'],
-                                    O=[0, 1, 2, 3, 4, 5])
-
-    @APP.route('/status/')
-    def status():
-        s = list(svec)                                  # cache last results
-        a = list(avec)
-        w = list(LEARNER.weights)
+                                        density=ARGS.density, beam=ARGS.beam,
+                                        budget=ARGS.budget, resolution=ARGS.resolution,
+                                        workers=ARGS.learners, warmstart=ARGS.warmstart)
+LEARNER.set_cache(ARGS.cache if ARGS.noise == 0 else 0, quantize=ARGS.quantize)
+
 
+def trial(seed):
+    """
+    Runs a single trial from the initial state until the goal is reached. The
+    random number generators of the learner and simulator are re-seeded so a
+    trial gives the same results regardless of which process it runs in.
+
+    Args:
+        seed (np.random.SeedSequence): Seed for the trial.
+
+    Returns:
+        A tuple of the fault, maximum imbalance, length, and area under the
+        imbalance curve of the trial.
+    """
+    lseed, sseed = seed.generate_state(2)
+    LEARNER.random = np.random.RandomState(lseed)
+    LEARNER.simulator.random = np.random.RandomState(sseed)
+    LEARNER.simulator.fault = LEARNER.random.choice(ARGS.fault)  # introduce new fault
+    if not ARGS.disable:                                    # re-learn on new trial
+        LEARNER.reset()
+        LEARNER.learn(coverage=ARGS.coverage, workers=ARGS.learners)
+
+    svec = np.array(ARGS.initial)   # all trials start with specified initial state
+    avec = svec[6:]
+    imbalance = [moment(svec)]
+    length = 1
+    while True:
         if not ARGS.disable:
-            if LEARNER.random.rand() <= ARGS.explore:   # re-learn
+            if LEARNER.random.rand() <= ARGS.explore:   # explore
                 episodes = LEARNER.neighbours(svec)
                 LEARNER.random.shuffle(episodes)
                 LEARNER.learn(episodes=episodes[:int(np.ceil(len(episodes) * ARGS.density))])
-            avec[:] = LEARNER.recommend(svec)
+            avec = LEARNER.recommend(svec)              # exploit
 
-        svec[:] = LEARNER.next_state(svec, avec)        # compute new results
+        svec = LEARNER.next_state(svec, avec)
+        imbalance.append(moment(svec))
+        length += 1
 
-        if goal(s):
-            exit('Goal state reached.')
+        if goal(svec):                                  # quit trial on goal
+            return (LEARNER.simulator.fault, max(imbalance), length, trapz(imbalance))
 
-        imbalance = -moment(s)
 
-        return flask.jsonify(levels=[str(i) for i in s],
-                            action=' '.join(['{:2d}'.format(a) for a in avec]),
-                            weights=[str(i) for i in w],
-                            imbalance=imbalance)   # return cached results
 
-    APP.run(debug=1, use_reloader=False, use_evalex=False)
+if __name__ == '__main__':
+    # Print paramters if verbose
+    if ARGS.verbose:
+        for key, value in vars(ARGS).items():
+            try:
+                print('%12s: %-12s' % (key, value))
+            except:
+                pass
+
+
+    # Either run interactive server, or multiple trials
+    if ARGS.numtrials is None:
+        # Set up a server
+        APP = flask.Flask('Tanks', static_url_path='', static_folder='', template_folder='')
+        svec = np.zeros(12, dtype=float)
+        avec = np.zeros(6, dtype=int)
+
+        # Initial learning for RL controller
+        if not ARGS.disable and not ARGS.usempc:
+            LEARNER.learn(coverage=ARGS.coverage, workers=ARGS.learners)
+
+        @APP.route('/')
+        def demo():
+            svec[:] = np.array(ARGS.initial)
+            avec[:] = ARGS.initial[6:]
+            return flask.render_template('demo.html', N=100, T=6,
+                                        L=['1', '2', 'LA', 'RA', '3', '4'],
+                                        O=[0, 1, 2, 3, 4, 5])
+
+        @APP.route('/status/')
+        def status():
+            s = list(svec)                                  # cache last results
+            a = list(avec)
+            w = list(LEARNER.weights)
 
-else:
-    # Run multiple trials
-    imbalances = []     # average imbalance for each trial
-    lengths = []        # length of each trial until goal
-    areas = []          # average areas under imbalance curves
-    for i in range(ARGS.numtrials):
-        LEARNER.simulator.fault = LEARNER.random.choice(ARGS.fault)  # introduce new fault
-        if not ARGS.disable:                                    # re-learn on new trial
-            LEARNER.reset()
-            LEARNER.learn(coverage=ARGS.coverage)
-
-        svec = np.array(ARGS.initial)   # all trials start with specified initial state
-        avec = svec[6:]
-        imbalance = [moment(svec)]
-        length = 1
-        while True:
             if not ARGS.disable:
-                if LEARNER.random.rand() <= ARGS.explore:   # explore
+                if LEARNER.random.rand() <= ARGS.explore:   # re-learn
                     episodes = LEARNER.neighbours(svec)
                     LEARNER.random.shuffle(episodes)
                     LEARNER.learn(episodes=episodes[:int(np.ceil(len(episodes) * ARGS.density))])
-                avec = LEARNER.recommend(svec)              # exploit
+                avec[:] = LEARNER.recommend(svec)
+
+            svec[:] = LEARNER.next_state(svec, avec)        # compute new results
+
+            if goal(s):
+                exit('Goal state reached.')
+
+            imbalance = -moment(s)
 
-            svec = LEARNER.next_state(svec, avec)
-            imbalance.append(moment(svec))
-            length += 1
+            return flask.jsonify(levels=[str(i) for i in s],
+                                action=' '.join(['{:2d}'.format(a) for a in avec]),
+                                weights=[str(i) for i in w],
+                                imbalance=imbalance)   # return cached results
 
-            if goal(svec):                                  # quit trial on goal
-                imbalances.append(max(imbalance))
-                lengths.append(length)
-                areas.append(trapz(imbalance))
-                break
+        APP.run(debug=1, use_reloader=False, use_evalex=False)
 
+    else:
+        # Run multiple trials, each with its own seed derived from the global seed
+        seeds = np.random.SeedSequence(ARGS.seed).spawn(ARGS.numtrials)
+        if ARGS.workers == 1:
+            results = [trial(seed) for seed in seeds]
+        else:
+            with multiprocessing.Pool(ARGS.workers or None) as pool:
+                results = pool.map(trial, seeds)
 
+        faults, imbalances, lengths, areas = zip(*results)
+        if ARGS.verbose:
+            for i, (fault, imbalance, length, area) in enumerate(results):
+                print('Trial: {0:6d}\tFault: {1:2d}\tMaxImbalance: {2:6.2f}\tLength: {3:6d}\tTotalImbalance: {4:6.2f}'\
+                        .format(i, fault, imbalance, length, area))
+        print('MaxImbalance: {0:6.2f}\tLength: {1:6d}\tTotalImbalance: {2:6.2f}'\
+                .format(np.mean(imbalances), int(np.mean(lengths)), np.mean(areas)))
 
-    print('MaxImbalance: {0:6.2f}\tLength: {1:6d}\tTotalImbalance: {2:6.2f}'\
-            .format(np.mean(imbalances), int(np.mean(lengths)), np.mean(areas)))
+    if ARGS.usempc:
+        LEARNER.close()     # stop MPC search workers
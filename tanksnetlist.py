@@ -36,6 +36,7 @@ from qlearn import Netlist
 from qlearn import Resistor
 from qlearn import FlagGenerator
 from qlearn import Simulator
+from qlearn import LinearSimulator
 from qlearn import SLearner
 from qlearn import utils
 
@@ -87,13 +88,15 @@ args.add_argument('-u', '--fault', metavar='U', type=str, nargs='*',
 args.add_argument('-p', '--policy', metavar='P', choices=['uniform', 'softmax', 'greedy'],
                   help="The action selection policy", default=POLICY)
 args.add_argument('-l', '--load', metavar='F', type=str,
-                  help="File to load learned policy from", default='')
+                  help="File to load learned policy from (text, .npy or .npz)", default='')
 args.add_argument('-f', '--file', metavar='F', type=str,
-                  help="File to save learned policy to", default='')
+                  help="File to save learned policy to (text, .npy or .npz)", default='')
 args.add_argument('--seed', metavar='SEED', type=int,
                   help="Random number seed", default=SEED)
 args.add_argument('-x', '--disable', action='store_true',
                   help="Learning disabled if included", default=False)
+args.add_argument('--linear', action='store_true',
+                  help="Use native linear circuit simulator instead of ahkab", default=False)
 ARGS = args.parse_args()
 
 # Specify dimension and resolution of state and action vectors
@@ -180,6 +183,13 @@ def func(svec, avec, weights):
     return np.dot(dfunc(svec, avec, weights), weights)
 
 
+# Returns dfunc for a batch of state/action vectors: one row for each pair.
+# Used to compute the values of all actions from a state at once.
+def features(svecs, avecs):
+    valves = (avecs[:, :1] == np.arange(1, NUM_VALVES + 1)).astype(float)
+    return np.hstack((svecs[:, :-1] / ARGS.num_levels, valves, np.ones((len(svecs), 1))))
+
+
 # Number of weights to learn in functional approximation, in this case:
 # 1 weight for each tank, 1 weight for each valve, and a bias term
 FUNCDIM = NUM_TANKS + NUM_VALVES + 1
@@ -204,15 +214,16 @@ create_fault(*ARGS.fault)
 
 
 # Create a simulator to be used by SLearner
-SIM = Simulator(env=NET, timestep=MAX_SIM_TSTEP, state_mux=state_mux,
-                state_demux=state_demux)
+BACKEND = LinearSimulator if ARGS.linear else Simulator
+SIM = BACKEND(env=NET, timestep=MAX_SIM_TSTEP, state_mux=state_mux,
+              state_demux=state_demux)
 
 
 # Create the SLearner instance
 LEARNER = SLearner(reward=reward, simulator=SIM, stateconverter=STATES,
                    actionconverter=ACTIONS, goal=goal, func=func, funcdim=FUNCDIM,
-                   dfunc=dfunc, lrate=ARGS.rate, discount=ARGS.discount,
-                   policy=ARGS.policy, depth=ARGS.maxdepth,
+                   dfunc=dfunc, features=features, lrate=ARGS.rate,
+                   discount=ARGS.discount, policy=ARGS.policy, depth=ARGS.maxdepth,
                    steps=ARGS.steps, seed=ARGS.seed, stepsize=DELTA_T)
 
 
@@ -227,7 +238,8 @@ if not ARGS.disable:
             (int(ARGS.coverage * STATES.num_states), STATES.num_states))
         LEARNER.learn(coverage=ARGS.coverage)
         if ARGS.file != '':
-            utils.save_matrix(LEARNER.weights, ARGS.file)
+            utils.save_matrix(LEARNER.weights, ARGS.file, lrate=LEARNER.lrate,
+                              discount=LEARNER.discount, steps=LEARNER.steps)
     else:
         LEARNER.weights = utils.read_matrix(ARGS.load)
 
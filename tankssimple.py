@@ -28,13 +28,15 @@ from qlearn import SLearner
 from qlearn.linsim import Netlist
 from qlearn.linsim import Directive
 from qlearn.linsim import Simulator
+from qlearn.linsim import LinearSimulator
 from qlearn.linsim import FlagGenerator
 from qlearn.linsim import elements
 from qlearn import utils
 
 
 
-def create_system(num_tanks=4, tank_levels=5, lrate=1e-2, discount=0.75, exploration=0, steps=1):
+def create_system(num_tanks=4, tank_levels=5, lrate=1e-2, discount=0.75, exploration=0, steps=1,
+                  linear=False):
     """
     Creates a Simulator that represents the fuel tank system. Each fuel tank
     is a capacitor, and the tank's level is the charge (proportional to voltage)
@@ -52,6 +54,8 @@ def create_system(num_tanks=4, tank_levels=5, lrate=1e-2, discount=0.75, explora
         tank_levels (int): Number of fuel levels per tank. One level=1V. During
             learning, the states are sampled in 1V intervals. Tank voltage range
             is then from 0 to tank_levels - 1.
+        linear (bool): If True, uses the native LinearSimulator instead of
+            the ahkab based Simulator.
 
     Returns:
         An SLearner instance.
@@ -148,8 +152,9 @@ def create_system(num_tanks=4, tank_levels=5, lrate=1e-2, discount=0.75, explora
         return nsvec
 
     # Creating the simulator to be used for learning
-    sim = Simulator(env=system, timestep=deltat/10, state_mux=state_mux,
-                    state_demux=state_demux)
+    backend = LinearSimulator if linear else Simulator
+    sim = backend(env=system, timestep=deltat/10, state_mux=state_mux,
+                  state_demux=state_demux)
 
     # Defining the reward function which penalizes imbalance in fuel tanks
     def reward(svec, avec, nsvec):
@@ -173,6 +178,15 @@ def create_system(num_tanks=4, tank_levels=5, lrate=1e-2, discount=0.75, explora
     def func(svec, avec, weights):
         return np.dot(weights, dfunc(svec, avec, weights))
 
+    def features(svecs, avecs):
+        pumps = np.arange(1, num_pumps + 1)
+        actions = avecs[:, :1].astype(int)
+        pumpvec = (actions == 2 * pumps).astype(float) - (actions == 2 * pumps - 1)
+        return np.hstack((np.square(svecs) / tank_levels**2,
+                          svecs / tank_levels,
+                          pumpvec,
+                          np.ones((len(svecs), 1))))
+
     funcdim = 2*num_tanks + num_pumps + 1
 
     def goal(svec):
@@ -181,8 +195,9 @@ def create_system(num_tanks=4, tank_levels=5, lrate=1e-2, discount=0.75, explora
     # Creating the SLearner instance
     learner = SLearner(reward=reward, simulator=sim, stateconverter=fstate,
                        actionconverter=faction, func=func, funcdim=funcdim,
-                       dfunc=dfunc, goal=goal, steps=steps, lrate=lrate,
-                       discount=discount, exploration=exploration, stepsize=deltat)
+                       dfunc=dfunc, features=features, goal=goal, steps=steps,
+                       lrate=lrate, discount=discount, exploration=exploration,
+                       stepsize=deltat)
     return learner
 
 
@@ -258,16 +273,18 @@ if __name__ == '__main__':
     args.add_argument('-m', '--maxdepth', metavar='M', type=int,
                       help="Number of steps at most in each episode", default=1)
     args.add_argument('-l', '--load', metavar='F', type=str,
-                      help="File to load learned policy from", default='')
+                      help="File to load learned policy from (text, .npy or .npz)", default='')
     args.add_argument('-f', '--file', metavar='F', type=str,
-                      help="File to save learned policy to", default='')
+                      help="File to save learned policy to (text, .npy or .npz)", default='')
     args.add_argument('-x', '--server', action='store_true',
                       help="Run server on localhost:5000 to visualize problem")
+    args.add_argument('--linear', action='store_true',
+                      help="Use native linear circuit simulator instead of ahkab")
     args = args.parse_args()
 
     # Set up the learner environment
     learner = create_system(args.tanks, args.num_levels, args.rate, args.discount,
-                            args.explore, args.steps)
+                            args.explore, args.steps, args.linear)
     print('System Netlist:')
     print(learner.simulator.env)
 
@@ -276,7 +293,8 @@ if __name__ == '__main__':
         input('\nPress Enter to begin learning.')
         learner.learn(coverage=args.coverage, depth=args.maxdepth)
         if args.file != '':
-            utils.save_matrix(learner.weights, args.file)
+            utils.save_matrix(learner.weights, args.file, lrate=learner.lrate,
+                              discount=learner.discount, steps=learner.steps)
     else:
         learner.weights = utils.read_matrix(args.load)
 